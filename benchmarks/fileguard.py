@@ -0,0 +1,146 @@
+"""
+Rescaling of content_list and model.json, numpy against the former
+deepcopy and round() per value, on a synthetic 1000 pages document
+
+    python -m benchmarks.fileguard [pages]
+"""
+import copy
+import json
+import random
+import sys
+import time
+from math import ceil
+from typing import Callable, Dict, List, Optional, Union
+
+from src.mineru_pdf.utils.fileguard import PageSize, fix_content_list, fix_model_json
+
+PAGE_SIZES = [ (595, 842), (612, 792), (842, 1191) ]
+ITEMS_PER_PAGE = 40
+
+
+def legacy_fix_content_list(content_list: List[Dict], page_sizes: Dict[int, PageSize]):
+
+    def scale(pt: int, pk: int) -> float:
+        return round(pt * pk / 1000, 5)
+
+    def bbox_scale(bbox, page: PageSize):
+
+        if len(bbox) != 4:
+            raise ValueError('bbox format invalid, only support 4 value list')
+
+        x0, y0, x1, y1 = bbox
+
+        scale_x = lambda x: int(scale(x, page[0]))
+        scale_y = lambda y: int(ceil(scale(y, page[1])))
+
+        return [ scale_x(x0), scale_y(y0), scale_x(x1), scale_y(y1) ]
+
+    items = copy.deepcopy(content_list)
+
+    for item in items:
+        if 'bbox' in item:
+            item['bbox'] = bbox_scale(tuple(item['bbox']), page_sizes[item['page_idx']])
+
+    return items
+
+def legacy_fix_model_json(model_json: Optional[List[Union[Dict, List[Dict]]]], page_sizes: Dict[int, PageSize]):
+
+    if model_json is None:
+        return model_json
+
+    items = copy.deepcopy(model_json)
+
+    for idx, item in enumerate(items):
+
+        if isinstance(item, dict):
+
+            ori = page_sizes[item['page_info']['page_no']]
+            wid = item['page_info']['width']
+            hei = item['page_info']['height']
+
+            factors = (round(wid / ori[0], 5), round(hei / ori[1], 5))
+
+            for det in item['layout_dets']:
+                det['poly'] = [
+                    round(value / factors[i % 2], 5) for i, value in enumerate(det['poly'][:8])
+                ]
+
+        elif isinstance(item, list):
+
+            page_size = page_sizes[idx]
+
+            for pice in item:
+                pice['bbox'] = [
+                    round(value * page_size[i % 2], 5) for i, value in enumerate(pice['bbox'][:4])
+                ]
+
+        else:
+            raise ValueError(f'expected dict or list, {type(item)} given')
+
+    return items
+
+def synthetic(pages: int, seed: int = 1) -> tuple[Dict[int, PageSize], List[Dict], List[Dict], List[List[Dict]]]:
+    """Page sizes, content_list, pipeline and vlm model.json of a document"""
+
+    rand = random.Random(seed)
+
+    page_sizes: Dict[int, PageSize] = { i: rand.choice(PAGE_SIZES) for i in range(pages) }
+
+    content_list: List[Dict] = [
+        { 'type': 'text', 'page_idx': i % pages, 'bbox': [ rand.randint(0, 1000) for _ in range(4) ] }
+        for i in range(pages * ITEMS_PER_PAGE)
+    ]
+
+    pipeline: List[Dict] = [
+        {
+            'page_info': { 'page_no': i, 'width': page_sizes[i][0] * 2 + rand.randint(0, 3), 'height': page_sizes[i][1] * 2 },
+            'layout_dets': [
+                { 'category_id': 1, 'score': 0.9, 'poly': [ round(rand.uniform(0, 2000), rand.choice([ 0, 3, 6 ])) for _ in range(8) ] }
+                for _ in range(ITEMS_PER_PAGE)
+            ],
+        }
+        for i in range(pages)
+    ]
+
+    vlm: List[List[Dict]] = [
+        [
+            { 'type': 'text', 'bbox': [ round(rand.random(), rand.choice([ 3, 5, 17 ])) for _ in range(4) ] }
+            for _ in range(ITEMS_PER_PAGE)
+        ]
+        for _ in range(pages)
+    ]
+
+    return page_sizes, content_list, pipeline, vlm
+
+def _timed(func: Callable[[], object], rounds: int = 3) -> float:
+
+    best: float = float('inf')
+    for _ in range(rounds):
+        began: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - began)
+
+    return best
+
+def main(pages: int = 1000) -> None:
+
+    page_sizes, content_list, pipeline, vlm = synthetic(pages)
+
+    cases = [
+        ( 'content_list', fix_content_list, legacy_fix_content_list, content_list ),
+        ( 'model.json pipeline', fix_model_json, legacy_fix_model_json, pipeline ),
+        ( 'model.json vlm', fix_model_json, legacy_fix_model_json, vlm ),
+    ]
+
+    print(f'{pages} pages, {ITEMS_PER_PAGE} items per page, best of 3')
+
+    for name, current, legacy, data in cases:
+        if json.dumps(current(data, page_sizes)) != json.dumps(legacy(data, page_sizes)):
+            raise SystemExit(f'{name}: output differs from legacy')
+        before: float = _timed(lambda: legacy(data, page_sizes))
+        after: float = _timed(lambda: current(data, page_sizes))
+        print(f'{name:<20} legacy {before * 1000:8.1f} ms  numpy {after * 1000:8.1f} ms  x{before / after:.1f}')
+
+
+if __name__ == '__main__':
+    main(*[ int(arg) for arg in sys.argv[1:2] ])
@@ -0,0 +1,134 @@
+"""
+Plain json response of /file_parse, artifacts spliced in as raw bytes
+against loading them all and encoding again with jsonify, on a synthetic
+1000 pages result, CPU time and peak of traced memory of each
+
+    python -m benchmarks.streaming [pages]
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from flask import Flask, jsonify
+
+from src.mineru_pdf.utils.fileguard import load_json_file, pickup_images, read_text_file
+from src.mineru_pdf.utils.streaming import Artifact, json_chunks
+
+BLOCKS_PER_PAGE = 30
+
+
+def synthetic(result_dir: Path, pages: int, seed: int = 1) -> List[Artifact]:
+    """Writes the artifacts of a parsed document, same layout as the writer"""
+
+    rand = random.Random(seed)
+
+    def bbox(scale: float, n: int = 4) -> List[float]:
+        return [ round(rand.random() * scale, 3) for _ in range(n) ]
+
+    result_dir.joinpath('content.md').write_text('lorem ipsum dolor sit amet\n\n' * pages * BLOCKS_PER_PAGE)
+    result_dir.joinpath('middle.json').write_text(json.dumps({
+        'pdf_info': [
+            {
+                'page_idx': i, 'page_size': [ 595, 842 ],
+                'preproc_blocks': [
+                    { 'type': 'text', 'bbox': bbox(600), 'lines': [ { 'bbox': bbox(600), 'spans': [ { 'type': 'text', 'content': 'lorem ipsum ' * 5, 'bbox': bbox(600) } ] } ] }
+                    for _ in range(BLOCKS_PER_PAGE)
+                ],
+            }
+            for i in range(pages)
+        ],
+        '_backend': 'pipeline',
+    }, separators=(',', ':')))
+    result_dir.joinpath('content_list.json').write_text(json.dumps([
+        { 'type': 'text', 'text': 'lorem ipsum ' * 5, 'bbox': bbox(1000), 'page_idx': i }
+        for i in range(pages) for _ in range(BLOCKS_PER_PAGE)
+    ], separators=(',', ':')))
+    result_dir.joinpath('model.json').write_text(json.dumps([
+        {
+            'page_info': { 'page_no': i, 'width': 1190, 'height': 1684 },
+            'layout_dets': [ { 'category_id': 1, 'poly': bbox(1600, 8), 'score': 0.9 } for _ in range(BLOCKS_PER_PAGE) ],
+        }
+        for i in range(pages)
+    ], separators=(',', ':')))
+
+    image_dir: Path = result_dir.joinpath('images')
+    image_dir.mkdir()
+    for i in range(pages // 10):
+        image_dir.joinpath(f'{i:04d}.jpg').write_bytes(rand.randbytes(20480))
+
+    return [
+        ( 'md_content', result_dir.joinpath('content.md') ),
+        ( 'info', result_dir.joinpath('middle.json') ),
+        ( 'content_list', result_dir.joinpath('content_list.json') ),
+        ( 'layout', result_dir.joinpath('model.json') ),
+        ( 'images', image_dir ),
+    ]
+
+def reencoded(app: Flask, heads: Dict[str, Any], artifacts: List[Artifact]) -> bytes:
+    """Response body as made before splicing, every artifact decoded first"""
+
+    data: Dict[str, Any] = { **heads }
+
+    for field, path in artifacts:
+        if path.is_dir():
+            data[field] = pickup_images(path)
+        elif '.json' == path.suffix:
+            data[field] = load_json_file(path)
+        else:
+            data[field] = read_text_file(path)
+
+    with app.app_context():
+        return jsonify(data).get_data()
+
+def spliced(heads: Dict[str, Any], artifacts: List[Artifact]) -> bytes:
+    """Response body as streamed now, chunks are dropped once counted"""
+
+    size: int = 0
+    for chunk in json_chunks(heads, artifacts):
+        size += len(chunk)
+
+    return b'%d' % size
+
+def measure(func: Callable[[], bytes]) -> tuple[float, int]:
+
+    began: float = time.process_time()
+    func()
+    cpu: float = time.process_time() - began
+
+    tracemalloc.start()
+    func()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return cpu, peak
+
+def main(pages: int = 1000) -> None:
+
+    app: Flask = Flask(__name__)
+    heads: Dict[str, Any] = { 'scaled': [ 'layout', 'content_list' ] }
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        artifacts: List[Artifact] = synthetic(Path(tmp), pages)
+        size: int = sum(file.stat().st_size for file in Path(tmp).rglob('*') if file.is_file())
+
+        if json.loads(reencoded(app, heads, artifacts)) != json.loads(b''.join(json_chunks(heads, artifacts))):
+            raise SystemExit('spliced response differs from jsonify one')
+
+        print(f'{pages} pages, {size / 1048576:.1f} MiB of artifacts')
+
+        for name, func in [
+            ( 'json.loads + jsonify', lambda: reencoded(app, heads, artifacts) ),
+            ( 'raw json splicing', lambda: spliced(heads, artifacts) ),
+        ]:
+            cpu, peak = measure(func)
+            print(f'{name:<22} cpu {cpu * 1000:8.1f} ms  peak {peak / 1048576:8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*[ int(arg) for arg in sys.argv[1:2] ])
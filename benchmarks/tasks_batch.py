@@ -0,0 +1,89 @@
+"""
+Submission of 1000 tasks, one POST /api/v4/tasks each against a single
+POST /api/v4/tasks/batch, on a sqlite database and an in-memory broker
+
+    python -m benchmarks.tasks_batch [tasks]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from flask import Flask
+from sqlalchemy import func, select
+
+from src.mineru_pdf import create_app
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer, Task
+
+
+def make_app(instance: Path, tasks: int) -> Flask:
+    """Application on a fresh instance folder, same as tests do"""
+
+    for folder in ( 'archives', 'cache', 'logs', 'public' ):
+        instance.joinpath(folder).mkdir(parents=True, exist_ok=True)
+
+    instance.parent.joinpath('.env').write_text(''.join(f'{k}={v}\n' for k, v in {
+        'CELERY_BROKER_URL': 'memory://', 'TASKS_BATCH_MAX': str(tasks),
+    }.items()))
+
+    os.environ['FLASK_INSTANCE_DIR'] = str(instance)
+    os.chdir(instance.parent)
+
+    app: Flask = create_app()
+
+    with app.app_context():
+        database.create_all()
+
+    return app
+
+def bench(app: Flask, tasks: int) -> None:
+
+    headers: dict = { 'Authorization': 'Bearer bench' }
+    items: List[dict] = [
+        { 'file_url': f'https://files.example/{i}.pdf', 'file_id': f'doc-{i}', 'priority': 'low' if i % 2 else 'high' }
+        for i in range(tasks)
+    ]
+
+    with app.app_context():
+        database.session.add(Bearer(owner='bench', token='bench', labels='tasks')) # type: ignore
+        database.session.commit()
+
+    client = app.test_client()
+    # first request pays imports and connection setup
+    assert 200 == client.post('/api/v4/tasks', json=items[0], headers=headers).status_code
+
+    began: float = time.perf_counter()
+    for item in items:
+        assert 200 == client.post('/api/v4/tasks', json=item, headers=headers).status_code
+    single: float = time.perf_counter() - began
+
+    began = time.perf_counter()
+    r = client.post('/api/v4/tasks/batch', json={ 'tasks': items }, headers=headers)
+    batch: float = time.perf_counter() - began
+
+    assert 200 == r.status_code and tasks == len(r.json['task_ids']) # type: ignore
+
+    with app.app_context():
+        rows: int = database.session.scalar(select(func.count()).select_from(Task)) # type: ignore
+
+    print(f'{tasks} tasks, {rows} rows inserted')
+    print(f'per task  {single:8.2f} s  {tasks / single:8.0f} tasks/s')
+    print(f'batch     {batch:8.2f} s  {tasks / batch:8.0f} tasks/s  x{single / batch:.1f}')
+
+def main(tasks: int = 1000) -> None:
+
+    cwd: str = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            app: Flask = make_app(Path(tmp).joinpath('instance'), tasks)
+            bench(app, tasks)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main(*[ int(arg) for arg in sys.argv[1:2] ])
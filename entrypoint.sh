@@ -49,9 +49,16 @@ fi
 if [ "prompt" = "${1}" ]; then
     echo "missing argument <app>, available:"
     echo "    serve  for api endpoint serve"
-    echo "    queue  for background task"
+    echo "    queue  for background task, all stages in one worker"
+    echo "    cpuq   for background task, collecting and packing only"
+    echo "    gpuq   for background task, inferring only"
+    echo "    cbq    for background task, delivering callbacks only"
     echo "    sched  for periodic task"
     echo "    vllm   for model serve"
+    echo ""
+    echo "archives are served by signed urls of /api/v4/tasks/<id>/archive,"
+    echo "set STORAGE_LINK=true to also expose them without auth under"
+    echo "/app/instance/public/archives, off by default"
     exit 1
 elif [ "serve" = "${1}" ]; then
     set -- /app/.venv/bin/gunicorn --config gunicorn.conf.py
@@ -60,6 +67,7 @@ elif [ "queue" = "${1}" ]; then
     set -- /app/.venv/bin/celery \
         --app src.mineru_pdf.celery.app \
         worker \
+        --queues "celery,${CPU_QUEUE:-"cpu"},${GPU_QUEUE:-"gpu"},${CALLBACK_QUEUE:-"callback"}" \
         --concurrency ${QUEUE_CONCURRENCY:-"1"} \
         --time-limit ${QUEUE_TIMEOUT:-"1800"} \
         --soft-time-limit ${QUEUE_TIMEOUT_THRESHOLD:-"1500"} \
@@ -67,6 +75,40 @@ elif [ "queue" = "${1}" ]; then
         --prefetch-multiplier 1 \
         --max-tasks-per-child 10 \
         --loglevel ${LOGLEVEL:-"INFO"}
+elif [ "cpuq" = "${1}" ]; then
+    set -- /app/.venv/bin/celery \
+        --app src.mineru_pdf.celery.app \
+        worker \
+        --queues "celery,${CPU_QUEUE:-"cpu"}" \
+        --concurrency ${CPU_QUEUE_CONCURRENCY:-"4"} \
+        --time-limit ${QUEUE_TIMEOUT:-"1800"} \
+        --soft-time-limit ${QUEUE_TIMEOUT_THRESHOLD:-"1500"} \
+        --optimization fair \
+        --prefetch-multiplier 1 \
+        --loglevel ${LOGLEVEL:-"INFO"}
+elif [ "gpuq" = "${1}" ]; then
+    set -- /app/.venv/bin/celery \
+        --app src.mineru_pdf.celery.app \
+        worker \
+        --queues "${GPU_QUEUE:-"gpu"}" \
+        --concurrency ${QUEUE_CONCURRENCY:-"1"} \
+        --time-limit ${QUEUE_TIMEOUT:-"1800"} \
+        --soft-time-limit ${QUEUE_TIMEOUT_THRESHOLD:-"1500"} \
+        --optimization fair \
+        --prefetch-multiplier 1 \
+        --max-tasks-per-child 10 \
+        --loglevel ${LOGLEVEL:-"INFO"}
+elif [ "cbq" = "${1}" ]; then
+    set -- /app/.venv/bin/celery \
+        --app src.mineru_pdf.celery.app \
+        worker \
+        --queues "${CALLBACK_QUEUE:-"callback"}" \
+        --concurrency ${CALLBACK_QUEUE_CONCURRENCY:-"4"} \
+        --time-limit ${QUEUE_TIMEOUT:-"1800"} \
+        --soft-time-limit ${QUEUE_TIMEOUT_THRESHOLD:-"1500"} \
+        --optimization fair \
+        --prefetch-multiplier 1 \
+        --loglevel ${LOGLEVEL:-"INFO"}
 elif [ "sched" = "${1}" ]; then
     set -- /app/.venv/bin/celery \
         --app src.mineru_pdf.celery.app \
@@ -91,11 +133,16 @@ if [ ! -d "${MINERU_MODEL_VLM}" ]; then
     exit 3
 fi
 
-# Migrate database and link directory
+# Migrate database, link directory only when opted in, a public link
+# serves every archive without auth, one left by an earlier start goes
 . .venv/bin/activate
 flask db upgrade
-if [ ! -L "/app/instance/public/archives" ]; then
-    flask storage link
+if [ "true" = "${STORAGE_LINK:-"false"}" ]; then
+    if [ ! -L "/app/instance/public/archives" ]; then
+        flask storage link
+    fi
+elif [ -L "/app/instance/public/archives" ]; then
+    flask storage unlink
 fi
 deactivate
 
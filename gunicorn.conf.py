@@ -13,6 +13,11 @@ bind = [ os.getenv('BIND', '127.0.0.1:9471') ]
 # worker process
 workers = int(os.getenv('WORKERS', 4))
 
+# threads of each worker, long polls and event streams wait in a thread
+# rather than holding the whole worker, see TASK_EVENTS_MAX_WAITERS
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('THREADS', 32))
+
 # maximum number of requests a worker will process before restarting
 max_requests = int(os.getenv('MAX_REQUESTS', 200))
 
@@ -102,3 +107,9 @@ loglevel = os.getenv('LOGLEVEL', 'INFO').lower()
 
 # does not redirect access log to syslog
 disable_redirect_access_to_syslog = True
+
+# load models once the worker has loaded the app, see WARMUP_ENGINE
+def post_worker_init(worker):
+    from src.mineru_pdf.utils.warmup import warmup_models
+    with worker.wsgi.app_context():
+        warmup_models()
@@ -33,10 +33,16 @@ def create_app():
     )
 
     # register commands
+    from .cli.cache import cache
+    from .cli.callbacks import callbacks
     from .cli.parse import parse_file
+    from .cli.stages import stages
     from .cli.storage import storage
     from .cli.token import token
+    app.cli.add_command(cache)
+    app.cli.add_command(callbacks)
     app.cli.add_command(parse_file)
+    app.cli.add_command(stages)
     app.cli.add_command(storage)
     app.cli.add_command(token)
 
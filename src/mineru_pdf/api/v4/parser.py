@@ -1,24 +1,37 @@
+import json
 import logging
 import shutil
 from pathlib import Path
 from tempfile import mkdtemp
-from typing import Any, Dict, Optional, Union
+from uuid import uuid4
+from typing import Any, Dict, List, Optional, Union
 
 import arrow
-from flask import Blueprint, current_app, g, jsonify, request
+from flask import Blueprint, Response, current_app, g, jsonify, request
 from filename_sanitizer import sanitize_path_fragment
 from pydantic import ValidationError
 from werkzeug.datastructures import FileStorage
 
 from ...auth import bearer
-from ...constants import ParserEngines, TokenLabels
-from ...exceptions import ExtraErrorCodes, GPUOutOfMemoryException
-from ...requests import FileParseForm
-from ...utils.fileguard import file_check, load_json_file, read_text_file, pickup_images
+from ...constants import ParserEngines, ResponseFormats, TaskResult, TaskStatus, TokenLabels
+from ...exceptions import ExtraErrorCodes, GPUAdmissionRejectedError, GPUOutOfMemoryException
+from ...extensions import database
+from ...models import Task
+from ...requests import FileParseForm, FileUploadForm
+from ...tasks import mining_pdf
+from ...utils.admission import inference_admission
+from ...utils.fileguard import file_check
+from ...utils.memwriter import MemoryDataWriter
+from ...utils.priority import task_priority
+from ...utils.resultcache import PinnedResult, lookup_result, result_key, store_result
+from ...utils.streaming import Artifact, json_chunks, multipart_chunks, ndjson_lines, tar_chunks, zip_chunks
 
 parser: Blueprint = Blueprint('parser', __name__)
 logger = logging.getLogger(__name__)
 
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
 
 @parser.post('/file_parse')
 @bearer.login_required(role=TokenLabels.FILES)
@@ -50,7 +63,7 @@ def file_parse():
     uploaded_file.save(input_file)
 
     try:
-        file_check(input_file, max_page=500)
+        pages: int = file_check(input_file, max_page=500)
     except Exception as e:
         return jsonify({
             'error': {
@@ -72,63 +85,205 @@ def file_parse():
         'vllm_endpoint': current_app.config.get('VLLM_ENDPOINT'),
     })
 
-    try:
-        magic_file(input_file, cache_dir, **magic_kwargs) # type: ignore
-    except GPUOutOfMemoryException as e:
-        g.is_vram_full = True
-        logger.warning(e, exc_info=True)
-        r = jsonify({
-            'error': {
-                'code': e.code,
-                'message': f'{e}'
-            }
-        })
-        r.retry_after = arrow.now(
-            current_app.config.get('TIMEZONE')
-        ).shift(seconds=200).datetime
-        return r, 503
+    cache_key: str = result_key(input_file, magic_kwargs)
+    pinned: Optional[PinnedResult] = lookup_result(cache_key)
 
-    data: Dict[str, Any] = {}
+    if pinned is not None:
+        result_dir: Path = pinned.path
+    else:
+        # only requested artifacts are made, kept in memory as compact json
+        writer = MemoryDataWriter(skip=[] if form.return_images else [ 'images' ])
+        try:
+            with inference_admission(pages, magic_kwargs.get('backend'), # type: ignore
+                                     wait=current_app.config.get('GPU_ADMISSION_WAIT')):
+                magic_file( # type: ignore
+                    input_file, cache_dir, **magic_kwargs,
+                    dump_md=form.return_md,
+                    dump_middle_json=form.return_info,
+                    dump_content_list=form.return_content_list,
+                    dump_model_output=form.return_layout,
+                    data_writer=writer, json_indent=None,
+                )
+        except GPUAdmissionRejectedError as e:
+            logger.warning(e)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            r = jsonify({
+                'error': {
+                    'code': e.code,
+                    'message': f'{e}'
+                }
+            })
+            r.retry_after = e.retry_after # type: ignore
+            return r, 503
+        except GPUOutOfMemoryException as e:
+            g.is_vram_full = True
+            logger.warning(e, exc_info=True)
+            r = jsonify({
+                'error': {
+                    'code': e.code,
+                    'message': f'{e}'
+                }
+            })
+            r.retry_after = arrow.now(
+                current_app.config.get('TIMEZONE')
+            ).shift(seconds=200).datetime
+            return r, 503
+        # partial results would poison the cache for later full requests
+        if all([ form.return_md, form.return_info, form.return_content_list,
+                 form.return_layout, form.return_images ]):
+            store_result(cache_key, writer.files)
+        result_dir = writer.root() # type: ignore
+
+    heads: Dict[str, Any] = {}
 
     if form.apply_scaled:
-        data['scaled'] = [ 'layout' ]
+        heads['scaled'] = [ 'layout' ]
         if ParserEngines.PIPELINE == form.parser_engine:
-            data['scaled'].append('content_list')
+            heads['scaled'].append('content_list')
         else:
-            data['scaled'].append('content_list_v2')
+            heads['scaled'].append('content_list_v2')
+
+    artifacts: List[Artifact] = _pick_artifacts(form, result_dir)
+
+    response_format: ResponseFormats = form.response_format or (
+        ResponseFormats.NDJSON
+        if NDJSON_MIMETYPE == request.accept_mimetypes.best_match([ JSON_MIMETYPE, NDJSON_MIMETYPE ])
+        else ResponseFormats.JSON
+    )
+
+    r = _stream_response(response_format, heads, artifacts, input_file.stem)
+    # runs on finished or disconnected, even the stream never started
+    r.call_on_close(lambda: shutil.rmtree(cache_dir, ignore_errors=True))
+    # cached artifacts are read lazily while streaming, kept till then
+    if pinned is not None:
+        r.call_on_close(pinned.release)
+
+    return r
+
+def _stream_response(
+    response_format: ResponseFormats, heads: Dict[str, Any],
+    artifacts: List[Artifact], download_name: str
+) -> Response:
+
+    if ResponseFormats.JSON == response_format:
+        return Response(json_chunks(heads, artifacts), mimetype=JSON_MIMETYPE)
+
+    if ResponseFormats.NDJSON == response_format:
+        return Response(ndjson_lines(heads, artifacts), mimetype=NDJSON_MIMETYPE)
+
+    if ResponseFormats.MULTIPART == response_format:
+        boundary: str = uuid4().hex
+        return Response(
+            multipart_chunks(boundary, heads, artifacts),
+            content_type=f'multipart/mixed; boundary={boundary}'
+        )
+
+    if ResponseFormats.ZIP == response_format:
+        r = Response(zip_chunks(artifacts), mimetype='application/zip')
+    else:
+        r = Response(tar_chunks(artifacts), mimetype='application/x-tar')
+
+    r.headers.set(
+        'Content-Disposition', 'attachment',
+        filename=f'{download_name}.{response_format}'
+    )
+
+    return r
+
+def _pick_artifacts(form: FileParseForm, result_dir: Path) -> List[Artifact]:
+
+    artifacts: List[Artifact] = []
 
     if form.return_md:
-        data['md_content'] = read_text_file(cache_dir.joinpath('content.md'))
+        artifacts.append(('md_content', result_dir.joinpath('content.md')))
 
     if form.return_info:
-        data['info'] = load_json_file(
-            cache_dir.joinpath('middle.json')
-        )
+        artifacts.append(('info', result_dir.joinpath('middle.json')))
 
     if form.return_content_list:
 
         if ParserEngines.PIPELINE == form.parser_engine:
-            data['content_list'] = load_json_file(
-                cache_dir.joinpath('content_list.scaled.json' if form.apply_scaled else 'content_list.json')
-            )
+            artifacts.append(('content_list', result_dir.joinpath(
+                'content_list.scaled.json' if form.apply_scaled else 'content_list.json'
+            )))
         else:
-            data['content_list_v2'] = load_json_file(
-                cache_dir.joinpath('content_list_v2.scaled.json' if form.apply_scaled else 'content_list_v2.json')
-            )
+            artifacts.append(('content_list_v2', result_dir.joinpath(
+                'content_list_v2.scaled.json' if form.apply_scaled else 'content_list_v2.json'
+            )))
 
     if form.return_layout:
-        data['layout'] = load_json_file(
-            cache_dir.joinpath('model.scaled.json' if form.apply_scaled else 'model.json')
-        )
+        artifacts.append(('layout', result_dir.joinpath(
+            'model.scaled.json' if form.apply_scaled else 'model.json'
+        )))
 
     if form.return_images:
-        data['images'] = pickup_images(
-            cache_dir.joinpath('images')
-        )
+        artifacts.append(('images', result_dir.joinpath('images')))
 
-    shutil.rmtree(cache_dir)
+    return artifacts
 
-    return jsonify(data)
+@parser.post('/file_parse/async')
+@bearer.login_required(role=[[TokenLabels.FILES, TokenLabels.TASKS]])
+def file_parse_async():
+
+    uploaded_file: Optional[FileStorage] = request.files.get('file')
+    form: FileUploadForm = FileUploadForm.model_validate({
+        **request.form.to_dict(), 'file': uploaded_file
+    })
+
+    if uploaded_file is None:
+        logger.fatal('file exists but passed validation rules')
+        return jsonify({
+            'error': {
+                'code': ExtraErrorCodes.INTERNAL_ERROR,
+                'message': 'file: unaccepted rules passed',
+            }
+        }), 500
+
+    days: str = arrow.now(current_app.config.get('TIMEZONE')).format('YYYY-MM-DD')
+
+    upload_dir: Path = Path(mkdtemp(prefix=f'uploaded.{days}_', dir=str(
+        Path(current_app.instance_path).joinpath('cache').resolve()
+    )))
+    input_file: Path = upload_dir.joinpath(
+        sanitize_path_fragment(uploaded_file.filename),
+    ).with_suffix('.pdf')
+
+    uploaded_file.save(input_file)
+
+    # checks are left to worker, same as tasks from file_url
+    task_uuid: str = str(uuid4())
+    task: Task = Task(
+        uuid=task_uuid, # type: ignore
+        file_id=form.file_id or task_uuid, # type: ignore
+        file_url=input_file.as_uri(), # type: ignore
+        finetune_args=json.dumps({ # type: ignore
+            'parser_engine': form.parser_engine,
+            'parser_prefer': form.parser_prefer,
+            'target_language': form.target_language,
+            'enable_formula': form.enable_formula,
+            'enable_table': form.enable_table,
+            'apply_scaled': form.apply_scaled,
+        }),
+        priority=form.priority, # type: ignore
+        callback_url=str(form.callback_url) if form.callback_url else '', # type: ignore
+        status=TaskStatus.CREATED, # type: ignore
+        result=TaskResult.NONE_, # type: ignore
+        errors=ExtraErrorCodes.NONE_, # type: ignore
+        created_at=arrow.now(current_app.config.get('TIMEZONE')).datetime, # type: ignore
+        updated_at=arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
+    )
+
+    task.queue_priority = task_priority(task)
+
+    database.session.add(task)
+    database.session.commit()
+
+    # delivery to queue, more urgent ones are consumed first
+    mining_pdf.apply_async((task.id,), priority=task.queue_priority) # type: ignore
+
+    return jsonify({
+        'task_id': task.uuid,
+    })
 
 @parser.errorhandler(ValidationError)
 def validate_failed(e: ValidationError):
@@ -1,32 +1,49 @@
+import hashlib
 import json
 import logging
+import mimetypes
+import queue
+import time
+from contextlib import ExitStack, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 from uuid import uuid4
 
 import arrow
-from flask import Blueprint, current_app, jsonify, request
+from celery import group
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_pydantic import validate
 from flask_pydantic.exceptions import ValidationError
-from sqlalchemy import select
+from sqlalchemy import Row, select
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from werkzeug.wsgi import wrap_file
 
-from ...auth import bearer
+from ...auth import auth_error, bearer
 from ...constants import TaskResult, TaskStatus, TokenLabels
 from ...exceptions import ExtraErrorCodes
 from ...extensions import database
-from ...models import Task
-from ...presenters import TaskSchema
-from ...requests import TaskRequest
+from ...models import Bearer, Callback, Task
+from ...presenters import CallbackSchema, TaskSchema
+from ...requests import ArchiveQuery, TaskBatchRequest, TaskFetchQuery, TaskListQuery, TaskRequest
 from ...tasks import mining_pdf
+from ...utils.archives import (
+    CHUNK_SIZE, archive_expiry, archive_file, list_members, open_member, send_archive, verify_archive_url
+)
+from ...utils.priority import task_priority
+from ...utils.taskevents import KEEPALIVE_INTERVAL, watch_task
 
 logger = logging.getLogger(__name__)
 
 tasks: Blueprint = Blueprint('tasks', __name__)
 
+# no transition follows these, waiting on them would only time out
+SETTLED_STATUSES = ( TaskStatus.COMPLETED, TaskStatus.TERMINATED )
 
-@tasks.post('/tasks')
-@bearer.login_required(role=TokenLabels.TASKS)
-@validate()
-def create(body: TaskRequest):
+
+def build_task(body: TaskRequest) -> Task:
+
+    moment = arrow.now(current_app.config.get('TIMEZONE')).datetime
 
     task: Task = Task(
         uuid=str(uuid4()), # type: ignore
@@ -40,42 +57,197 @@ def create(body: TaskRequest):
             'enable_table': body.enable_table,
             'apply_scaled': body.apply_scaled,
         }),
+        priority=body.priority, # type: ignore
         callback_url=str(body.callback_url), # type: ignore
         status=TaskStatus.CREATED, # type: ignore
         result=TaskResult.NONE_, # type: ignore
         errors=ExtraErrorCodes.NONE_, # type: ignore
-        created_at=arrow.now(current_app.config.get('TIMEZONE')).datetime, # type: ignore
-        updated_at=arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
+        created_at=moment, # type: ignore
+        updated_at=moment # type: ignore
     )
 
+    task.queue_priority = task_priority(task)
+
+    return task
+
+@tasks.post('/tasks')
+@bearer.login_required(role=TokenLabels.TASKS)
+@validate()
+def create(body: TaskRequest):
+
+    task: Task = build_task(body)
+
     database.session.add(task)
     database.session.commit()
 
-    # delivery to queue
-    mining_pdf.delay(task.id) # type: ignore
+    # delivery to queue, more urgent ones are consumed first
+    mining_pdf.apply_async((task.id,), priority=task.queue_priority) # type: ignore
 
     return jsonify({
         'task_id': task.uuid,
     })
 
+@tasks.post('/tasks/batch')
+@bearer.login_required(role=TokenLabels.TASKS)
+@validate()
+def create_batch(body: TaskBatchRequest):
 
-@tasks.get('/tasks/<string:task_id>')
+    limit: int = int(current_app.config.get('TASKS_BATCH_MAX') or 1)
+    if len(body.tasks) > limit:
+        return jsonify({
+            'error': {
+                'code': ExtraErrorCodes.VALIDATION_FAIL,
+                'message': f'tasks: expected at most {limit} tasks, {len(body.tasks)} given',
+            },
+        }), 422
+
+    batch: List[Task] = [ build_task(item) for item in body.tasks ]
+
+    # one transaction, inserted in bulk by the unit of work, read back before
+    # commit expires them, else every row is loaded again one by one
+    database.session.add_all(batch)
+    database.session.flush()
+    created: List[tuple] = [ (task.id, task.uuid, task.queue_priority) for task in batch ]
+    database.session.commit()
+
+    # one producer connection for all messages instead of one each
+    group(
+        mining_pdf.si(task_id).set(priority=priority) # type: ignore
+        for task_id, _, priority in created
+    ).apply_async()
+
+    return jsonify({
+        'task_ids': [ task_uuid for _, task_uuid, _ in created ],
+    })
+
+
+@tasks.get('/tasks')
 @bearer.login_required(role=TokenLabels.TASKS)
 @validate()
-def fetch(task_id: str):
+def search(query: TaskListQuery):
+
+    limit: int = int(current_app.config.get('TASKS_PAGE_MAX') or 1)
+
+    # bulk status lookup, in the order asked
+    if query.ids is not None:
+        task_ids: List[str] = list(dict.fromkeys(
+            task_id.strip() for task_id in query.ids.split(',') if task_id.strip()
+        ))
+        if len(task_ids) > limit:
+            return jsonify({
+                'error': {
+                    'code': ExtraErrorCodes.VALIDATION_FAIL,
+                    'message': f'ids: expected at most {limit} ids, {len(task_ids)} given',
+                },
+            }), 422
+
+        found: Dict[str, Task] = {
+            task.uuid: task for task in database.session.scalars(
+                select(Task).where(Task.uuid.in_(task_ids))
+            )
+        }
 
-    try:
-        task: Task = database.session.scalars(
-            select(Task).where(Task.uuid == task_id).order_by(Task.id.desc())
-        ).one()
-    except MultipleResultsFound:
         return jsonify({
+            'data': [ present_task(found[task_id]) for task_id in task_ids if task_id in found ],
+            'missing': [ task_id for task_id in task_ids if task_id not in found ],
+        })
+
+    # keyset pagination, newest first, cursor is the last id of previous page
+    statement = select(Task).order_by(Task.id.desc()).limit(min(query.limit, limit) + 1)
+
+    if query.status is not None:
+        statement = statement.where(Task.status == query.status)
+    if query.since is not None:
+        statement = statement.where(Task.created_at >= as_local(query.since))
+    if query.until is not None:
+        statement = statement.where(Task.created_at < as_local(query.until))
+    if query.cursor is not None:
+        statement = statement.where(Task.id < query.cursor)
+
+    rows: List[Task] = list(database.session.scalars(statement))
+    page: List[Task] = rows[:min(query.limit, limit)]
+
+    return jsonify({
+        'data': [ present_task(task) for task in page ],
+        'cursor': page[-1].id if len(rows) > len(page) else None,
+    })
+
+@tasks.get('/tasks/<string:task_id>')
+@bearer.login_required(role=TokenLabels.TASKS)
+@validate()
+def fetch(task_id: str, query: TaskFetchQuery):
+
+    # subscribed before reading, so a transition in between is not missed
+    with watch_task(task_id) if query.wait else nullcontext() as changes:
+
+        try:
+            version: Row = task_version(task_id)
+        except MultipleResultsFound:
+            return jsonify({
+                'error': {
+                    'code': ExtraErrorCodes.INTERNAL_ERROR,
+                    'message': f'multiple results found for task <{task_id}>',
+                },
+            }), 500
+        except NoResultFound:
+            return jsonify({
+                'error': {
+                    'code': ExtraErrorCodes.TASK_NOT_FOUND,
+                    'message': 'task not found, please review task_id and try again',
+                },
+            }), 404
+
+        # long poll, answered at once when waiters are full, nothing is left
+        # to change, or the client holds an older version than this one
+        if changes is not None and version.status not in SETTLED_STATUSES and (
+            not request.if_none_match or request.if_none_match.contains_weak(task_etag(version))
+        ):
+            # gives the connection back while waiting
+            database.session.commit()
+            try:
+                changes.get(timeout=min(query.wait, float(current_app.config.get('TASK_EVENTS_MAX_WAIT') or 0)))
+                version = task_version(task_id)
+            except queue.Empty:
+                pass
+
+        etag: str = task_etag(version)
+
+        # unchanged since the client last read it, skip loading and serializing
+        if request.if_none_match.contains_weak(etag):
+            r = Response(status=304)
+        else:
+            task: Task = database.session.get_one(Task, version.id)
+            r = jsonify(present_task(task, with_id=False))
+
+        r.set_etag(etag, weak=True)
+        r.cache_control.no_cache = True
+
+        return r
+
+@tasks.get('/tasks/<string:task_id>/events')
+@bearer.login_required(role=TokenLabels.TASKS)
+def events(task_id: str):
+
+    stack = ExitStack()
+    changes: Optional[queue.Queue] = stack.enter_context(watch_task(task_id))
+
+    if changes is None:
+        stack.close()
+        r = jsonify({
             'error': {
-                'code': ExtraErrorCodes.INTERNAL_ERROR,
-                'message': f'multiple results found for task <{task_id}>',
+                'code': ExtraErrorCodes.TOO_MANY_WAITERS,
+                'message': 'too many clients waiting on this worker, poll or retry later',
             },
-        }), 500
-    except NoResultFound:
+        })
+        r.retry_after = 5 # type: ignore
+        return r, 503
+
+    task: Optional[Task] = database.session.scalars(
+        select(Task).where(Task.uuid == task_id).limit(1)
+    ).first()
+
+    if task is None:
+        stack.close()
         return jsonify({
             'error': {
                 'code': ExtraErrorCodes.TASK_NOT_FOUND,
@@ -83,6 +255,68 @@ def fetch(task_id: str):
             },
         }), 404
 
+    task_pk: int = task.id
+
+    def stream() -> Iterator[str]:
+
+        deadline: float = time.monotonic() + float(current_app.config.get('TASK_EVENTS_STREAM_TIMEOUT') or 0)
+        yield 'retry: 5000\n\n'
+
+        while True:
+            # read again each time, the stream outlives the session of the view
+            current: Task = database.session.scalars(select(Task).where(Task.id == task_pk)).one()
+            yield f'event: status\ndata: {json.dumps(present_task(current))}\n\n'
+            if current.status in SETTLED_STATUSES:
+                return
+            # gives the connection back while waiting
+            database.session.commit()
+
+            # comments keep proxies from closing, and find gone clients
+            while (left := deadline - time.monotonic()) > 0:
+                try:
+                    changes.get(timeout=min(KEEPALIVE_INTERVAL, left))
+                    break
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+            else:
+                return
+
+    r = Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # the generator may never start, e.g. client gone before the first byte
+    r.call_on_close(stack.close)
+
+    return r
+
+def task_version(task_id: str) -> Row:
+    """Columns of task its representation changes with, without a full load"""
+
+    return database.session.execute(
+        select(Task.id, Task.status, Task.result, Task.pages_done, Task.updated_at).
+        where(Task.uuid == task_id).
+        order_by(Task.id.desc())
+    ).one()
+
+def task_etag(version: Row) -> str:
+    """
+    Validator of task representation, weak because eta keeps counting down
+    between versions while the rest of the document stays the same
+    """
+
+    columns: list = [ *version ]
+
+    # signed archive url of completed ones is renewed now and then
+    if TaskStatus.COMPLETED == version.status:
+        columns.append(archive_expiry())
+
+    return hashlib.sha1(
+        '|'.join(str(column) for column in columns).encode()
+    ).hexdigest()[:20]
+
+def present_task(task: Task, with_id: bool = True) -> dict:
+
     host: str = request.host_url
     data: dict = TaskSchema().dump(task) # type: ignore
 
@@ -90,14 +324,147 @@ def fetch(task_id: str):
         if 'location' in data['tarball']:
             data['tarball']['location'] = host + data['tarball']['location']
 
-    return jsonify(data)
+    return { 'task_id': task.uuid, **data } if with_id else data
+
+def as_local(moment: datetime) -> datetime:
+    """Moment in the configured zone, which is how timestamps are stored"""
+
+    timezone = current_app.config.get('TIMEZONE')
+
+    if moment.tzinfo is None:
+        return arrow.get(moment, tzinfo=timezone).datetime
+
+    return arrow.get(moment).to(timezone).datetime
+
+@tasks.get('/tasks/<string:task_id>/archive')
+@bearer.login_required(role=TokenLabels.TASKS, optional=True)
+@validate()
+def archive(task_id: str, query: ArchiveQuery):
+
+    task, path, failure = find_archive(task_id, query)
+
+    if failure is not None:
+        return failure
+
+    # checksum is the same on every worker, so resumes validate anywhere
+    return send_archive(path, etag=task.tarball_checksum or None) # type: ignore
+
+@tasks.get('/tasks/<string:task_id>/artifacts')
+@bearer.login_required(role=TokenLabels.TASKS, optional=True)
+@validate()
+def artifacts(task_id: str, query: ArchiveQuery):
+
+    _, path, failure = find_archive(task_id, query)
+
+    if failure is not None:
+        return failure
+
+    return jsonify({
+        'data': [ member._asdict() for member in list_members(path) ], # type: ignore
+    })
+
+@tasks.get('/tasks/<string:task_id>/artifacts/<path:name>')
+@bearer.login_required(role=TokenLabels.TASKS, optional=True)
+@validate()
+def artifact(task_id: str, name: str, query: ArchiveQuery):
+
+    task, path, failure = find_archive(task_id, query)
+
+    if failure is not None:
+        return failure
+
+    opened = open_member(path, name) # type: ignore
+
+    if opened is None:
+        return jsonify({
+            'error': {
+                'code': ExtraErrorCodes.ARTIFACT_NOT_FOUND,
+                'message': f'archive has no file <{name}>',
+            },
+        }), 404
+
+    member, file = opened
+
+    # closed along with the response, a 304 or range one included
+    r = Response(
+        wrap_file(request.environ, file, buffer_size=CHUNK_SIZE),
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        direct_passthrough=True,
+    )
+    r.content_length = member.size
+
+    # members never change once packed, resumed with ranges, skipped to
+    # the start of a deflated one by inflating the part before it
+    r.set_etag(f'{task.tarball_checksum}:{member.checksum}')
+
+    return r.make_conditional(request, accept_ranges=True, complete_length=member.size)
+
+def find_archive(task_id: str, query: ArchiveQuery) -> tuple:
+    """Task with its archive, or the failure response when denied or missing"""
+
+    # signed url stands in for the token, e.g. handed to a browser or callback receiver
+    if not verify_archive_url(task_id, query.expires, query.signature):
+        user: Optional[Bearer] = bearer.current_user()
+        if user is None:
+            return None, None, auth_error(403 if query.signature else 401)
+        if not bearer.authorize(TokenLabels.TASKS, user, bearer.get_auth()):
+            return None, None, auth_error(403)
+
+    task: Optional[Task] = database.session.scalars(
+        select(Task).where(Task.uuid == task_id).order_by(Task.id.desc()).limit(1)
+    ).first()
+
+    if task is None:
+        return None, None, (jsonify({
+            'error': {
+                'code': ExtraErrorCodes.TASK_NOT_FOUND,
+                'message': 'task not found, please review task_id and try again',
+            },
+        }), 404)
+
+    path: Optional[Path] = archive_file(task.tarball_location) if TaskStatus.COMPLETED == task.status else None
+
+    if path is None:
+        return task, None, (jsonify({
+            'error': {
+                'code': ExtraErrorCodes.ARCHIVE_NOT_FOUND,
+                'message': 'archive not ready or pruned already',
+            },
+        }), 404)
+
+    return task, path, None
+
+@tasks.get('/tasks/<string:task_id>/callbacks')
+@bearer.login_required(role=TokenLabels.TASKS)
+@validate()
+def callbacks(task_id: str):
+
+    task: Optional[Task] = database.session.scalars(
+        select(Task).where(Task.uuid == task_id).order_by(Task.id.desc()).limit(1)
+    ).first()
+
+    if task is None:
+        return jsonify({
+            'error': {
+                'code': ExtraErrorCodes.TASK_NOT_FOUND,
+                'message': 'task not found, please review task_id and try again',
+            },
+        }), 404
+
+    deliveries = database.session.scalars(
+        select(Callback).where(Callback.task_id == task.id).order_by(Callback.id)
+    ).all()
+
+    return jsonify({
+        'data': CallbackSchema(many=True).dump(deliveries),
+    })
 
 @tasks.errorhandler(ValidationError)
 def validate_failed(e: ValidationError):
 
     errors = []
-    for field in e.body_params: # type: ignore
-        errors.append(str(field['loc'][0]) + ': ' + field['msg'].lower())
+    for field in [ *(e.body_params or []), *(e.query_params or []) ]: # type: ignore
+        errors.append('.'.join(str(loc) for loc in field['loc']) + ': ' + field['msg'].lower())
 
     return jsonify({
         'error': {
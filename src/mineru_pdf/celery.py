@@ -3,9 +3,13 @@ import logging.config
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
+from flask import Flask
 
 from . import create_app
-from .tasks import prune_archives, remove_workdir
+from .tasks import age_tasks, prune_archives, remove_workdir, sweep_callbacks
+from .utils.outbox import SWEEP_INTERVAL
+from .utils.warmup import warmup_models
 
 
 logging.config.dictConfig({
@@ -38,7 +42,18 @@ logging.config.dictConfig({
     }
 })
 
-app: Celery = create_app().extensions["celery"]
+flask_app: Flask = create_app()
+app: Celery = flask_app.extensions["celery"]
+
+@worker_process_init.connect # type: ignore
+def setup_warmup_models(**kwargs):
+
+    # cpu only workers never infer, keep models out of them
+    if flask_app.config.get('GPU_QUEUE') not in app.amqp.queues.consume_from:
+        return
+
+    with flask_app.app_context():
+        warmup_models()
 
 @app.on_after_configure.connect # type: ignore
 def setup_periodic_tasks(sender: Celery, **kwargs):
@@ -52,3 +67,13 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
     sender.add_periodic_task(
         crontab(hour=6, minute=7), prune_archives.signature() # type: ignore
     )
+
+    # Sweep due callbacks every minute
+    sender.add_periodic_task(
+        float(SWEEP_INTERVAL), sweep_callbacks.signature() # type: ignore
+    )
+
+    # Promote long waiting tasks every minute
+    sender.add_periodic_task(
+        60.0, age_tasks.signature() # type: ignore
+    )
@@ -0,0 +1,43 @@
+import sys
+
+import click
+
+from ..utils.resultcache import evict_results, reset_stats, result_stats
+
+
+@click.group()
+def cache():
+    """Manage parsed result cache"""
+
+@cache.command('stats')
+def stats():
+    """
+    Show hit and miss counters of the result cache
+    """
+
+    data: dict = result_stats()
+
+    lookups: int = data['hits'] + data['misses']
+    ratio: float = data['hits'] / lookups if lookups > 0 else 0.0
+
+    click.echo(f'entries   {data["entries"]}')
+    click.echo(f'size      {data["size"]} / {data["budget"]} bytes')
+    click.echo(f'hits      {data["hits"]}')
+    click.echo(f'misses    {data["misses"]}')
+    click.echo(f'evictions {data["evictions"]}')
+    click.echo(f'ratio     {ratio:.2%}')
+
+    sys.exit(0)
+
+@cache.command('clear')
+def clear():
+    """
+    Remove all entries and counters of the result cache
+    """
+
+    evicted: int = evict_results(budget=0)
+    reset_stats()
+
+    click.secho(f'removed {evicted} entries from result cache', fg='green')
+
+    sys.exit(0)
@@ -0,0 +1,77 @@
+import sys
+from typing import Optional
+
+import arrow
+import click
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from ..constants import CallbackStatus
+from ..extensions import database
+from ..models import Callback
+
+
+@click.group()
+def callbacks():
+    """Inspect and retry callback deliveries"""
+
+@callbacks.command('stats')
+@click.option('--host', type=str, default=None, help='Only callbacks to the host')
+def stats(host: Optional[str]):
+    """
+    Show callbacks per receiver host and delivery status
+    """
+
+    statement = select(
+        Callback.host, Callback.status,
+        func.count(Callback.id),
+        func.max(Callback.attempts),
+    ).group_by(
+        Callback.host, Callback.status
+    ).order_by(
+        Callback.host, Callback.status
+    )
+
+    if host is not None:
+        statement = statement.where(Callback.host == host.lower())
+
+    rows = database.session.execute(statement).all()
+
+    if len(rows) < 1:
+        click.secho('no callback recorded yet', fg='yellow')
+        sys.exit(0)
+
+    click.echo(f'{"host":<40} {"status":<12} {"count":>7} {"max tries":>9}')
+    for host_, status, count, attempts in rows:
+        click.echo(f'{host_:<40} {status:<12} {count:>7} {attempts:>9}')
+
+    sys.exit(0)
+
+@callbacks.command('retry')
+@click.option('--host', type=str, default=None, help='Only callbacks to the host')
+def retry(host: Optional[str]):
+    """
+    Queue failed callbacks for delivery again
+    """
+
+    from ..tasks import sweep_callbacks
+
+    now = arrow.now(current_app.config.get('TIMEZONE')).datetime
+    statement = update(Callback).where(
+        Callback.status == CallbackStatus.FAILED
+    ).values(
+        status=CallbackStatus.PENDING, attempts=0, next_attempt_at=now, updated_at=now
+    )
+
+    if host is not None:
+        statement = statement.where(Callback.host == host.lower())
+
+    requeued: int = database.session.execute(statement).rowcount # type: ignore
+    database.session.commit()
+
+    if requeued > 0:
+        sweep_callbacks.delay() # type: ignore
+
+    click.secho(f'requeued {requeued} failed callbacks', fg='green')
+
+    sys.exit(0)
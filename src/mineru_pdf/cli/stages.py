@@ -0,0 +1,57 @@
+import sys
+from typing import Optional
+
+import click
+from sqlalchemy import func, select
+
+from ..extensions import database
+from ..models import TaskEvent
+
+
+@click.group()
+def stages():
+    """Inspect time spent in task stages"""
+
+@stages.command('report')
+@click.option('--engine', type=str, default=None, help='Only stages run by the engine')
+@click.option('--min-pages', type=int, default=None, help='Only documents with at least pages')
+@click.option('--max-pages', type=int, default=None, help='Only documents with at most pages')
+def report(engine: Optional[str], min_pages: Optional[int], max_pages: Optional[int]):
+    """
+    Show durations per stage and engine, recorded by workers
+    """
+
+    statement = select(
+        TaskEvent.stage, TaskEvent.engine,
+        func.count(TaskEvent.id),
+        func.sum(TaskEvent.elapsed_ms),
+        func.sum(TaskEvent.pages),
+        func.max(TaskEvent.elapsed_ms),
+    ).group_by(
+        TaskEvent.stage, TaskEvent.engine
+    ).order_by(
+        func.sum(TaskEvent.elapsed_ms).desc()
+    )
+
+    if engine is not None:
+        statement = statement.where(TaskEvent.engine == engine)
+    if min_pages is not None:
+        statement = statement.where(TaskEvent.pages >= min_pages)
+    if max_pages is not None:
+        statement = statement.where(TaskEvent.pages <= max_pages)
+
+    rows = database.session.execute(statement).all()
+
+    if len(rows) < 1:
+        click.secho('no stage recorded yet', fg='yellow')
+        sys.exit(0)
+
+    click.echo(f'{"stage":<12} {"engine":<28} {"count":>7} {"total s":>10} {"avg ms":>9} {"max ms":>9} {"ms/page":>9}')
+    for stage, engine_, count, total, pages, longest in rows:
+        per_page: str = f'{total / pages:.1f}' if pages else '-'
+        click.echo(
+            f'{stage:<12} {engine_ or "-":<28} {count:>7} {total / 1000:>10.1f} '
+            f'{total / count:>9.0f} {longest:>9} {per_page:>9}'
+        )
+
+    sys.exit(0)
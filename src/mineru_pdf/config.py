@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Union, Optional
+from typing import List, Union, Optional
 
 from dotenv import dotenv_values
 from filesizelib import FileSize
@@ -40,6 +40,10 @@ class Default_(object):
     def PDF_MAX_PAGE(self) -> str:
         return self.env_pair.get('PDF_MAX_PAGE') or '2000'
 
+    @property
+    def PDF_SHARD_PAGES(self) -> int:
+        return int(self.env_pair.get('PDF_SHARD_PAGES') or '0')
+
     @property
     def PDF_MAX_SIZE(self) -> str:
         return self.env_pair.get('PDF_MAX_SIZE') or '200MiB'
@@ -50,6 +54,34 @@ class Default_(object):
             self.env_pair.get('MAX_CONTENT_LENGTH') or '50MiB'
         ).convert_to_bytes())
 
+    @property
+    def DOWNLOAD_CONNECT_TIMEOUT(self) -> float:
+        return float(self.env_pair.get('DOWNLOAD_CONNECT_TIMEOUT') or '10')
+
+    @property
+    def DOWNLOAD_READ_TIMEOUT(self) -> float:
+        return float(self.env_pair.get('DOWNLOAD_READ_TIMEOUT') or '60')
+
+    @property
+    def DOWNLOAD_RANGE_SIZE(self) -> int:
+        return int(FileSize(
+            self.env_pair.get('DOWNLOAD_RANGE_SIZE') or '16MiB'
+        ).convert_to_bytes())
+
+    @property
+    def DOWNLOAD_RANGE_PARTS(self) -> int:
+        return int(self.env_pair.get('DOWNLOAD_RANGE_PARTS') or '4')
+
+    @property
+    def DOWNLOAD_CACHE_SIZE(self) -> int:
+        return int(FileSize(
+            self.env_pair.get('DOWNLOAD_CACHE_SIZE') or '2GiB'
+        ).convert_to_bytes())
+
+    @property
+    def DOWNLOAD_CACHE_TTL(self) -> int:
+        return int(self.env_pair.get('DOWNLOAD_CACHE_TTL') or '86400')
+
     @property
     def WORKDIR_KEEP_DAYS(self) -> int:
         return int(self.env_pair.get('WORKDIR_KEEP_DAYS') or '16')
@@ -58,6 +90,146 @@ class Default_(object):
     def ARCHIVE_KEEP_DAYS(self) -> int:
         return int(self.env_pair.get('ARCHIVE_KEEP_DAYS') or '720')
 
+    @property
+    def ARCHIVE_SENDFILE(self) -> str:
+        return (self.env_pair.get('ARCHIVE_SENDFILE') or '').lower()
+
+    @property
+    def ARCHIVE_ACCEL_PREFIX(self) -> str:
+        return self.env_pair.get('ARCHIVE_ACCEL_PREFIX') or '/_archives/'
+
+    @property
+    def ARCHIVE_URL_TTL(self) -> int:
+        return int(self.env_pair.get('ARCHIVE_URL_TTL') or '86400')
+
+    @property
+    def RESULT_CACHE_SIZE(self) -> int:
+        return int(FileSize(
+            self.env_pair.get('RESULT_CACHE_SIZE') or '10GiB'
+        ).convert_to_bytes())
+
+    @property
+    def TASKS_BATCH_MAX(self) -> int:
+        return int(self.env_pair.get('TASKS_BATCH_MAX') or '1000')
+
+    @property
+    def TASKS_PAGE_MAX(self) -> int:
+        return int(self.env_pair.get('TASKS_PAGE_MAX') or '500')
+
+    @property
+    def TASK_EVENTS_URL(self) -> str:
+
+        url: Optional[str] = self.env_pair.get('TASK_EVENTS_URL')
+        if url:
+            return url
+
+        # redis broker carries pub/sub as well, otherwise in-process only
+        broker: str = self.env_pair.get('CELERY_BROKER_URL') or ''
+        return broker if broker.startswith(('redis://', 'rediss://')) else 'memory://'
+
+    @property
+    def TASK_EVENTS_MAX_WAITERS(self) -> int:
+        return int(self.env_pair.get('TASK_EVENTS_MAX_WAITERS') or '24')
+
+    @property
+    def TASK_EVENTS_MAX_WAIT(self) -> float:
+        return float(self.env_pair.get('TASK_EVENTS_MAX_WAIT') or '60')
+
+    @property
+    def TASK_EVENTS_STREAM_TIMEOUT(self) -> float:
+        return float(self.env_pair.get('TASK_EVENTS_STREAM_TIMEOUT') or '600')
+
+    @property
+    def BATCH_MAX_TASKS(self) -> int:
+        return int(self.env_pair.get('BATCH_MAX_TASKS') or '1')
+
+    @property
+    def BATCH_LINGER(self) -> float:
+        return float(self.env_pair.get('BATCH_LINGER') or '2')
+
+    @property
+    def CPU_QUEUE(self) -> str:
+        return self.env_pair.get('CPU_QUEUE') or 'cpu'
+
+    @property
+    def GPU_QUEUE(self) -> str:
+        return self.env_pair.get('GPU_QUEUE') or 'gpu'
+
+    @property
+    def PRIORITY_SHORT_PAGES(self) -> int:
+        return int(self.env_pair.get('PRIORITY_SHORT_PAGES') or '20')
+
+    @property
+    def PRIORITY_LONG_PAGES(self) -> int:
+        return int(self.env_pair.get('PRIORITY_LONG_PAGES') or '300')
+
+    @property
+    def PRIORITY_AGING(self) -> float:
+        return float(self.env_pair.get('PRIORITY_AGING') or '300')
+
+    @property
+    def CALLBACK_QUEUE(self) -> str:
+        return self.env_pair.get('CALLBACK_QUEUE') or 'callback'
+
+    @property
+    def CALLBACK_TIMEOUT(self) -> float:
+        return float(self.env_pair.get('CALLBACK_TIMEOUT') or '10')
+
+    @property
+    def CALLBACK_MAX_ATTEMPTS(self) -> int:
+        return int(self.env_pair.get('CALLBACK_MAX_ATTEMPTS') or '10')
+
+    @property
+    def CALLBACK_BACKOFF(self) -> float:
+        return float(self.env_pair.get('CALLBACK_BACKOFF') or '5')
+
+    @property
+    def CALLBACK_BACKOFF_MAX(self) -> float:
+        return float(self.env_pair.get('CALLBACK_BACKOFF_MAX') or '3600')
+
+    @property
+    def CALLBACK_HOST_CONCURRENCY(self) -> int:
+        return int(self.env_pair.get('CALLBACK_HOST_CONCURRENCY') or '2')
+
+    @property
+    def CALLBACK_BATCH_HOSTS(self) -> List[str]:
+        return [
+            host.strip().lower() for host in (self.env_pair.get('CALLBACK_BATCH_HOSTS') or '').split(',')
+            if host.strip()
+        ]
+
+    @property
+    def CALLBACK_BATCH_SIZE(self) -> int:
+        return int(self.env_pair.get('CALLBACK_BATCH_SIZE') or '20')
+
+    @property
+    def GPU_ADMISSION_SLOTS(self) -> int:
+        return int(self.env_pair.get('GPU_ADMISSION_SLOTS') or '8')
+
+    @property
+    def GPU_ADMISSION_WAIT(self) -> float:
+        return float(self.env_pair.get('GPU_ADMISSION_WAIT') or '30')
+
+    @property
+    def GPU_PAGES_PER_SLOT(self) -> int:
+        return int(self.env_pair.get('GPU_PAGES_PER_SLOT') or '100')
+
+    @property
+    def GPU_SECONDS_PER_PAGE(self) -> float:
+        return float(self.env_pair.get('GPU_SECONDS_PER_PAGE') or '2')
+
+    @property
+    def WARMUP_ENGINE(self) -> Optional[str]:
+        return self.env_pair.get('WARMUP_ENGINE') or None
+
+    @property
+    def WARMUP_SYNTHETIC(self) -> bool:
+        return (self.env_pair.get('WARMUP_SYNTHETIC') or 'false').lower() in [ 'true', '1', 'yes' ]
+
+    @property
+    def WARMUP_TIMEOUT(self) -> int:
+        return int(self.env_pair.get('WARMUP_TIMEOUT') or '600')
+
     ###
     ### Flask SQLAlchemy
     ###
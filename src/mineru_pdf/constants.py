@@ -4,6 +4,12 @@ class TokenLabels(StrEnum):
     FILES = 'files'
     TASKS = 'tasks'
 
+class CallbackStatus(StrEnum):
+    PENDING = 'PENDING'
+    DELIVERING = 'DELIVERING'
+    DELIVERED = 'DELIVERED'
+    FAILED = 'FAILED'
+
 class ParserEngines(StrEnum):
     PIPELINE = 'pipeline'
     VLM_AUTO_ENGINE = 'vlm-auto-engine'
@@ -18,6 +24,18 @@ class ParserPrefers(StrEnum):
     TXT = 'txt'
     OCR = 'ocr'
 
+class ResponseFormats(StrEnum):
+    JSON = 'json'
+    NDJSON = 'ndjson'
+    MULTIPART = 'multipart'
+    ZIP = 'zip'
+    TAR = 'tar'
+
+class TaskPriorities(StrEnum):
+    HIGH = 'high'
+    NORMAL = 'normal'
+    LOW = 'low'
+
 class TargetLanguages(StrEnum):
     ARABIC = 'arabic'
     CH = 'ch'
@@ -41,7 +59,9 @@ class TaskResult(StrEnum):
     NONE_ = 'NONE'
     COLLECTING = 'COLLECTING'
     CHECKING = 'CHECKING'
+    STAGED = 'STAGED'
     INFERRING = 'INFERRING'
+    INFERRED = 'INFERRED'
     PACKING = 'PACKING'
     CLEANING = 'CLEANING'
     FINISHED = 'FINISHED'
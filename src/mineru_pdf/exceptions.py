@@ -13,6 +13,9 @@ class ExtraErrorCodes(StrEnum):
 
     VALIDATION_FAIL = 'ValidationFail'
     TASK_NOT_FOUND = 'TaskNotFound'
+    ARCHIVE_NOT_FOUND = 'ArchiveNotFound'
+    ARTIFACT_NOT_FOUND = 'ArtifactNotFound'
+    TOO_MANY_WAITERS = 'TooManyWaiters'
 
 class AppBaseException(Exception):
     """The app base exception"""
@@ -32,6 +35,15 @@ class GPUOutOfMemoryException(AppBaseException):
 
     code = 'GpuOutOfMemory'
 
+class GPUAdmissionRejectedError(AppBaseException):
+    """GPU slots unavailable within waiting time"""
+
+    code = 'GpuAdmissionRejected'
+
+    def __init__(self, *args, retry_after: int = 1):
+        super().__init__(*args)
+        self.retry_after = retry_after
+
 class FileEncryptionFoundError(AppBaseException):
     """File has been encrypted"""
 
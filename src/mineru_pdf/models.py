@@ -1,6 +1,6 @@
 from typing import Optional
 
-from sqlalchemy import INTEGER, String, TIMESTAMP
+from sqlalchemy import INTEGER, Index, String, Text, TIMESTAMP
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .extensions import database
@@ -18,23 +18,65 @@ class Bearer(database.Model):
     created_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
     updated_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
 
+class Callback(database.Model):
+
+    __tablename__ = 'callbacks'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id: Mapped[int] = mapped_column(INTEGER(), primary_key=True, autoincrement=True, nullable=False)
+    task_id: Mapped[int] = mapped_column(INTEGER(), nullable=False, index=True, default=0, insert_default=0)
+    url: Mapped[str] = mapped_column(String(2048), nullable=False, default='', insert_default='')
+    host: Mapped[str] = mapped_column(String(255), nullable=False, index=True, default='', insert_default='')
+    payload: Mapped[str] = mapped_column(Text(), nullable=False, default='', insert_default='')
+    status: Mapped[str] = mapped_column(String(32), nullable=False, default='', insert_default='')
+    attempts: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    last_code: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    last_error: Mapped[str] = mapped_column(String(255), nullable=False, default='', insert_default='')
+    next_attempt_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+    delivered_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+    created_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+    updated_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+
 class Task(database.Model):
 
     __tablename__ = 'tasks'
-    __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        # listing filtered by status walks id backwards from a cursor
+        Index('ix_tasks_status_id', 'status', 'id'),
+        {'sqlite_autoincrement': True},
+    )
 
     id: Mapped[int] = mapped_column(INTEGER(), primary_key=True, autoincrement=True, nullable=False)
-    uuid: Mapped[str] = mapped_column(String(128), nullable=False, default='', insert_default='')
-    file_id: Mapped[str] = mapped_column(String(128), nullable=False, default='', insert_default='')
+    uuid: Mapped[str] = mapped_column(String(128), nullable=False, unique=True, index=True, default='', insert_default='')
+    file_id: Mapped[str] = mapped_column(String(128), nullable=False, index=True, default='', insert_default='')
     file_url: Mapped[str] = mapped_column(String(2048), nullable=False, default='', insert_default='')
     finetune_args: Mapped[str] = mapped_column(String(2048), nullable=False, default='', insert_default='')
     callback_url: Mapped[Optional[str]] = mapped_column(String(2048), nullable=False, default='', insert_default='')
     tarball_location: Mapped[str] = mapped_column(String(2048), nullable=False, default='', insert_default='')
     tarball_checksum: Mapped[str] = mapped_column(String(255), nullable=False, default='', insert_default='')
+    result_key: Mapped[str] = mapped_column(String(64), nullable=False, default='', insert_default='')
     status: Mapped[str] = mapped_column(String(32), nullable=False, default='', insert_default='')
     result: Mapped[str] = mapped_column(String(32), nullable=False, default='', insert_default='')
     errors: Mapped[str] = mapped_column(String(128), nullable=False, default='', insert_default='')
+    pages_done: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    pages_total: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    priority: Mapped[str] = mapped_column(String(16), nullable=False, default='normal', insert_default='normal')
+    queue_priority: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=5, insert_default=5)
     started_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
     finished_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
-    created_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+    created_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True, index=True)
     updated_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+
+class TaskEvent(database.Model):
+
+    __tablename__ = 'task_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id: Mapped[int] = mapped_column(INTEGER(), primary_key=True, autoincrement=True, nullable=False)
+    task_id: Mapped[int] = mapped_column(INTEGER(), nullable=False, index=True, default=0, insert_default=0)
+    stage: Mapped[str] = mapped_column(String(32), nullable=False, default='', insert_default='')
+    engine: Mapped[str] = mapped_column(String(64), nullable=False, default='', insert_default='')
+    pages: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    elapsed_ms: Mapped[int] = mapped_column(INTEGER(), nullable=False, default=0, insert_default=0)
+    started_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
+    finished_at: Mapped[Optional[TIMESTAMP]] = mapped_column(TIMESTAMP(True), nullable=True)
@@ -1,7 +1,11 @@
+import json
+
 from marshmallow import EXCLUDE, Schema, fields, post_dump
 
-from .constants import TaskStatus
-from .models import Task
+from .constants import ParserEngines, TaskStatus
+from .models import Callback, Task
+from .utils.archives import archive_url
+from .utils.progress import estimate_eta
 
 
 class TaskSchema(Schema):
@@ -22,10 +26,44 @@ class TaskSchema(Schema):
     errors = fields.String()
     started_at = fields.DateTime()
     finished_at = fields.DateTime()
+    pages_done = fields.Integer()
+    pages_total = fields.Integer()
+    priority = fields.String()
+    eta = fields.Method('to_eta')
     tarball = fields.Method('to_tarball')
 
+    def to_eta(self, task: Task):
+
+        if TaskStatus.RUNNING != task.status:
+            return None
+
+        try:
+            engine = json.loads(task.finetune_args).get('parser_engine')
+        except (json.decoder.JSONDecodeError, TypeError, AttributeError):
+            engine = None
+
+        return estimate_eta(task, engine or ParserEngines.HYBRID_HTTP_CLIENT)
+
     def to_tarball(self, task: Task):
         return {
-            'location': task.tarball_location,
+            'location': archive_url(task.uuid),
             'checksum': task.tarball_checksum,
         } if TaskStatus.COMPLETED == task.status else None
+
+class CallbackSchema(Schema):
+
+    @post_dump
+    def remove_none_values(self, data, **kwargs):
+        return { k: v for k, v in data.items() if v is not None }
+
+    class Meta:
+        unknown = EXCLUDE
+
+    url = fields.String()
+    status = fields.String()
+    attempts = fields.Integer()
+    last_code = fields.Integer()
+    last_error = fields.String()
+    next_attempt_at = fields.DateTime()
+    delivered_at = fields.DateTime()
+    created_at = fields.DateTime()
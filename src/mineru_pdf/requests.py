@@ -1,10 +1,11 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, List
 from re import sub as preg_replace
 
 from pydantic import BaseModel, ConfigDict, Field, HttpUrl, AfterValidator, field_validator
 from werkzeug.datastructures import FileStorage
 
-from .constants import ParserEngines, ParserPrefers, TargetLanguages
+from .constants import ParserEngines, ParserPrefers, ResponseFormats, TargetLanguages, TaskPriorities, TaskStatus
 
 def safe_fileid(value):
     result: str = preg_replace(r'[a-zA-z0-9-_.@]+', '', value)
@@ -17,6 +18,22 @@ def safe_fileid(value):
 
     return value
 
+def safe_pdffile(v):
+
+    if not isinstance(v, FileStorage):
+        raise TypeError("file must be a FileStorage")
+
+    if not v.filename:
+        raise ValueError("file is required")
+
+    ext = v.filename.rsplit(".", 1)[-1].lower() if "." in v.filename else ""
+    if 'pdf' != ext:
+        raise ValueError(f"unsupported file extension {ext}")
+    if 'application/pdf' != v.mimetype:
+        raise ValueError(f"unsupported mimetype: {v.mimetype}")
+
+    return v
+
 class FileParseForm(BaseModel):
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -34,23 +51,30 @@ class FileParseForm(BaseModel):
     return_content_list: Annotated[bool, Field(default=True)]
     return_layout: Annotated[bool, Field(default=True)]
     return_images: Annotated[bool, Field(default=True)]
+    response_format: Annotated[ResponseFormats, Field(max_length=16, default=None)]
 
     @field_validator("file")
     def validate_file(cls, v: FileStorage):
+        return safe_pdffile(v)
 
-        if not isinstance(v, FileStorage):
-            raise TypeError("file must be a FileStorage")
+class FileUploadForm(BaseModel):
 
-        if not v.filename:
-            raise ValueError("file is required")
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
-        ext = v.filename.rsplit(".", 1)[-1].lower() if "." in v.filename else ""
-        if 'pdf' != ext:
-            raise ValueError(f"unsupported file extension {ext}")
-        if 'application/pdf' != v.mimetype:
-            raise ValueError(f"unsupported mimetype: {v.mimetype}")
+    file: FileStorage
+    file_id: Annotated[str, Field(max_length=128, default=None), AfterValidator(safe_fileid)]
+    parser_engine: Annotated[ParserEngines, Field(max_length=64, default=None)]
+    parser_prefer: Annotated[ParserPrefers, Field(max_length=64, default=None)]
+    target_language: Annotated[TargetLanguages, Field(max_length=32, default=None)]
+    enable_table: Annotated[bool, Field(default=None)]
+    enable_formula: Annotated[bool, Field(default=None)]
+    apply_scaled: Annotated[bool, Field(default=None)]
+    callback_url: Annotated[HttpUrl, Field(default=None)]
+    priority: Annotated[TaskPriorities, Field(max_length=16, default=TaskPriorities.NORMAL)]
 
-        return v
+    @field_validator("file")
+    def validate_file(cls, v: FileStorage):
+        return safe_pdffile(v)
 
 class TaskRequest(BaseModel):
 
@@ -63,3 +87,26 @@ class TaskRequest(BaseModel):
     enable_formula: Annotated[bool, Field(default=None)]
     apply_scaled: Annotated[bool, Field(default=None)]
     callback_url: Annotated[HttpUrl, Field(default=None)]
+    priority: Annotated[TaskPriorities, Field(max_length=16, default=TaskPriorities.NORMAL)]
+
+class TaskBatchRequest(BaseModel):
+
+    tasks: Annotated[List[TaskRequest], Field(min_length=1)]
+
+class TaskListQuery(BaseModel):
+
+    ids: Annotated[str, Field(max_length=65536, default=None)]
+    status: Annotated[TaskStatus, Field(max_length=32, default=None)]
+    since: Annotated[datetime, Field(default=None)]
+    until: Annotated[datetime, Field(default=None)]
+    cursor: Annotated[int, Field(ge=1, default=None)]
+    limit: Annotated[int, Field(ge=1, default=50)]
+
+class TaskFetchQuery(BaseModel):
+
+    wait: Annotated[float, Field(ge=0, default=None)]
+
+class ArchiveQuery(BaseModel):
+
+    expires: Annotated[int, Field(ge=0, default=None)]
+    signature: Annotated[str, Field(max_length=128, default=None)]
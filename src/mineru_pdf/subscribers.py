@@ -13,3 +13,7 @@ def term_if_gpu_oom(sender: Flask, **extra):
 
 def connect_subscribers(app: Flask):
     appcontext_tearing_down.connect(term_if_gpu_oom, app)
+
+    # waiters on task status are woken by committed transitions
+    from .utils.taskevents import publish_commits
+    publish_commits()
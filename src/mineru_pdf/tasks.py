@@ -1,95 +1,415 @@
 import json
 import re
 import shutil
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlparse
 
 import arrow
-from celery import shared_task
+from celery import chord, shared_task
 from celery.app.task import Task as Concrete
 from celery.utils.log import get_task_logger
 from flask import current_app
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select, update
 from sqlalchemy.exc import NoResultFound
 
 from .constants import TaskResult, TaskStatus
 from .exceptions import ExtraErrorCodes
 from .extensions import database
-from .models import Task
+from .models import Callback, Task
+from .utils.admission import gpu_admission
+from .utils.downloadcache import evict_downloads
 from .utils.fileguard import (
-    as_semantic, calc_sha256sum, file_check,
-    create_savedir, create_workdir, create_zipfile
+    as_semantic, file_check,
+    create_savedir, create_workdir, take_upload
 )
-from .utils.httpclient import download_file, post_callback
+from .utils.httpclient import download_file
+from .utils.ledger import StageLedger
+from .utils.outbox import SLOT_RETRY, SWEEP_INTERVAL, deliver_due, due_hosts, enqueue_callback, host_slot, next_due
+from .utils.packing import PackResult, pack_zipfile
+from .utils.priority import task_priority
+from .utils.progress import report_pages
+from .utils.resultcache import restore_result, result_key, store_result
+from .utils.shards import merge_outputs, page_ranges
 
 logger = get_task_logger(__name__)
 
 
+class StagedTask(NamedTuple):
+    task: Task
+    folder: str
+    workdir: Path
+    pdf_file: Path
+    pages: int
+    magic_kwargs: dict
+    cache_key: str
+    ledger: StageLedger
+
 @shared_task(bind=True, max_retries=2, retry_backoff=True)
 def mining_pdf(self: Concrete, task_id: int) -> int:
+    """Collect and check the file on cpu queue, then hand over to inferring"""
 
-    # mark as start
-    try:
-        task: Optional[Task] = database.session.scalars(
-            select(Task).
-            where(Task.id == task_id).
-            order_by(Task.id.desc())
-        ).one()
-    except NoResultFound as e:
-        logger.exception(e)
+    # mark as start, skip when delivered twice
+    task: Optional[Task] = claim_task(task_id)
+    if task is None:
+        return 0
+
+    staged: Optional[StagedTask] = stage_task(task)
+    if staged is None:
+        return 0
+
+    # reuse cached result, skip to packing when hit
+    if restore_result(staged.cache_key, staged.workdir) is not None:
+        return finish_task(task, staged.workdir, staged.folder, staged.ledger)
+
+    # large document goes to shards across workers, merged by callback
+    if is_shardable(staged):
+        dispatch_shards(staged)
+        return 0
+
+    # file is local now, gpu workers only ever infer staged files, shorter
+    # ones first now that the page count is known
+    task.queue_priority = task_priority(task, staged.pages)
+    staged.ledger.enter(TaskResult.STAGED, flush=True)
+    infer_pdf.apply_async((task.id,), priority=task.queue_priority) # type: ignore
+
+    return 0
+
+@shared_task
+def infer_pdf(task_id: int) -> int:
+    """Infer a staged file on gpu queue, along with compatible staged ones"""
+
+    task: Optional[Task] = claim_stage(task_id, TaskResult.STAGED, TaskResult.INFERRING)
+    if task is None:
+        return 0
+
+    # small documents with same options share one inference call
+    batch: List[StagedTask] = [
+        restage(staged, TaskResult.STAGED) for staged in [ task, *claim_siblings(task) ]
+    ]
+
+    return infer_batch(batch)
+
+@shared_task
+def pack_pdf(task_id: int) -> int:
+    """Pack, clean and call back on cpu queue once inferred"""
+
+    task: Optional[Task] = claim_stage(task_id, TaskResult.INFERRED, TaskResult.PACKING)
+    if task is None:
         return 0
 
+    staged: StagedTask = restage(task, TaskResult.INFERRED)
+    store_result(
+        # hashed again only for tasks staged before the key was kept
+        staged.cache_key or result_key(staged.pdf_file, staged.magic_kwargs),
+        staged.workdir, exclude=[ staged.pdf_file.name ]
+    )
+
+    return finish_task(task, staged.workdir, staged.folder, staged.ledger)
+
+def stage_task(task: Task) -> Optional[StagedTask]:
+    """Collect and check the file of task, returns None when terminated"""
+
+    ledger = StageLedger(task)
+
     task.status = TaskStatus.RUNNING
-    task.result = TaskResult.NONE_
     task.errors = ExtraErrorCodes.NONE_
-    task.started_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    database.session.commit()
+    task.started_at = ledger.now() # type: ignore
 
     # prepare workdir
     folder: str = as_semantic(task)
     workdir: Path = create_workdir(folder)
     logger.info(f'workdir -> {workdir} folder -> {folder}')
 
-    # download file
-    task.result = TaskResult.COLLECTING
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
+    # download file, committed along with running since it may take long
+    ledger.enter(TaskResult.COLLECTING, flush=True)
+
+    try:
+        sink: Path = workdir.joinpath(task.file_id).with_suffix('.pdf')
+        checksum: Optional[str] = None
+        if 'file' == urlparse(task.file_url).scheme:
+            pdf_file: Path = take_upload(task.file_url, sink)
+        else:
+            pdf_file, checksum, _ = download_file(task.file_url, sink)
+    except Exception as e:
+        logger.exception(e)
+        terminate_task(task, e, ledger)
+        return None
+
+    # check file, quick enough to be flushed with the next stage
+    ledger.enter(TaskResult.CHECKING)
+
+    try:
+        pages: int = file_check(pdf_file)
+    except Exception as e:
+        logger.exception(e)
+        terminate_task(task, e, ledger)
+        return None
+
+    magic_kwargs: dict = task_magic_kwargs(task)
+    ledger.engine, ledger.pages = magic_kwargs.get('backend') or '', pages
+    task.pages_done, task.pages_total = 0, pages
+    # kept for packing on another worker, the pdf is not hashed twice
+    task.result_key = result_key(pdf_file, magic_kwargs, checksum)
+
+    return StagedTask(
+        task, folder, workdir, pdf_file, pages,
+        magic_kwargs, task.result_key, ledger
+    )
+
+def restage(task: Task, stage: str) -> StagedTask:
+    """Rebuild a staged task in a later stage, the file is local already"""
+
+    folder: str = as_semantic(task)
+    workdir: Path = create_workdir(folder)
+    magic_kwargs: dict = task_magic_kwargs(task)
+
+    # times the wait between stages, e.g. queueing for a gpu worker
+    ledger = StageLedger(task, magic_kwargs.get('backend') or '', task.pages_total)
+    ledger.resume(stage)
+
+    return StagedTask(
+        task, folder, workdir, workdir.joinpath(task.file_id).with_suffix('.pdf'),
+        task.pages_total, magic_kwargs, task.result_key, ledger
+    )
+
+def infer_batch(batch: List[StagedTask]) -> int:
+
+    if not 'magic_files' in globals():
+        from .utils.magicfile import magic_files
+
+    # infect content, one commit for the whole batch
+    for staged in batch:
+        staged.ledger.enter(TaskResult.INFERRING)
+        staged.ledger.flush(commit=False)
     database.session.commit()
 
+    if len(batch) > 1:
+        logger.info(f'batching tasks {", ".join(f"<{staged.task.uuid}>" for staged in batch)}')
+
+    def infer(members: List[StagedTask]) -> None:
+        # queue for gpu slots, prevents oom rather than recovers from it
+        with gpu_admission(sum(staged.pages for staged in members), members[0].magic_kwargs.get('backend')):
+            magic_files([
+                (staged.pdf_file, staged.workdir) for staged in members
+            ], **members[0].magic_kwargs, on_progress=lambda idx, pages: (
+                report_pages(members[idx].task.id, pages)
+            )) # type: ignore
+
+    failed: int = 0
+    # inferred together, each task owns a share of the batch time by pages
+    pages: int = sum(staged.pages for staged in batch)
+    shares: Dict[int, float] = {
+        staged.task.id: staged.pages / pages if pages > 0 else 1 / len(batch) for staged in batch
+    }
+
     try:
-        pdf_file: Path = download_file(
-            task.file_url, workdir.joinpath(task.file_id).with_suffix('.pdf')
-        )
+        infer(batch)
     except Exception as e:
         logger.exception(e)
-        task.status = TaskStatus.TERMINATED
-        task.errors = getattr(e, 'code', ExtraErrorCodes.INTERNAL_ERROR)
-        task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-        database.session.commit()
-        return 0
 
-    # check file
-    task.result = TaskResult.CHECKING
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
+        if len(batch) < 2:
+            terminate_task(batch[0].task, e, batch[0].ledger)
+            return 255
+
+        # one bad document must not fail the others, each is tried alone
+        logger.warning(f'batch of {len(batch)} tasks failed, inferring them one by one')
+
+        survivors: List[StagedTask] = []
+        for staged in batch:
+            # pages reported by the failed attempt are counted again
+            staged.task.pages_done = 0
+            database.session.commit()
+            try:
+                infer([ staged ])
+            except Exception as e:
+                logger.exception(e)
+                terminate_task(staged.task, e, staged.ledger)
+                failed += 1
+                continue
+            survivors.append(staged)
+
+        batch = survivors
+        # alone after all, though the failed attempt is timed along
+        shares = { staged.task.id: 1.0 for staged in batch }
+
+    # fan out packing of each task to cpu queue
+    for staged in batch:
+        staged.ledger.enter(TaskResult.INFERRED, share=shares[staged.task.id])
+        staged.ledger.flush(commit=False)
     database.session.commit()
 
+    for staged in batch:
+        pack_pdf.apply_async((staged.task.id,), priority=staged.task.queue_priority) # type: ignore
+
+    return 255 if failed > 0 else 0
+
+def is_shardable(staged: StagedTask) -> bool:
+    shard_pages: int = int(current_app.config.get('PDF_SHARD_PAGES') or 0)
+    return 0 < shard_pages < staged.pages
+
+def dispatch_shards(staged: StagedTask) -> None:
+
+    task: Task = staged.task
+
+    # inferring is timed by each shard, this ledger ends here
+    staged.ledger.enter(TaskResult.INFERRING, flush=True)
+
+    ranges = page_ranges(staged.pages, int(current_app.config.get('PDF_SHARD_PAGES') or 0))
+    logger.info(f'task <{task.uuid}> {staged.pages} pages split into {len(ranges)} shards')
+
+    # shards are long by definition, yet as urgent as requested
+    task.queue_priority = task_priority(task, staged.pages)
+    database.session.commit()
+
+    chord(
+        mining_shard.s(task.id, start, end).set(priority=task.queue_priority) # type: ignore
+        for start, end in ranges
+    )(merge_shards.s(task.id, staged.cache_key, staged.pages)) # type: ignore
+
+@shared_task
+def mining_shard(task_id: int, start: int, end: int) -> int:
+    """Infer pages start to end (inclusive), returns start or -1 on failure"""
+
+    task: Optional[Task] = find_task(task_id)
+    if task is None or TaskStatus.TERMINATED == task.status:
+        return -1
+
+    workdir: Path = create_workdir(as_semantic(task))
+    shard_dir: Path = workdir.joinpath('shards', f'{start:06d}')
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    if not 'magic_file' in globals():
+        from .utils.magicfile import magic_file
+
+    magic_kwargs: dict = task_magic_kwargs(task)
+
+    ledger = StageLedger(task, magic_kwargs.get('backend') or '', end - start + 1)
+    ledger.enter(TaskResult.INFERRING)
+
     try:
-        file_check(pdf_file)
+        with gpu_admission(end - start + 1, magic_kwargs.get('backend')): # type: ignore
+            magic_file(
+                workdir.joinpath(task.file_id).with_suffix('.pdf'), shard_dir,
+                **magic_kwargs, start_page_id=start, end_page_id=end,
+                on_progress=lambda idx, pages: report_pages(task_id, pages)
+            ) # type: ignore
     except Exception as e:
         logger.exception(e)
-        task.status = TaskStatus.TERMINATED
-        task.errors = getattr(e, 'code', ExtraErrorCodes.INTERNAL_ERROR)
-        task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-        database.session.commit()
+        terminate_task(task, e, ledger)
+        return -1
+
+    ledger.close()
+    ledger.flush()
+
+    return start
+
+@shared_task
+def merge_shards(starts: List[int], task_id: int, cache_key: str, pages: int = 0) -> int:
+
+    task: Optional[Task] = find_task(task_id)
+    if task is None:
         return 0
 
-    # infect content
-    task.result = TaskResult.INFERRING
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
+    if TaskStatus.TERMINATED == task.status or any(start < 0 for start in starts):
+        logger.warning(f'task <{task.uuid}> has failed shards, merging skipped')
+        return 255
+
+    folder: str = as_semantic(task)
+    workdir: Path = create_workdir(folder)
+    shards_dir: Path = workdir.joinpath('shards')
+
+    merge_outputs([
+        (start, shards_dir.joinpath(f'{start:06d}')) for start in starts
+    ], workdir)
+    shutil.rmtree(shards_dir)
+
+    store_result(cache_key, workdir, exclude=[ Path(task.file_id).with_suffix('.pdf').name ])
+
+    return finish_task(task, workdir, folder, StageLedger(
+        task, task_magic_kwargs(task).get('backend') or '', pages
+    ))
+
+def claim_task(task_id: int) -> Optional[Task]:
+    """Move task from CREATED to RUNNING atomically, None when taken already"""
+
+    claimed = database.session.execute(
+        update(Task).
+        where(Task.id == task_id, Task.status == TaskStatus.CREATED).
+        values(status=TaskStatus.RUNNING)
+    ).rowcount
     database.session.commit()
 
-    if not 'magic_file' in globals():
-        from .utils.magicfile import magic_args, magic_file
+    if claimed < 1:
+        logger.info(f'task {task_id} is not waiting anymore, skipped')
+        return None
+
+    return find_task(task_id)
+
+def claim_stage(task_id: int, result: str, claimed_result: str) -> Optional[Task]:
+    """
+    Move running task from result to claimed_result atomically, None when
+    taken already, updated_at is kept so the ledger can time the wait
+    """
+
+    claimed = database.session.execute(
+        update(Task).
+        where(Task.id == task_id, Task.status == TaskStatus.RUNNING, Task.result == result).
+        values(result=claimed_result)
+    ).rowcount
+    database.session.commit()
+
+    if claimed < 1:
+        logger.info(f'task {task_id} is not {result.lower()} anymore, skipped')
+        return None
+
+    return find_task(task_id)
+
+def claim_siblings(task: Task) -> List[Task]:
+    """Claim staged tasks with same options as task, after a short linger"""
+
+    limit: int = int(current_app.config.get('BATCH_MAX_TASKS') or 1) - 1
+    if limit < 1:
+        return []
+
+    time.sleep(float(current_app.config.get('BATCH_LINGER') or 0))
+
+    candidates = database.session.scalars(
+        select(Task.id).
+        where(
+            Task.status == TaskStatus.RUNNING,
+            Task.result == TaskResult.STAGED,
+            Task.finetune_args == task.finetune_args,
+            Task.id != task.id
+        ).
+        order_by(Task.queue_priority.asc(), Task.id.asc()).
+        limit(limit)
+    ).all()
+
+    siblings: List[Task] = []
+    for candidate in candidates:
+        sibling: Optional[Task] = claim_stage(candidate, TaskResult.STAGED, TaskResult.INFERRING)
+        if sibling is not None:
+            siblings.append(sibling)
+
+    return siblings
+
+def find_task(task_id: int) -> Optional[Task]:
+    try:
+        return database.session.scalars(
+            select(Task).
+            where(Task.id == task_id).
+            order_by(Task.id.desc())
+        ).one()
+    except NoResultFound as e:
+        logger.exception(e)
+        return None
+
+def task_magic_kwargs(task: Task) -> dict:
+
+    if not 'magic_args' in globals():
+        from .utils.magicfile import magic_args
 
     try:
         finetune_args = json.loads(task.finetune_args)
@@ -98,60 +418,137 @@ def mining_pdf(self: Concrete, task_id: int) -> int:
         finetune_args = {}
 
     try:
-        magic_kwargs = magic_args({ **finetune_args, # type: ignore
+        return magic_args({ **finetune_args, # type: ignore
             'vllm_endpoint': current_app.config.get('VLLM_ENDPOINT')
         })
     except ValueError as e:
         logger.warning(e, exc_info=True)
-        magic_kwargs = {}
+        return {}
 
-    try:
-        magic_file(pdf_file, workdir, **magic_kwargs) # type: ignore
-    except Exception as e:
-        logger.exception(e)
-        task.status = TaskStatus.TERMINATED
-        task.errors = getattr(e, 'code', ExtraErrorCodes.INTERNAL_ERROR)
-        task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-        database.session.commit()
-        return 255
+def terminate_task(task: Task, e: Exception, ledger: Optional[StageLedger] = None) -> None:
+
+    ledger = ledger or StageLedger(task)
+    ledger.close()
+
+    task.status = TaskStatus.TERMINATED
+    task.errors = getattr(e, 'code', ExtraErrorCodes.INTERNAL_ERROR)
+    task.updated_at = ledger.now() # type: ignore
+    ledger.flush()
+
+def finish_task(task: Task, workdir: Path, folder: str, ledger: Optional[StageLedger] = None) -> int:
+
+    ledger = ledger or StageLedger(task)
 
     # packing result
-    task.result = TaskResult.PACKING
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    database.session.commit()
+    ledger.enter(TaskResult.PACKING, flush=True)
 
     moment = arrow.now(current_app.config.get('TIMEZONE'))
-    tarball: Path = create_zipfile(
+    packed: PackResult = pack_zipfile(
         create_savedir(moment).joinpath(folder + '.zip'), workdir
     )
+    tarball: Path = packed.path
 
     task.tarball_location = str(tarball.relative_to(current_app.instance_path))
-    task.tarball_checksum = calc_sha256sum(tarball)
-    database.session.commit()
+    task.tarball_checksum = packed.checksum
 
-    # clean workarea
-    task.result = TaskResult.CLEANING
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    database.session.commit()
+    # clean workarea, flushed along with completion
+    ledger.enter(TaskResult.CLEANING)
 
     if tarball.exists():
         shutil.rmtree(workdir)
 
-    # mark as completed
+    # mark as completed, cached results skipped inferring progress
+    ledger.close()
+    task.pages_done = task.pages_total
     task.status = TaskStatus.COMPLETED
     task.result = TaskResult.FINISHED
-    task.updated_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    task.finished_at = arrow.now(current_app.config.get('TIMEZONE')).datetime # type: ignore
-    database.session.commit()
+    task.updated_at = task.finished_at = ledger.now() # type: ignore
 
-    # post callback
-    try:
-        post_callback(task)
-    except Exception as e:
-        logger.warning(e, exc_info=True)
+    # callback lands in outbox along with completion, delivered elsewhere
+    callback: Optional[Callback] = enqueue_callback(task)
+    ledger.flush()
+
+    if callback is not None:
+        deliver_callbacks.delay(callback.host) # type: ignore
 
     return 0
 
+@shared_task
+def age_tasks() -> int:
+    """Send waiting tasks again with a promoted priority, the stale message is skipped once claimed"""
+
+    waiting = database.session.scalars(
+        select(Task).
+        where(
+            Task.queue_priority > 0,
+            or_(
+                Task.status == TaskStatus.CREATED,
+                and_(Task.status == TaskStatus.RUNNING, Task.result == TaskResult.STAGED),
+            ),
+        ).
+        order_by(Task.id.asc())
+    ).all()
+
+    promoted: int = 0
+    for task in waiting:
+
+        staged: bool = TaskStatus.RUNNING == task.status
+        priority: int = task_priority(task, task.pages_total if staged else None)
+        if priority >= task.queue_priority:
+            continue
+
+        # skip when claimed meanwhile, otherwise the message would be stale
+        claimed = database.session.execute(
+            update(Task).
+            where(
+                Task.id == task.id, Task.status == task.status,
+                Task.result == task.result, Task.queue_priority == task.queue_priority,
+            ).
+            values(queue_priority=priority)
+        ).rowcount
+        database.session.commit()
+
+        if claimed < 1:
+            continue
+
+        (infer_pdf if staged else mining_pdf).apply_async((task.id,), priority=priority) # type: ignore
+        promoted += 1
+
+    if promoted > 0:
+        logger.info(f'promoted {promoted} waiting tasks')
+
+    return promoted
+
+@shared_task
+def deliver_callbacks(host: str) -> int:
+    """Deliver due callbacks of host while holding one of its slots"""
+
+    with host_slot(host) as held:
+        # enough deliverers on host already, looked at again shortly rather
+        # than at the next sweep in case they are done before this one is due
+        if not held:
+            deliver_callbacks.apply_async((host,), countdown=SLOT_RETRY) # type: ignore
+            return 0
+        delivered: int = deliver_due(host)
+
+    # near retries are kicked here, later ones left to the sweep
+    due_in: Optional[float] = next_due(host)
+    if due_in is not None and due_in < SWEEP_INTERVAL:
+        deliver_callbacks.apply_async((host,), countdown=due_in) # type: ignore
+
+    return delivered
+
+@shared_task
+def sweep_callbacks() -> int:
+    """Kick delivery of hosts with due callbacks, e.g. retries or lost messages"""
+
+    hosts: List[str] = due_hosts()
+
+    for host in hosts:
+        deliver_callbacks.delay(host) # type: ignore
+
+    return len(hosts)
+
 def start_of_day(moment: arrow.Arrow) -> arrow.Arrow:
     return moment.replace(hour=0, minute=0, second=0, microsecond=0)
 
@@ -184,6 +581,11 @@ def remove_workdir():
     cache_dir: Path = Path(current_app.instance_path).joinpath('cache')
     keep_days: int = abs(current_app.config.get('WORKDIR_KEEP_DAYS')) # type: ignore
 
+    # expired and over budget downloads go along with stale workdirs
+    evicted: int = evict_downloads()
+    if evicted > 0:
+        logger.info(f'evicted {evicted} cached downloads')
+
     if 0 == keep_days:
         logger.debug('WORKDIR_KEEP_DAYS is 0, skipped')
         return
@@ -0,0 +1,318 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from math import ceil
+from pathlib import Path
+from typing import IO, Deque, Iterator, List, Optional, Tuple
+
+from flask import current_app
+
+from ..constants import ParserEngines
+from ..exceptions import GPUAdmissionRejectedError
+
+logger = logging.getLogger(__name__)
+
+# relative vram cost of one slot-sized chunk of pages, 0 means remote inference
+ENGINE_WEIGHTS = {
+    ParserEngines.PIPELINE: 1,
+    ParserEngines.VLM_AUTO_ENGINE: 2,
+    ParserEngines.VLM_VLLM_ENGINE: 2,
+    ParserEngines.VLM_HTTP_CLIENT: 0,
+    ParserEngines.HYBRID_AUTO_ENGINE: 2,
+    ParserEngines.HYBRID_VLLM_ENGINE: 2,
+    ParserEngines.HYBRID_HTTP_CLIENT: 1,
+}
+
+POLL_INTERVAL = 0.5
+
+
+
+class _InferenceTurns(object):
+    """
+    One inference at a time among threads of a worker, taken in arrival
+    order, remembering how long the holder and waiters are expected to take
+    """
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.waiters: Deque[Tuple[object, float]] = deque()
+        self.busy: bool = False
+        self.holder_eta: float = 0.0
+
+    def acquire(self, seconds: float, deadline: Optional[float]) -> Optional[int]:
+        """None once taken, otherwise the seconds to retry after at deadline"""
+
+        turn: Tuple[object, float] = (object(), seconds)
+
+        with self.cond:
+            self.waiters.append(turn)
+            while self.busy or self.waiters[0] is not turn:
+                left: Optional[float] = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    retry_after: int = self._retry_after(turn)
+                    self.waiters.remove(turn)
+                    self.cond.notify_all()
+                    return retry_after
+                self.cond.wait(left)
+            self.waiters.popleft()
+            self.busy = True
+            self.holder_eta = time.time() + seconds
+
+        return None
+
+    def release(self) -> None:
+        with self.cond:
+            self.busy = False
+            self.cond.notify_all()
+
+    def _retry_after(self, turn: Tuple[object, float]) -> int:
+
+        remains: float = max(0.0, self.holder_eta - time.time()) if self.busy else 0.0
+
+        for waiter in self.waiters:
+            if waiter is turn:
+                break
+            remains += waiter[1]
+
+        return max(1, int(ceil(remains)))
+
+# models are loaded once per process and not safe to share among threads
+_inference_turns = _InferenceTurns()
+
+
+def _slots_dir() -> Path:
+
+    slots_dir: Path = Path(
+        current_app.instance_path
+    ).joinpath(
+        'cache', 'admission'
+    ).resolve()
+
+    if not slots_dir.exists():
+        slots_dir.mkdir(parents=True, exist_ok=True)
+
+    return slots_dir
+
+def estimate_slots(pages: int, backend: Optional[str]) -> int:
+    """Weighted slots needed by a document, capped to the host capacity"""
+
+    capacity: int = int(current_app.config.get('GPU_ADMISSION_SLOTS') or 0)
+    pages_per_slot: int = max(1, int(current_app.config.get('GPU_PAGES_PER_SLOT') or 1))
+    weight: int = ENGINE_WEIGHTS.get(backend or ParserEngines.PIPELINE, 1) # type: ignore
+
+    if capacity < 1 or weight < 1:
+        return 0
+
+    return min(capacity, weight * max(1, ceil(pages / pages_per_slot)))
+
+def estimate_seconds(pages: int) -> float:
+    return pages * float(current_app.config.get('GPU_SECONDS_PER_PAGE') or 0)
+
+@contextmanager
+def _ticket(slots_dir: Path, pages: int) -> Iterator[str]:
+    """
+    Place in the host wide queue of slot waiters, a locked file named by
+    arrival, a killed waiter leaves its file unlocked and is passed over
+    """
+
+    tickets_dir: Path = slots_dir.joinpath('tickets')
+    tickets_dir.mkdir(exist_ok=True)
+
+    name: str = f'{time.time_ns():020d}.{os.getpid()}.{threading.get_ident()}'
+    pending: Path = tickets_dir.joinpath(f'.{name}')
+
+    f = pending.open('w')
+    try:
+        # locked before it is visible, so it is never taken for a stale one
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(json.dumps({ 'pages': pages }))
+        f.flush()
+        pending.rename(tickets_dir.joinpath(name))
+        yield name
+    finally:
+        tickets_dir.joinpath(name).unlink(missing_ok=True)
+        pending.unlink(missing_ok=True)
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+def _tickets_ahead(slots_dir: Path, name: str) -> List[int]:
+    """Pages of live waiters queued before ticket name, stale tickets are removed"""
+
+    ahead: List[int] = []
+
+    for ticket in sorted(slots_dir.joinpath('tickets').glob('[0-9]*')):
+        if ticket.name >= name:
+            break
+        try:
+            f = ticket.open('r')
+        except FileNotFoundError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # nobody holds it, the waiter was killed
+                ticket.unlink(missing_ok=True)
+                continue
+            except BlockingIOError:
+                pass
+            try:
+                ahead.append(int(json.loads(f.read() or '{}').get('pages', 0)))
+            except (json.decoder.JSONDecodeError, ValueError):
+                ahead.append(0)
+
+    return ahead
+
+def _try_acquire(slots_dir: Path, capacity: int, needed: int) -> List[IO]:
+
+    handles: List[IO] = []
+
+    for i in range(capacity):
+        if len(handles) >= needed:
+            break
+        f = slots_dir.joinpath(f'slot.{i}').open('a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            continue
+        handles.append(f)
+
+    if len(handles) < needed:
+        _release(handles)
+        return []
+
+    return handles
+
+def _release(handles: List[IO]) -> None:
+    for f in handles:
+        try:
+            f.truncate(0)
+            fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+def _retry_after(slots_dir: Path, capacity: int, needed: int) -> int:
+    """Seconds until enough held slots are expected to be released"""
+
+    free: int = 0
+    remains: List[float] = []
+    now: float = time.time()
+
+    for i in range(capacity):
+        with slots_dir.joinpath(f'slot.{i}').open('a+') as f:
+            try:
+                # a stale holder record of a killed process is not held
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+                free += 1
+                continue
+            except BlockingIOError:
+                pass
+            f.seek(0)
+            try:
+                holder: dict = json.loads(f.read() or '{}')
+            except json.decoder.JSONDecodeError:
+                holder = {}
+        remains.append(max(0.0, float(holder.get('eta', now)) - now))
+
+    remains.sort()
+    waiting: int = needed - free
+
+    if waiting < 1 or not remains:
+        return 1
+
+    return max(1, int(ceil(remains[min(waiting, len(remains)) - 1])))
+
+@contextmanager
+def gpu_admission(
+    pages: int, backend: Optional[str], wait: Optional[float] = None,
+    deadline: Optional[float] = None
+) -> Iterator[int]:
+    """
+    Hold weighted slots shared by every process of this host during
+    inference, slots are file locks so a killed holder frees them.
+    Waiters are served in arrival order, so small documents never starve
+    a large one. Waits forever when wait and deadline (monotonic) are
+    None, otherwise raises :class:`GPUAdmissionRejectedError` once passed.
+    """
+
+    capacity: int = int(current_app.config.get('GPU_ADMISSION_SLOTS') or 0)
+    needed: int = estimate_slots(pages, backend)
+
+    if needed < 1:
+        yield 0
+        return
+
+    slots_dir: Path = _slots_dir()
+
+    if deadline is None and wait is not None:
+        deadline = time.monotonic() + wait
+
+    with _ticket(slots_dir, pages) as name:
+        while (ahead := _tickets_ahead(slots_dir, name)) or \
+              not (handles := _try_acquire(slots_dir, capacity, needed)):
+            if deadline is not None and time.monotonic() >= deadline:
+                # the queue ahead goes first, roughly one after another
+                retry_after: int = _retry_after(slots_dir, capacity, needed) + \
+                    int(ceil(sum(estimate_seconds(queued) for queued in ahead)))
+                raise GPUAdmissionRejectedError(
+                    f'{needed} of {capacity} gpu slots unavailable, '
+                    f'retry after {retry_after} seconds',
+                    retry_after=retry_after
+                )
+            time.sleep(POLL_INTERVAL)
+
+    holder: str = json.dumps({
+        'pid': os.getpid(), 'pages': pages, 'backend': backend,
+        'eta': time.time() + estimate_seconds(pages),
+    })
+    for f in handles:
+        f.truncate(0)
+        f.write(holder)
+        f.flush()
+
+    logger.info(f'admitted {pages} pages of {backend} with {needed}/{capacity} gpu slots')
+
+    try:
+        yield needed
+    finally:
+        _release(handles)
+
+@contextmanager
+def inference_lock(pages: int, deadline: Optional[float] = None) -> Iterator[None]:
+    """
+    One in-process inference at a time among threads of a worker, in
+    arrival order, raises :class:`GPUAdmissionRejectedError` once deadline
+    (monotonic) passed unless None
+    """
+
+    retry_after: Optional[int] = _inference_turns.acquire(estimate_seconds(pages), deadline)
+
+    if retry_after is not None:
+        raise GPUAdmissionRejectedError(
+            f'inference busy in this worker, retry after {retry_after} seconds',
+            retry_after=retry_after
+        )
+
+    try:
+        yield
+    finally:
+        _inference_turns.release()
+
+@contextmanager
+def inference_admission(pages: int, backend: Optional[str], wait: Optional[float] = None) -> Iterator[int]:
+    """
+    Worker inference turn then host gpu slots, both within one wait, so
+    queueing for the two never takes longer than wait seconds together
+    """
+
+    deadline: Optional[float] = None if wait is None else time.monotonic() + wait
+
+    with inference_lock(pages, deadline=deadline), \
+         gpu_admission(pages, backend, deadline=deadline) as needed:
+        yield needed
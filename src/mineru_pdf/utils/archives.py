@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import hmac
+import logging
+import time
+import zipfile
+from pathlib import Path
+from typing import IO, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from flask import Response, current_app, send_file
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1048576
+
+
+class ArchiveMember(NamedTuple):
+    name: str
+    size: int
+    compressed: int
+    checksum: str
+
+
+def archives_root() -> Path:
+    return Path(current_app.instance_path).joinpath('archives').resolve()
+
+def archive_file(location: str) -> Optional[Path]:
+    """Archive at the stored location, None when pruned or outside archives"""
+
+    if not location:
+        return None
+
+    path: Path = Path(current_app.instance_path).joinpath(location).resolve()
+
+    if not path.is_relative_to(archives_root()) or not path.is_file():
+        return None
+
+    return path
+
+def _signing_key() -> Optional[bytes]:
+
+    secret: Optional[str] = current_app.config.get('SECRET_KEY')
+    if not secret:
+        return None
+
+    # derived for this purpose only, signatures reveal nothing of APP_KEY uses elsewhere
+    return hmac.new(secret.encode(), b'archive-url', hashlib.sha256).digest()
+
+def _signature(key: bytes, task_id: str, expires: int) -> str:
+
+    digest: bytes = hmac.new(key, f'{task_id}:{expires}'.encode(), hashlib.sha256).digest()
+
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+def archive_expiry(now: Optional[float] = None) -> int:
+    """
+    Expiry of urls signed now, rounded to half of ARCHIVE_URL_TTL so the url
+    stays the same between polls, valid for half to full ttl
+    """
+
+    step: int = max(1, int(current_app.config.get('ARCHIVE_URL_TTL') or 0) // 2)
+    now = time.time() if now is None else now
+
+    return (int(now) // step + 2) * step
+
+def archive_url(task_id: str) -> str:
+    """Relative url of archive of task, signed unless APP_KEY is missing"""
+
+    path: str = f'api/v4/tasks/{quote(task_id)}/archive'
+
+    key: Optional[bytes] = _signing_key()
+    if key is None:
+        return path
+
+    expires: int = archive_expiry()
+
+    return path + '?' + urlencode({ 'expires': expires, 'signature': _signature(key, task_id, expires) })
+
+def verify_archive_url(task_id: str, expires: Optional[int], signature: Optional[str]) -> bool:
+
+    key: Optional[bytes] = _signing_key()
+
+    if key is None or expires is None or not signature or expires < time.time():
+        return False
+
+    return hmac.compare_digest(_signature(key, task_id, expires), signature)
+
+def send_archive(path: Path, etag: Optional[str] = None) -> Response:
+    """
+    Response of archive at path. With ARCHIVE_SENDFILE the fronting proxy is
+    told which file to serve and answers ranges itself, otherwise ranges are
+    answered here, full bodies still go through the sendfile of the server
+    """
+
+    mode: str = current_app.config.get('ARCHIVE_SENDFILE') or ''
+
+    if 'x-accel-redirect' == mode:
+        prefix: str = current_app.config.get('ARCHIVE_ACCEL_PREFIX') or '/'
+        r = Response(mimetype='application/zip')
+        r.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path.relative_to(archives_root()).as_posix())
+    elif 'x-sendfile' == mode:
+        r = Response(mimetype='application/zip')
+        r.headers['X-Sendfile'] = str(path)
+    else:
+        if mode:
+            logger.warning(f'unknown ARCHIVE_SENDFILE {mode}, served by application')
+        return send_file(
+            path, mimetype='application/zip', as_attachment=True,
+            download_name=path.name, etag=etag or True, conditional=True
+        )
+
+    # kept by the proxy when it serves the file in place of this response
+    r.headers.set('Content-Disposition', 'attachment', filename=path.name)
+    r.headers['Accept-Ranges'] = 'bytes'
+
+    return r
+
+def _member_of(info: zipfile.ZipInfo) -> ArchiveMember:
+    # crc32 is all the central directory records, hashing would read every member
+    return ArchiveMember(info.filename, info.file_size, info.compress_size, f'crc32:{info.CRC:08x}')
+
+def list_members(path: Path) -> List[ArchiveMember]:
+    """Files of archive, read from its central directory only"""
+
+    with zipfile.ZipFile(path) as zf:
+        return [ _member_of(info) for info in zf.infolist() if not info.is_dir() ]
+
+def open_member(path: Path, name: str) -> Optional[Tuple[ArchiveMember, IO[bytes]]]:
+    """
+    Member of archive as a file read from its offset and inflated on the
+    way, None when the archive has no such file. It holds the only handle
+    on the archive, the caller closes it
+    """
+
+    with zipfile.ZipFile(path) as zf:
+
+        try:
+            info: zipfile.ZipInfo = zf.getinfo(name)
+        except KeyError:
+            return None
+
+        if info.is_dir():
+            return None
+
+        # open members keep the archive file open past the with, until closed
+        return _member_of(info), zf.open(info)
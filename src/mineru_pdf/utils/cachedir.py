@@ -0,0 +1,111 @@
+import fcntl
+import logging
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import Callable, Iterator, List, Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class CacheDir(object):
+    """
+    Entries kept as directories under instance/cache/name, staged aside and
+    renamed in under a file lock shared across workers, evicted least
+    recently used first, recency being the mtime of the entry
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    @property
+    def root(self) -> Path:
+
+        cache_root: Path = Path(
+            current_app.instance_path
+        ).joinpath(
+            'cache', self.name
+        ).resolve()
+
+        if not cache_root.exists():
+            cache_root.mkdir(parents=True, exist_ok=True)
+
+        return cache_root
+
+    @contextmanager
+    def locked(self) -> Iterator[Path]:
+        cache_root: Path = self.root
+        with cache_root.joinpath('.lock').open('a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield cache_root
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def entries(self) -> List[Path]:
+        return [
+            entry for entry in self.root.iterdir()
+            if entry.is_dir() and not entry.name.startswith('.')
+        ]
+
+    def store(self, name: str, fill: Callable[[Path], None], replace: bool = False) -> Path:
+        """
+        Fill a staging directory aside, then rename it into entry name under
+        the lock, an entry there already is kept unless replace is set
+        """
+
+        cache_root: Path = self.root
+        entry: Path = cache_root.joinpath(name)
+
+        staging: Path = Path(mkdtemp(prefix='.staging_', dir=cache_root))
+        try:
+            fill(staging)
+            with self.locked():
+                if entry.exists() and not replace:
+                    shutil.rmtree(staging)
+                    return entry
+                if entry.exists():
+                    shutil.rmtree(entry)
+                staging.rename(entry)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        return entry
+
+    def evict(
+        self, budget: int, size_of: Callable[[Path], int], ttl: int = 0,
+        remove: Optional[Callable[[Path], bool]] = None
+    ) -> int:
+        """
+        Remove entries unused over ttl seconds, then least recently used until
+        under budget, remove returns False to keep an entry for a later round
+        """
+
+        remove = remove or _remove
+        oldest: float = time.time() - ttl if ttl > 0 else 0.0
+        evicted: int = 0
+
+        with self.locked():
+            entries = sorted(self.entries(), key=lambda e: e.stat().st_mtime)
+            sizes = { entry: size_of(entry) for entry in entries }
+            total = sum(sizes.values())
+            for entry in entries:
+                if total <= budget and entry.stat().st_mtime >= oldest:
+                    break
+                if not remove(entry):
+                    continue
+                total -= sizes[entry]
+                evicted += 1
+                logger.info(f'cache {self.name} evicted {entry.name}')
+
+        return evicted
+
+
+def _remove(entry: Path) -> bool:
+    shutil.rmtree(entry, ignore_errors=True)
+    return True
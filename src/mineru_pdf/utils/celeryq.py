@@ -4,6 +4,10 @@ from typing import Union
 
 from celery import Celery, Task
 from flask import Flask
+from kombu import Queue
+
+from ..constants import TaskPriorities
+from .priority import BASE_PRIORITIES, PRIORITY_STEPS
 
 def integrate_celery(app: Flask) -> Celery:
 
@@ -36,9 +40,43 @@ def integrate_celery(app: Flask) -> Celery:
             }
         })
 
+    # stages of a task alternate between cpu and gpu workers, so gpu workers
+    # only ever infer files which are collected and checked already
+    cpu_queue: dict = { 'queue': app.config.get('CPU_QUEUE') or 'cpu' }
+    gpu_queue: dict = { 'queue': app.config.get('GPU_QUEUE') or 'gpu' }
+    # slow receivers of callbacks never hold up a worker of either
+    callback_queue: dict = { 'queue': app.config.get('CALLBACK_QUEUE') or 'callback' }
+    # a worker started without --queues consumes all of them
+    config.setdefault('task_queues', [
+        Queue('celery'), Queue(cpu_queue['queue']), Queue(gpu_queue['queue']),
+        Queue(callback_queue['queue']),
+    ])
+    config.setdefault('task_routes', {
+        '*.tasks.mining_pdf': cpu_queue,
+        '*.tasks.infer_pdf': gpu_queue,
+        '*.tasks.pack_pdf': cpu_queue,
+        '*.tasks.mining_shard': gpu_queue,
+        '*.tasks.merge_shards': cpu_queue,
+        '*.tasks.prune_archives': cpu_queue,
+        '*.tasks.remove_workdir': cpu_queue,
+        '*.tasks.age_tasks': cpu_queue,
+        '*.tasks.deliver_callbacks': callback_queue,
+        '*.tasks.sweep_callbacks': callback_queue,
+    })
+
+    # a sub-queue per broker priority, lower ones are consumed first, so
+    # short documents are not stuck behind long ones in the same queue
+    if isinstance(config.setdefault('broker_transport_options', {}), dict):
+        config['broker_transport_options'].setdefault('priority_steps', PRIORITY_STEPS)
+    config.setdefault('task_default_priority', BASE_PRIORITIES[TaskPriorities.NORMAL])
+
     config['broker_connection_retry_on_startup'] = True
     config['worker_hijack_root_logger'] = False
 
+    # child process is killed if init signal handlers run longer than this
+    if app.config.get('WARMUP_ENGINE'):
+        config['worker_proc_alive_timeout'] = app.config.get('WARMUP_TIMEOUT')
+
     config['timezone'] = app.config.get('TIMEZONE') or 'UTC'
     if 'UTC' not in config['timezone']:
         config['enable_utc'] = False
@@ -0,0 +1,8 @@
+from datetime import datetime, tzinfo
+
+
+def as_aware(moment: datetime, tz: tzinfo) -> datetime:
+    """Moment read back from the database, in tz when it came back naive"""
+
+    # naive when read back from sqlite, stored in the configured zone though
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=tz)
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import requests
+from flask import current_app
+
+from .cachedir import CacheDir
+
+logger = logging.getLogger(__name__)
+
+_cache = CacheDir('downloads')
+
+
+class CachedDownload(NamedTuple):
+    entry: Path
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    checksum: str
+    size: int
+
+    @property
+    def body(self) -> Path:
+        return self.entry.joinpath('body.pdf')
+
+    def conditions(self) -> dict:
+        """Headers of a conditional request revalidating this entry"""
+
+        headers: dict = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+
+def _is_enabled() -> bool:
+    return int(current_app.config.get('DOWNLOAD_CACHE_SIZE') or 0) > 0
+
+def _entry_of(url: str) -> Path:
+    return _cache.root.joinpath(hashlib.sha256(url.encode()).hexdigest())
+
+def _read_entry(entry: Path) -> Optional[CachedDownload]:
+    try:
+        with entry.joinpath('entry.json').open('r') as f:
+            meta: dict = json.load(f)
+        return CachedDownload(
+            entry, meta['url'], meta.get('etag'), meta.get('last_modified'),
+            meta['checksum'], int(meta['size'])
+        )
+    except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError, ValueError):
+        return None
+
+def lookup_download(url: str) -> Optional[CachedDownload]:
+    """Returns the cached copy of url to revalidate, or None when missing"""
+
+    if not _is_enabled():
+        return None
+
+    cached: Optional[CachedDownload] = _read_entry(_entry_of(url))
+
+    # hashed names collide in theory only, still compare the url
+    if cached is None or cached.url != url or not cached.body.is_file():
+        return None
+
+    return cached
+
+def reuse_download(cached: CachedDownload, sink: Path) -> bool:
+    """Place cached body at sink after a 304, False when evicted meanwhile"""
+
+    with _cache.locked():
+        if not cached.body.is_file():
+            return False
+        sink.unlink(missing_ok=True)
+        try:
+            # the pdf is never written to, sharing the inode is safe
+            os.link(cached.body, sink)
+        except OSError:
+            shutil.copyfile(cached.body, sink)
+        # bump recency for eviction
+        os.utime(cached.entry)
+
+    logger.info(f'download cache hit {cached.url}')
+
+    return True
+
+def store_download(url: str, r: requests.Response, body: Path, checksum: str, size: int) -> Optional[Path]:
+    """Keep body of url when the response carries a validator, then evict over budget"""
+
+    if not _is_enabled():
+        return None
+
+    etag: Optional[str] = r.headers.get('ETag')
+    last_modified: Optional[str] = r.headers.get('Last-Modified')
+
+    if not etag and not last_modified:
+        return None
+
+    if 'no-store' in r.headers.get('Cache-Control', '').lower():
+        return None
+
+    def fill(staging: Path) -> None:
+        try:
+            os.link(body, staging.joinpath('body.pdf'))
+        except OSError:
+            shutil.copyfile(body, staging.joinpath('body.pdf'))
+        with staging.joinpath('entry.json').open('w') as f:
+            json.dump({
+                'url': url, 'etag': etag, 'last_modified': last_modified,
+                'checksum': checksum, 'size': size,
+            }, f)
+
+    try:
+        # a changed source replaces the stale copy
+        entry: Path = _cache.store(_entry_of(url).name, fill, replace=True)
+    except Exception as e:
+        logger.warning(f'download cache store failed for {url}: {e}')
+        return None
+
+    evict_downloads()
+
+    return entry
+
+def evict_downloads(budget: Optional[int] = None, ttl: Optional[int] = None) -> int:
+    """Remove entries unused over ttl seconds, then least recently used until under budget"""
+
+    if budget is None:
+        budget = int(current_app.config.get('DOWNLOAD_CACHE_SIZE') or 0)
+
+    if ttl is None:
+        ttl = int(current_app.config.get('DOWNLOAD_CACHE_TTL') or 0)
+
+    return _cache.evict(
+        budget, lambda entry: sum(file.stat().st_size for file in entry.iterdir() if file.is_file()), ttl
+    )
@@ -1,17 +1,17 @@
-import copy
 import os
 import hashlib
 import json
 import logging
-import zipfile
+import shutil
 from base64 import b64encode
 from datetime import datetime
-from math import ceil
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
+from urllib.parse import unquote, urlparse
 
 import arrow
 import filetype
+import numpy as np
 from dateutil import tz
 from flask import current_app
 from filesizelib import FileSize, StorageUnit
@@ -24,7 +24,7 @@ from pypdfium2.internal.consts import ErrorToStr
 
 from ..models import Task
 from ..exceptions import (
-    FileEncryptionFoundError, FileMIMEUnsupportedError,
+    FileDownloadFailureError, FileEncryptionFoundError, FileMIMEUnsupportedError,
     FileSizeTooLargeError, FilePagesTooManyError,
     FilePageRatioInvalidError,
 )
@@ -88,21 +88,30 @@ def create_workdir(folder_name: str) -> Path:
 
     return workdir
 
-def create_zipfile(zip_file: Path, target_dir: Path) -> Path:
+def take_upload(uri: str, sink: Path) -> Path:
+    """Move a stored upload (file:// uri) under instance cache into sink"""
 
-    if not zip_file.parent.is_dir() or zip_file.exists():
-        raise ValueError(f"The provided zip_file {zip_file} is not a valid file path or exists")
+    source: Path = Path(unquote(urlparse(uri).path)).resolve()
+    cache_dir: Path = Path(current_app.instance_path).joinpath('cache').resolve()
 
-    if not target_dir.is_dir():
-        raise ValueError(f"The provided path {target_dir} is not a valid directory.")
+    if not source.is_relative_to(cache_dir) or not source.name.endswith('.pdf'):
+        raise FileDownloadFailureError(f'upload {source} is outside of {cache_dir}')
 
-    with zipfile.ZipFile(zip_file, 'x', zipfile.ZIP_DEFLATED) as tar:
-        for file in target_dir.rglob('*'):
-            tar.write(file, file.relative_to(target_dir))
+    if not source.is_file():
+        raise FileDownloadFailureError(f'upload {source} does not exists')
 
-    return zip_file
+    shutil.move(source, sink)
 
-def file_check(input_file: Path, **kwargs) -> None:
+    # drop the emptied upload folder, remove_workdir catches the rest
+    try:
+        source.parent.rmdir()
+    except OSError:
+        pass
+
+    return sink
+
+def file_check(input_file: Path, **kwargs) -> int:
+    """Raises on unacceptable file, returns the page count otherwise"""
 
     if not input_file.is_file():
         raise ValueError('not a regular file')
@@ -165,6 +174,8 @@ def file_check(input_file: Path, **kwargs) -> None:
     finally:
         document.close()
 
+    return actual_pages
+
 def load_json_file(file: Path):
     return json.loads(read_text_file(file) or '{}')
 
@@ -176,33 +187,54 @@ def _b64_imagefile(image: Path) -> Optional[str]:
     with image.open('rb') as f:
         return f'data:image/jpeg;base64,{b64encode(f.read()).decode()}'
 
+def iter_images(image_dir: Path) -> Iterator[tuple[str, Optional[str]]]:
+    for image in image_dir.glob('*.jpg'):
+        yield image.name, _b64_imagefile(image)
+
 def pickup_images(image_dir: Path) -> dict:
-    return {
-        image.name : _b64_imagefile(image) for image in image_dir.glob('*.jpg')
-    }
+    return dict(iter_images(image_dir))
 
-def fix_content_list(content_list: List[Dict], page_sizes: Dict[int, PageSize]):
+def _round5(values: np.ndarray) -> np.ndarray:
+    """Same as round(v, 5) on each value, near ties fall back to python"""
 
-    def scale(pt: int, pk: int) -> float:
-        return round(pt * pk / 1000, 5)
+    rounded: np.ndarray = np.round(values, 5)
 
-    def bbox_scale(bbox: BBoxAxes, page: PageSize):
+    # numpy rounds the scaled binary value rather than the exact decimal one,
+    # so both may only disagree around half way, redo those with round()
+    shifted: np.ndarray = values * 1e5
+    ties: np.ndarray = np.abs(shifted - np.floor(shifted) - 0.5) < 1e-4
+    for i in np.flatnonzero(ties):
+        rounded.flat[i] = round(float(values.flat[i]), 5)
 
-        if len(bbox) != 4:
-            raise ValueError('bbox format invalid, only support 4 value list')
+    return rounded
 
-        x0, y0, x1, y1 = bbox
+def fix_content_list(content_list: List[Dict], page_sizes: Dict[int, PageSize]):
 
-        scale_x = lambda x: int(scale(x, page[0]))
-        scale_y = lambda y: int(ceil(scale(y, page[1])))
+    # scaled items are shallow copies, the input list is left untouched
+    items: List[Dict] = list(content_list)
+    picked: List[int] = []
+    bboxes: List[BBoxAxes] = []
+    pages: List[PageSize] = []
 
-        return [ scale_x(x0), scale_y(y0), scale_x(x1), scale_y(y1) ]
+    for idx, item in enumerate(items):
+        if 'bbox' in item:
+            if len(item['bbox']) != 4:
+                raise ValueError('bbox format invalid, only support 4 value list')
+            picked.append(idx)
+            bboxes.append(item['bbox'])
+            pages.append(page_sizes[item['page_idx']])
 
-    items = copy.deepcopy(content_list)
+    if not picked:
+        return items
 
-    for item in items:
-        if 'bbox' in item:
-            item['bbox'] = bbox_scale(tuple(item['bbox']), page_sizes[item['page_idx']])
+    # bbox is x0, y0, x1, y1 in per mille of the page, all items at once
+    factors: np.ndarray = np.tile(np.array(pages, dtype=np.float64), 2)
+    scaled: np.ndarray = _round5(np.array(bboxes, dtype=np.float64) * factors / 1000)
+    scaled[:, 0::2] = np.trunc(scaled[:, 0::2])
+    scaled[:, 1::2] = np.ceil(scaled[:, 1::2])
+
+    for idx, bbox in zip(picked, scaled.astype(np.int64).tolist()):
+        items[idx] = { **items[idx], 'bbox': bbox }
 
     return items
 
@@ -211,7 +243,8 @@ def fix_model_json(model_json: Optional[List[Union[Dict, List[Dict]]]], page_siz
     if model_json is None:
         return model_json
 
-    items = copy.deepcopy(model_json)
+    # scaled pages are shallow copies, the input list is left untouched
+    items: List[Union[Dict, List[Dict]]] = list(model_json)
 
     for idx, item in enumerate(items):
 
@@ -222,32 +255,34 @@ def fix_model_json(model_json: Optional[List[Union[Dict, List[Dict]]]], page_siz
             wid = item['page_info']['width']
             hei = item['page_info']['height']
 
-            factors = (round(wid / ori[0], 5), round(hei / ori[1], 5))
+            factors = np.array(
+                [ round(wid / ori[0], 5), round(hei / ori[1], 5) ] * 4, dtype=np.float64
+            )
 
-            def oct_scale(poly: List[float], factors: tuple[float, float]) -> List[float]:
-                return [
-                    round(poly[0] / factors[0], 5), round(poly[1] / factors[1], 5),
-                    round(poly[2] / factors[0], 5), round(poly[3] / factors[1], 5),
-                    round(poly[4] / factors[0], 5), round(poly[5] / factors[1], 5),
-                    round(poly[6] / factors[0], 5), round(poly[7] / factors[1], 5),
-                ]
+            dets: List[Dict] = item['layout_dets']
+            if not dets:
+                continue
 
-            for det in item['layout_dets']:
-                det['poly'] = oct_scale(det['poly'], factors)
+            polys: np.ndarray = np.array([ det['poly'][:8] for det in dets ], dtype=np.float64)
+            scaled: List[List[float]] = _round5(polys / factors).tolist()
+
+            items[idx] = {
+                **item, 'layout_dets': [
+                    { **det, 'poly': poly } for det, poly in zip(dets, scaled)
+                ]
+            }
 
         # for vlm output
         elif isinstance(item, list):
 
-            page_size = page_sizes[idx]
+            if not item:
+                continue
 
-            def quad_scale(bbox: List[float], page_size) -> List[float]:
-                return [
-                    round(bbox[0] * page_size[0], 5), round(bbox[1] * page_size[1], 5),
-                    round(bbox[2] * page_size[0], 5), round(bbox[3] * page_size[1], 5),
-                ]
+            factors = np.tile(np.array(page_sizes[idx], dtype=np.float64), 2)
+            bboxes: np.ndarray = np.array([ pice['bbox'][:4] for pice in item ], dtype=np.float64)
+            scaled = _round5(bboxes * factors).tolist()
 
-            for pice in item:
-                pice['bbox'] = quad_scale(pice['bbox'], page_size)
+            items[idx] = [ { **pice, 'bbox': bbox } for pice, bbox in zip(item, scaled) ]
 
         else:
             raise ValueError(f'expected dict or list, {type(item)} given')
@@ -280,56 +315,49 @@ def output_data_handler(
         model_output: Optional[List[Union[Dict, List[Dict]]]],
         is_pipeline: bool,
         apply_scaled_output: bool,
+        json_indent: Optional[int] = 2,
 ) -> None:
 
     image_dir = str(os.path.basename(local_image_dir))
 
+    def dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False, indent=json_indent)
+
     # for content
     make_func = pipeline_union_make if is_pipeline else vlm_union_make
-    md_content_str = make_func(pdf_info, f_make_md_mode, image_dir) # type: ignore
-    md_writer.write_string(f"content.md", md_content_str)
+    if f_dump_md:
+        md_content_str = make_func(pdf_info, f_make_md_mode, image_dir) # type: ignore
+        md_writer.write_string(f"content.md", md_content_str)
 
     # for content list
     make_func = pipeline_union_make if is_pipeline else vlm_union_make
     page_sizes = { page['page_idx']: tuple(page['page_size']) for page in middle_json['pdf_info'] }
-    if is_pipeline:
+    if f_dump_content_list and is_pipeline:
         content_list: List[Dict] = make_func(pdf_info, MakeMode.CONTENT_LIST, image_dir) # type: ignore
-        md_writer.write_string(
-            f"content_list.json", json.dumps(content_list, ensure_ascii=False, indent=2)
-        )
+        md_writer.write_string(f"content_list.json", dumps(content_list))
         if apply_scaled_output:
             md_writer.write_string(
-                f"content_list.scaled.json", json.dumps(
-                    fix_content_list(content_list, page_sizes),
-                    ensure_ascii=False, indent=2)
+                f"content_list.scaled.json", dumps(fix_content_list(content_list, page_sizes))
             )
-    else:
+    elif f_dump_content_list:
         content_list_v2: List[Dict] = make_func(pdf_info, MakeMode.CONTENT_LIST_V2, image_dir) # type: ignore
-        md_writer.write_string(
-            f"content_list_v2.json", json.dumps(content_list_v2, ensure_ascii=False, indent=2)
-        )
+        md_writer.write_string(f"content_list_v2.json", dumps(content_list_v2))
         if apply_scaled_output:
             md_writer.write_string(
-                f"content_list_v2.scaled.json", json.dumps(
-                    fix_content_list(content_list_v2, page_sizes),
-                    ensure_ascii=False, indent=2)
+                f"content_list_v2.scaled.json", dumps(fix_content_list(content_list_v2, page_sizes))
             )
 
     # for middle
-    md_writer.write_string(
-        f"middle.json", json.dumps(middle_json, ensure_ascii=False, indent=2)
-    )
+    if f_dump_middle_json:
+        md_writer.write_string(f"middle.json", dumps(middle_json))
 
     # for model
-    md_writer.write_string(
-        f"model.json", json.dumps(model_output, ensure_ascii=False, indent=2)
-    )
-    if apply_scaled_output:
-        md_writer.write_string(
-            f"model.scaled.json", json.dumps(
-                fix_model_json(model_output, page_sizes),
-                ensure_ascii=False, indent=2)
-        )
+    if f_dump_model_output:
+        md_writer.write_string(f"model.json", dumps(model_output))
+        if apply_scaled_output:
+            md_writer.write_string(
+                f"model.scaled.json", dumps(fix_model_json(model_output, page_sizes))
+            )
 
     # for debug
     if f_draw_layout_bbox or f_draw_span_bbox:
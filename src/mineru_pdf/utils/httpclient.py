@@ -1,65 +1,221 @@
+import hashlib
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import ParseResult, urlparse
+from typing import NamedTuple, Optional, Tuple
 
+import filetype
 import requests
+from filesizelib import FileSize
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from ..exceptions import FileDownloadFailureError
-from ..models import Task
-from ..presenters import TaskSchema
+from ..exceptions import FileDownloadFailureError, FileMIMEUnsupportedError, FileSizeTooLargeError
+from .downloadcache import CachedDownload, lookup_download, reuse_download, store_download
+from .fileguard import calc_sha256sum
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 65536
 
-def download_file(uri: str, sink: Path) -> Path:
-    """Raises :class:`HTTPError`, if one occurred."""
+# filetype looks at most this many leading bytes
+SNIFF_SIZE = 262
+
+
+class Downloaded(NamedTuple):
+    path: Path
+    checksum: str
+    size: int
+
+class _Sniffer(object):
+    """Check magic bytes once enough of the head arrived"""
+
+    def __init__(self) -> None:
+        self.head = bytearray()
+        self.done = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> None:
+
+        if self.done:
+            return
+
+        self.head += chunk[:SNIFF_SIZE - len(self.head)]
+
+        if len(self.head) < SNIFF_SIZE and not final:
+            return
+
+        self.done = True
+        mime = filetype.guess_extension(bytes(self.head))
+        if 'pdf' != mime:
+            raise FileMIMEUnsupportedError(f'mine type {mime} is unsupported')
+
+_session: Optional[requests.Session] = None
+
+def http_session() -> requests.Session:
+    """Pooled session of the process, created on first use after fork"""
+
+    global _session
+
+    if _session is None:
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max(4, int(current_app.config.get('DOWNLOAD_RANGE_PARTS') or 1)),
+            max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.5),
+        )
+        _session = requests.Session()
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+
+    return _session
+
+def _timeouts() -> Tuple[float, float]:
+    return (
+        float(current_app.config.get('DOWNLOAD_CONNECT_TIMEOUT') or 10),
+        float(current_app.config.get('DOWNLOAD_READ_TIMEOUT') or 60),
+    )
+
+def _max_size() -> int:
+    return int(FileSize(current_app.config.get('PDF_MAX_SIZE') or '0').convert_to_bytes())
+
+def _too_large(size: int, limit: int) -> FileSizeTooLargeError:
+    return FileSizeTooLargeError(
+        f'expected filesize is equal or less then {limit} bytes, {size} bytes given'
+    )
+
+def download_file(uri: str, sink: Path, session: Optional[requests.Session] = None) -> Downloaded:
+    """
+    Stream uri into sink, aborts as soon as the file is not a pdf or over
+    PDF_MAX_SIZE, large files are fetched in parallel ranges when allowed
+    """
+
+    session = session or http_session()
+
+    # revalidate a copy of earlier tasks on the same url instead of refetching
+    cached: Optional[CachedDownload] = lookup_download(uri)
 
     try:
-        r: requests.Response = requests.get(uri, stream=True)
+        r: requests.Response = session.get(
+            uri, stream=True, timeout=_timeouts(),
+            headers=cached.conditions() if cached is not None else None
+        )
         r.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise FileDownloadFailureError(str(e))
 
-    with sink.open('wb') as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            f.write(chunk)
-        return sink
+    try:
+        with r:
+            if 304 == r.status_code and cached is not None:
+                if cached.size > _max_size():
+                    raise _too_large(cached.size, _max_size())
+                if reuse_download(cached, sink):
+                    return Downloaded(sink, cached.checksum, cached.size)
+                # evicted meanwhile, fetch unconditionally below
+                length: int = -1
+            else:
+                length: int = int(r.headers.get('Content-Length') or -1)
+                if length > _max_size():
+                    raise _too_large(length, _max_size())
+
+                if not _rangeable(r, length):
+                    return _keep(uri, r, _download_stream(r, sink))
+
+                # head of the body is enough to refuse non pdf early
+                _Sniffer().feed(next(r.iter_content(chunk_size=SNIFF_SIZE), b''), final=True)
+
+        if length > 0:
+            try:
+                return _keep(uri, r, _download_ranges(session, r.url, sink, length))
+            except FileDownloadFailureError as e:
+                logger.warning(f'ranged download of {uri} failed, retry as one stream: {e}')
 
-def post_callback(task: Task) -> None:
+        with session.get(uri, stream=True, timeout=_timeouts()) as r:
+            r.raise_for_status()
+            return _keep(uri, r, _download_stream(r, sink))
+    except requests.exceptions.RequestException as e:
+        sink.unlink(missing_ok=True)
+        raise FileDownloadFailureError(str(e))
+    except Exception:
+        sink.unlink(missing_ok=True)
+        raise
 
-    if task.callback_url is None:
-        return
+def _keep(uri: str, r: requests.Response, downloaded: Downloaded) -> Downloaded:
+    store_download(uri, r, downloaded.path, downloaded.checksum, downloaded.size)
+    return downloaded
 
-    if task.callback_url.isspace():
-        return
+def _rangeable(r: requests.Response, length: int) -> bool:
 
-    uri: ParseResult = urlparse(task.callback_url)
+    range_size: int = int(current_app.config.get('DOWNLOAD_RANGE_SIZE') or 0)
+    parts: int = int(current_app.config.get('DOWNLOAD_RANGE_PARTS') or 1)
 
-    if not uri.scheme or not uri.netloc:
-        logger.warning(f'scheme not found in task {task.uuid} callback: {task.callback_url}')
-        return
+    return (
+        range_size > 0 and parts > 1 and length > range_size and
+        'bytes' == r.headers.get('Accept-Ranges', '').lower() and
+        'Content-Encoding' not in r.headers
+    )
 
-    host: str = current_app.config['APP_URL']
-    data: dict = TaskSchema().dump(task) # type: ignore
+def _download_stream(r: requests.Response, sink: Path) -> Downloaded:
 
-    if 'tarball' in data:
-        if 'location' in data['tarball']:
-            data['tarball']['location'] = '/'.join([
-                host.rstrip('/'), str(data['tarball']['location']).lstrip('/')
-            ])
+    limit: int = _max_size()
+    hash_func = hashlib.new('sha256')
+    sniffer = _Sniffer()
+    size: int = 0
 
-    payload: dict = {
-        'data': data
-    }
+    with sink.open('wb') as f:
+        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(size, limit)
+            sniffer.feed(chunk)
+            hash_func.update(chunk)
+            f.write(chunk)
 
-    for i in range(5):
-        with requests.post(task.callback_url, json=payload, allow_redirects=False) as r:
-            try:
-                r.raise_for_status()
-                logger.info(
-                    f'posted task <{task.uuid}> callback <{task.callback_url}> '
-                    f'with {r.status_code} in {i + 1}th times successfully')
-                break;
-            except requests.HTTPError as e:
-                logger.warning(f'callback failed for <{e}> in {i + 1}th times')
+    sniffer.feed(b'', final=True)
+
+    return Downloaded(sink, 'sha256:' + hash_func.hexdigest(), size)
+
+def _download_ranges(session: requests.Session, uri: str, sink: Path, length: int) -> Downloaded:
+
+    range_size: int = int(current_app.config.get('DOWNLOAD_RANGE_SIZE') or 0)
+    parts: int = int(current_app.config.get('DOWNLOAD_RANGE_PARTS') or 1)
+    timeouts: Tuple[float, float] = _timeouts()
+
+    def fetch(start: int, end: int) -> None:
+        headers: dict = { 'Range': f'bytes={start}-{end}', 'Accept-Encoding': 'identity' }
+        with session.get(uri, stream=True, timeout=timeouts, headers=headers) as r:
+            r.raise_for_status()
+            if 206 != r.status_code:
+                raise FileDownloadFailureError(f'range {start}-{end} answered with {r.status_code}')
+            offset: int = start
+            with sink.open('r+b') as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if offset + len(chunk) > end + 1:
+                        raise FileDownloadFailureError(f'range {start}-{end} answered too long')
+                    os.pwrite(f.fileno(), chunk, offset)
+                    offset += len(chunk)
+            if offset != end + 1:
+                raise FileDownloadFailureError(f'range {start}-{end} answered too short')
+
+    with sink.open('wb') as f:
+        f.truncate(length)
+
+    ranges = [
+        (start, min(start + range_size, length) - 1) for start in range(0, length, range_size)
+    ]
+    logger.info(f'downloading {uri} in {len(ranges)} ranges of {range_size} bytes')
+
+    with ThreadPoolExecutor(max_workers=parts) as executor:
+        futures = [ executor.submit(fetch, start, end) for start, end in ranges ]
+        try:
+            for future in futures:
+                future.result()
+        except requests.exceptions.RequestException as e:
+            executor.shutdown(cancel_futures=True)
+            raise FileDownloadFailureError(str(e))
+        except Exception:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    # parts land out of order, hashed once assembled while still page cached
+    return Downloaded(sink, calc_sha256sum(sink), length)
@@ -0,0 +1,92 @@
+import logging
+import time
+from datetime import datetime, tzinfo
+from typing import List, Optional
+
+import arrow
+from flask import current_app
+
+from ..extensions import database
+from ..models import Task, TaskEvent
+from .clock import as_aware
+
+logger = logging.getLogger(__name__)
+
+
+class StageLedger(object):
+    """
+    Track stage transitions of a task, transitions and their timing rows
+    are buffered until the next flush, so short stages ride along with
+    the commit of a long one instead of taking a transaction each
+    """
+
+    def __init__(self, task: Task, engine: str = '', pages: int = 0) -> None:
+        self.task = task
+        self.engine = engine
+        self.pages = pages
+        self.events: List[TaskEvent] = []
+        self.stage: Optional[str] = None
+        self.stage_at: Optional[datetime] = None
+        self.stage_clock: float = 0.0
+        # resolved once, arrow looks the zone up on every call otherwise
+        self.tzinfo: tzinfo = arrow.now(current_app.config.get('TIMEZONE')).tzinfo
+
+    def now(self) -> datetime:
+        return datetime.now(self.tzinfo)
+
+    def resume(self, stage: str) -> None:
+        """Continue timing stage which the task was left in by another worker"""
+
+        since: datetime = as_aware(self.task.updated_at or self.now(), self.tzinfo) # type: ignore
+
+        self.stage, self.stage_at = stage, since
+        self.stage_clock = time.monotonic() - max(0.0, (self.now() - since).total_seconds())
+
+    def close(self, share: float = 1.0) -> None:
+        """
+        End the current stage, if any, and buffer its timing row, share is
+        the part of the elapsed time owed to this task when several tasks
+        went through the stage together
+        """
+
+        if self.stage is None:
+            return
+
+        self.events.append(TaskEvent(
+            task_id=self.task.id,
+            stage=self.stage,
+            elapsed_ms=int((time.monotonic() - self.stage_clock) * 1000 * share),
+            started_at=self.stage_at,
+            finished_at=self.now(),
+        )) # type: ignore
+        self.stage = None
+
+    def enter(self, stage: str, flush: bool = False, share: float = 1.0) -> datetime:
+        """Move the task into stage, flush when the stage is a long one"""
+
+        self.close(share)
+
+        moment: datetime = self.now()
+        self.stage, self.stage_at, self.stage_clock = stage, moment, time.monotonic()
+
+        self.task.result = stage
+        self.task.updated_at = moment # type: ignore
+
+        if flush:
+            self.flush()
+
+        return moment
+
+    def flush(self, commit: bool = True) -> None:
+        """Commit task changes along with buffered timing rows at once"""
+
+        # engine and pages may be learnt after the stage closed
+        for event in self.events:
+            event.engine = event.engine or self.engine
+            event.pages = event.pages or self.pages
+
+        database.session.add_all(self.events)
+        self.events = []
+
+        if commit:
+            database.session.commit()
@@ -1,8 +1,7 @@
 import logging
-import os
 from pathlib import Path
 from re import search as re_search
-from typing import Dict, Union
+from typing import Dict, List, Tuple, Union
 from urllib.parse import ParseResult, urlparse
 
 import torch
@@ -58,7 +57,6 @@ def magic_args(input_args: dict) -> Dict[str, Union[str, bool, None]]:
             'invalid type for enable_formula, only supported True and False'
         )
     output_args['formula_enabled'] = input_args_['enable_formula']
-    os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(input_args_['enable_formula'])
 
     input_args_.setdefault('enable_table', True)
     if not isinstance(input_args_['enable_table'], bool):
@@ -66,7 +64,6 @@ def magic_args(input_args: dict) -> Dict[str, Union[str, bool, None]]:
             'invalid type for enable_table, only supported True and False'
         )
     output_args['table_enabled'] = input_args_['enable_table']
-    os.environ['MINERU_VLM_TABLE_ENABLE'] = str(input_args_['enable_table'])
 
     if output_args['backend'].endswith('client'):
         vllm_endpoint: ParseResult = urlparse(input_args_.get('vllm_endpoint') or '')
@@ -87,26 +84,66 @@ def magic_args(input_args: dict) -> Dict[str, Union[str, bool, None]]:
 
     return output_args
 
-def magic_file(input_file: Path, output_dir: Path,  **magic_kwargs: Dict[str, Union[str, bool, None]]) -> None:
+def preload_models(**magic_kwargs: Dict[str, Union[str, bool, None]]) -> None:
+    """Load models of the backend into process singletons without inference"""
 
-    logger.info(f'input file: {input_file}')
-    logger.info(f'output dir: {output_dir}')
+    backend: str = magic_kwargs.get('backend') or ParserEngines.PIPELINE # type: ignore
 
-    save_dir = output_dir.resolve()
-    if not save_dir.exists() or save_dir.is_file():
-        raise ValueError(
-            f'output dir {save_dir} does not exist or it is not a directory'
+    if ParserEngines.PIPELINE == backend:
+        from mineru.backend.pipeline.pipeline_analyze import ModelSingleton
+        ModelSingleton().get_model(
+            lang=(magic_kwargs.get('lang_list') or [ TargetLanguages.CH ])[0],
+            formula_enable=magic_kwargs.get('formula_enabled'),
+            table_enable=magic_kwargs.get('table_enabled'),
         )
+        return
+
+    # strip vlm- or hybrid- prefix, same as do_parse
+    engine: str = backend.split('-', 1)[-1]
+
+    if engine.endswith('client'):
+        logger.info(f'backend {backend} inferring remotely, nothing to preload')
+        return
+
+    if 'auto-engine' == engine:
+        from mineru.utils.engine_utils import get_vlm_engine
+        engine = get_vlm_engine(inference_engine='auto', is_async=False)
+
+    from mineru.backend.vlm.vlm_analyze import ModelSingleton as VlmModelSingleton
+    VlmModelSingleton().get_model(engine, None, None)
+
+def magic_file(input_file: Path, output_dir: Path,  **magic_kwargs: Dict[str, Union[str, bool, None]]) -> None:
+    magic_files([ (input_file, output_dir) ], **magic_kwargs)
+
+def magic_files(files: List[Tuple[Path, Path]], **magic_kwargs: Dict[str, Union[str, bool, None]]) -> None:
+    """Parse (input_file, output_dir) pairs sharing options in one do_parse call"""
+
+    save_dirs: List[Path] = []
+
+    for input_file, output_dir in files:
+
+        logger.info(f'input file: {input_file}')
+        logger.info(f'output dir: {output_dir}')
+
+        save_dir = output_dir.resolve()
+        if not save_dir.exists() or save_dir.is_file():
+            raise ValueError(
+                f'output dir {save_dir} does not exist or it is not a directory'
+            )
+        save_dirs.append(save_dir)
 
     if 'do_parse' not in globals():
         from .mineru import do_parse, read_fn
 
+    # one language per document
+    lang_list: List[str] = magic_kwargs.get('lang_list') # type: ignore
+
     try:
         do_parse( # type: ignore
-            output_dir=save_dir.resolve(),
-            pdf_file_names=[ input_file.name ],
-            pdf_bytes_list=[ read_fn(input_file) ], # type: ignore
-            p_lang_list=magic_kwargs.get('lang_list'), # type: ignore
+            output_dir=save_dirs,
+            pdf_file_names=[ input_file.name for input_file, _ in files ],
+            pdf_bytes_list=[ read_fn(input_file) for input_file, _ in files ], # type: ignore
+            p_lang_list=lang_list * len(files) if lang_list else lang_list, # type: ignore
             backend=magic_kwargs.get('backend'), # type: ignore
             parse_method=magic_kwargs.get('parse_method'), # type: ignore
             formula_enable=magic_kwargs.get('formula_enabled'), # type: ignore
@@ -114,7 +151,16 @@ def magic_file(input_file: Path, output_dir: Path,  **magic_kwargs: Dict[str, Un
             server_url=magic_kwargs.get('server_url'),
             f_draw_layout_bbox=magic_kwargs.get('enable_review', False), # type: ignore
             f_dump_orig_pdf=magic_kwargs.get('enable_review', False), # type: ignore
-            apply_scaled_output=magic_kwargs.get('apply_scaled_output', False)
+            apply_scaled_output=magic_kwargs.get('apply_scaled_output', False),
+            start_page_id=magic_kwargs.get('start_page_id', 0),
+            end_page_id=magic_kwargs.get('end_page_id'),
+            f_dump_md=magic_kwargs.get('dump_md', True), # type: ignore
+            f_dump_content_list=magic_kwargs.get('dump_content_list', True), # type: ignore
+            f_dump_middle_json=magic_kwargs.get('dump_middle_json', True), # type: ignore
+            f_dump_model_output=magic_kwargs.get('dump_model_output', True), # type: ignore
+            data_writer=magic_kwargs.get('data_writer'),
+            json_indent=magic_kwargs.get('json_indent', 2), # type: ignore
+            on_progress=magic_kwargs.get('on_progress'),
         )
     except (MemoryError, torch.OutOfMemoryError) as e:
         raise GPUOutOfMemoryException('GPU out of memory') from e
@@ -128,4 +174,5 @@ def magic_file(input_file: Path, output_dir: Path,  **magic_kwargs: Dict[str, Un
             torch.cuda.empty_cache()
             torch.cuda.ipc_collect()
 
-    logger.info(f'saved in: {save_dir}')
+    for save_dir in save_dirs:
+        logger.info(f'saved in: {save_dir}')
@@ -0,0 +1,106 @@
+import io
+import posixpath
+import time
+from fnmatch import fnmatch
+from types import SimpleNamespace
+from typing import IO, Dict, Iterable, List, Optional, Set
+
+from mineru.data.data_reader_writer import DataWriter
+
+
+class MemoryDataWriter(DataWriter):
+    """
+    Keep written files in memory keyed by relative path, paths under
+    skipped prefixes are dropped, e.g. images not asked for
+    """
+
+    def __init__(
+        self, files: Optional[Dict[str, bytes]] = None,
+        prefix: str = '', skip: Iterable[str] = (), dirs: Optional[Set[str]] = None
+    ) -> None:
+        self.files: Dict[str, bytes] = {} if files is None else files
+        self.dirs: Set[str] = set() if dirs is None else dirs
+        self.prefix = prefix
+        self.skip = tuple(skip)
+
+    def _skipped(self, name: str) -> bool:
+        return any(name == s or name.startswith(s + '/') for s in self.skip)
+
+    def write(self, path: str, data: bytes) -> None:
+
+        name: str = posixpath.normpath(posixpath.join(self.prefix, path))
+
+        if self._skipped(name):
+            return
+
+        self.files[name] = data
+
+    def subdir(self, name: str) -> 'MemoryDataWriter':
+
+        prefix: str = posixpath.join(self.prefix, name)
+
+        # same as mkdir of file based writers, the directory exists even empty
+        if not self._skipped(prefix):
+            self.dirs.add(prefix)
+
+        return MemoryDataWriter(self.files, prefix, self.skip, self.dirs)
+
+    def root(self) -> 'MemoryPath':
+        return MemoryPath(self.files, '', self.dirs)
+
+class MemoryPath(object):
+    """Read only look-alike of Path over files of a MemoryDataWriter"""
+
+    def __init__(self, files: Dict[str, bytes], path: str, dirs: Optional[Set[str]] = None) -> None:
+        self.files = files
+        self.dirs: Set[str] = set() if dirs is None else dirs
+        self.path = path
+        self.created = time.time()
+
+    def __repr__(self) -> str:
+        return f'MemoryPath({self.path!r})'
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.path)
+
+    @property
+    def suffix(self) -> str:
+        return posixpath.splitext(self.path)[1]
+
+    def joinpath(self, *parts: str) -> 'MemoryPath':
+        return MemoryPath(self.files, posixpath.join(self.path, *parts).lstrip('/'), self.dirs)
+
+    def exists(self) -> bool:
+        return self.is_file() or self.is_dir()
+
+    def is_file(self) -> bool:
+        return self.path in self.files
+
+    def is_dir(self) -> bool:
+        if self.path in self.dirs:
+            return True
+        prefix: str = self.path + '/' if self.path else ''
+        return any(name.startswith(prefix) for name in self.files)
+
+    def glob(self, pattern: str) -> List['MemoryPath']:
+        return [
+            MemoryPath(self.files, name, self.dirs) for name in sorted(self.files)
+            if posixpath.dirname(name) == self.path and fnmatch(posixpath.basename(name), pattern)
+        ]
+
+    def stat(self) -> SimpleNamespace:
+        return SimpleNamespace(st_size=len(self.files[self.path]), st_mtime=self.created)
+
+    def read_bytes(self) -> bytes:
+        return self.files[self.path]
+
+    def open(self, mode: str = 'r') -> IO:
+
+        if self.path not in self.files:
+            raise FileNotFoundError(self.path)
+
+        if 'b' in mode:
+            return io.BytesIO(self.files[self.path])
+
+        return io.TextIOWrapper(io.BytesIO(self.files[self.path]), encoding='utf-8')
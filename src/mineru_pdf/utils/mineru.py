@@ -2,6 +2,7 @@ import copy
 import io
 import logging
 import os
+from contextlib import contextmanager
 from pathlib import Path
 
 import pypdfium2 as pdfium
@@ -34,6 +35,72 @@ def read_fn(path):
 def _prepare_env(output_dir, pdf_file_name, parse_method):
     return output_dirs_handler(output_dir, pdf_file_name, parse_method)
 
+def _pick_per_document(value, idx):
+    """value is either shared by all documents or a list of one per document"""
+    if isinstance(value, (list, tuple)):
+        return value[idx]
+    return value
+
+def _prepare_writers(data_writer, local_image_dir, local_md_dir):
+    """Writers for images and texts, file based unless a memory writer given"""
+    if data_writer is None:
+        return FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+    return data_writer.subdir(os.path.basename(local_image_dir)), data_writer
+
+class _PageProgress(object):
+    """
+    Pages reported per document through on_progress(idx, pages), batches of
+    pages are spread over documents in order, a document done tops up the rest
+    """
+
+    def __init__(self, on_progress, page_counts):
+        self.on_progress = on_progress
+        self.page_counts = list(page_counts)
+        self.reported = [ 0 ] * len(self.page_counts)
+
+    def _report(self, idx, pages):
+        if pages > 0 and self.on_progress is not None:
+            self.reported[idx] += pages
+            self.on_progress(idx, pages)
+
+    def batch(self, pages):
+        for idx, count in enumerate(self.page_counts):
+            if pages < 1:
+                break
+            taken = min(pages, count - self.reported[idx])
+            self._report(idx, taken)
+            pages -= max(0, taken)
+
+    def done(self, idx, pages):
+        self._report(idx, pages - self.reported[idx])
+
+@contextmanager
+def _pipeline_batches(progress):
+    """Report pages after each inference batch of pipeline doc_analyze"""
+    from mineru.backend.pipeline import pipeline_analyze
+
+    batch_image_analyze = pipeline_analyze.batch_image_analyze
+
+    def counted(images_with_extra_info, *args, **kwargs):
+        results = batch_image_analyze(images_with_extra_info, *args, **kwargs)
+        progress.batch(len(images_with_extra_info))
+        return results
+
+    # looked up as module global by doc_analyze, inference is serialized
+    # per process by the inference lock so nobody else sees the swap
+    pipeline_analyze.batch_image_analyze = counted
+    try:
+        yield progress
+    finally:
+        pipeline_analyze.batch_image_analyze = batch_image_analyze
+
+def _count_pages(pdf_bytes):
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
 def _convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id=0, end_page_id=None):
     pdf = pdfium.PdfDocument(pdf_bytes)
     output_pdf = pdfium.PdfDocument.new()
@@ -90,6 +157,7 @@ def _process_output(
         middle_json,
         model_output=None,
         is_pipeline=True,
+        json_indent=2,
         **kwargs
 ):
     output_data_handler(
@@ -110,7 +178,8 @@ def _process_output(
         middle_json,
         model_output,
         is_pipeline,
-        kwargs.get('apply_scaled_output', False)
+        kwargs.get('apply_scaled_output', False),
+        json_indent,
     )
 
     logger.info(f"local output dir is {local_md_dir}")
@@ -131,24 +200,33 @@ def _process_pipeline(
         f_dump_orig_pdf,
         f_dump_content_list,
         f_make_md_mode,
+        data_writer=None,
+        json_indent=2,
+        on_progress=None,
         **kwargs
 ):
     """处理pipeline后端逻辑"""
     from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
     from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
 
-    infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = (
-        pipeline_doc_analyze(
-            pdf_bytes_list, p_lang_list, parse_method=parse_method,
-            formula_enable=p_formula_enable, table_enable=p_table_enable
+    progress = _PageProgress(on_progress, [ _count_pages(pdf_bytes) for pdf_bytes in pdf_bytes_list ])
+
+    # pages of all documents are inferred together, MINERU_MIN_BATCH_INFERENCE_SIZE at a time
+    with _pipeline_batches(progress):
+        infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = (
+            pipeline_doc_analyze(
+                pdf_bytes_list, p_lang_list, parse_method=parse_method,
+                formula_enable=p_formula_enable, table_enable=p_table_enable
+            )
         )
-    )
 
     for idx, model_list in enumerate(infer_results):
-        model_json = copy.deepcopy(model_list)
+        model_json = copy.deepcopy(model_list) if f_dump_model_output else None
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = _prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        local_image_dir, local_md_dir = _prepare_env(_pick_per_document(output_dir, idx), pdf_file_name, parse_method)
+        image_writer, md_writer = _prepare_writers(
+            _pick_per_document(data_writer, idx), local_image_dir, local_md_dir
+        )
 
         images_list = all_image_lists[idx]
         pdf_doc = all_pdf_docs[idx]
@@ -167,9 +245,12 @@ def _process_pipeline(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, model_json, is_pipeline=True, **kwargs
+            f_make_md_mode, middle_json, model_json, is_pipeline=True, json_indent=json_indent, **kwargs
         )
 
+        # pages left over by the batches, e.g. when counts disagree
+        progress.done(idx, len(pdf_info))
+
 def _process_vlm(
         output_dir,
         pdf_file_names,
@@ -184,6 +265,9 @@ def _process_vlm(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        data_writer=None,
+        json_indent=2,
+        on_progress=None,
         **kwargs,
 ):
     """同步处理VLM后端逻辑"""
@@ -197,8 +281,10 @@ def _process_vlm(
 
     for idx, pdf_bytes in enumerate(pdf_bytes_list):
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = _prepare_env(output_dir, pdf_file_name, parse_method)
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        local_image_dir, local_md_dir = _prepare_env(_pick_per_document(output_dir, idx), pdf_file_name, parse_method)
+        image_writer, md_writer = _prepare_writers(
+            _pick_per_document(data_writer, idx), local_image_dir, local_md_dir
+        )
 
         middle_json, infer_result = vlm_doc_analyze( # type: ignore
             pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
@@ -210,9 +296,13 @@ def _process_vlm(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False, **kwargs
+            f_make_md_mode, middle_json, infer_result, is_pipeline=False, json_indent=json_indent, **kwargs
         )
 
+        # one predictor call takes all pages, the document is the finest step
+        if on_progress is not None:
+            on_progress(idx, len(pdf_info))
+
 def _process_hybrid(
         output_dir,
         pdf_file_names,
@@ -230,6 +320,9 @@ def _process_hybrid(
         f_dump_content_list,
         f_make_md_mode,
         server_url=None,
+        data_writer=None,
+        json_indent=2,
+        on_progress=None,
         **kwargs,
 ):
     """同步处理hybrid后端逻辑"""
@@ -241,8 +334,10 @@ def _process_hybrid(
 
     for idx, (pdf_bytes, lang) in enumerate(zip(pdf_bytes_list, h_lang_list)):
         pdf_file_name = pdf_file_names[idx]
-        local_image_dir, local_md_dir = _prepare_env(output_dir, pdf_file_name, f"hybrid_{parse_method}")
-        image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+        local_image_dir, local_md_dir = _prepare_env(_pick_per_document(output_dir, idx), pdf_file_name, f"hybrid_{parse_method}")
+        image_writer, md_writer = _prepare_writers(
+            _pick_per_document(data_writer, idx), local_image_dir, local_md_dir
+        )
 
         middle_json, infer_result, _vlm_ocr_enable = hybrid_doc_analyze( # type: ignore
             pdf_bytes,
@@ -264,9 +359,13 @@ def _process_hybrid(
             pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
             md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
             f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False, **kwargs
+            f_make_md_mode, middle_json, infer_result, is_pipeline=False, json_indent=json_indent, **kwargs
         )
 
+        # one predictor call takes all pages, the document is the finest step
+        if on_progress is not None:
+            on_progress(idx, len(pdf_info))
+
 def do_parse(
         output_dir,
         pdf_file_names: list[str],
@@ -287,6 +386,9 @@ def do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        data_writer=None,
+        json_indent=2,
+        on_progress=None,
         **kwargs,
 ):
     # 预处理PDF字节数据
@@ -297,7 +399,8 @@ def do_parse(
             output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
             parse_method, formula_enable, table_enable,
             f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode, **kwargs
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            data_writer=data_writer, json_indent=json_indent, on_progress=on_progress, **kwargs
         )
     else:
         if backend.startswith("vlm-"):
@@ -309,6 +412,9 @@ def do_parse(
             if backend == "auto-engine":
                 backend = get_vlm_engine(inference_engine='auto', is_async=False)
 
+            # mineru reads both from env, set here under the inference lock
+            # rather than in magic_args where it would race with a request
+            # inferring on another thread
             os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
             os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
 
@@ -316,7 +422,7 @@ def do_parse(
                 output_dir, pdf_file_names, pdf_bytes_list, backend,
                 f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
                 f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-                server_url, **kwargs,
+                server_url, data_writer=data_writer, json_indent=json_indent, on_progress=on_progress, **kwargs,
             )
         elif backend.startswith("hybrid-"):
             backend = backend[7:]
@@ -328,6 +434,7 @@ def do_parse(
             if backend == "auto-engine":
                 backend = get_vlm_engine(inference_engine='auto', is_async=False)
 
+            # same as vlm, under the inference lock
             os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
             os.environ['MINERU_VLM_FORMULA_ENABLE'] = "true"
 
@@ -335,5 +442,5 @@ def do_parse(
                 output_dir, pdf_file_names, pdf_bytes_list, p_lang_list, parse_method, formula_enable, backend,
                 f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
                 f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-                server_url, **kwargs,
+                server_url, data_writer=data_writer, json_indent=json_indent, on_progress=on_progress, **kwargs,
             )
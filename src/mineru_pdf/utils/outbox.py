@@ -0,0 +1,310 @@
+import fcntl
+import hashlib
+import json
+import logging
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import ParseResult, urlparse
+
+import arrow
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from sqlalchemy import func, select, update
+
+from ..constants import CallbackStatus
+from ..extensions import database
+from ..models import Callback, Task
+from ..presenters import TaskSchema
+from .archives import archive_url
+from .clock import as_aware
+
+logger = logging.getLogger(__name__)
+
+# retries due within this many seconds are kicked directly, later ones
+# are left to the periodic sweep instead of parking long countdowns in broker
+SWEEP_INTERVAL = 60
+# a kick finding every slot of the host taken looks again after this many
+# seconds, a deliverer may be leaving just as the callback became due
+SLOT_RETRY = 2
+
+
+class Outcome(NamedTuple):
+    ok: bool
+    code: int
+    error: str
+    retry_after: Optional[float]
+
+_session: Optional[requests.Session] = None
+
+def callback_session() -> requests.Session:
+    """Pooled session of the process, retries are scheduled by the outbox"""
+
+    global _session
+
+    if _session is None:
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=max(1, int(current_app.config.get('CALLBACK_HOST_CONCURRENCY') or 1)),
+            max_retries=0,
+        )
+        _session = requests.Session()
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+
+    return _session
+
+def _now() -> datetime:
+    return arrow.now(current_app.config.get('TIMEZONE')).datetime
+
+def _slots_dir() -> Path:
+
+    slots_dir: Path = Path(
+        current_app.instance_path
+    ).joinpath(
+        'cache', 'callbacks'
+    ).resolve()
+
+    if not slots_dir.exists():
+        slots_dir.mkdir(parents=True, exist_ok=True)
+
+    return slots_dir
+
+@contextmanager
+def host_slot(host: str) -> Iterator[bool]:
+    """
+    Hold one of CALLBACK_HOST_CONCURRENCY delivery slots of host, slots
+    are file locks shared by every process of this machine, yields False
+    when all of them are taken already
+    """
+
+    capacity: int = max(1, int(current_app.config.get('CALLBACK_HOST_CONCURRENCY') or 1))
+    prefix: str = hashlib.sha256(host.encode()).hexdigest()[:16]
+    slots_dir: Path = _slots_dir()
+    held: Optional[IO] = None
+
+    for i in range(capacity):
+        f = slots_dir.joinpath(f'{prefix}.{i}').open('a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            continue
+        held = f
+        break
+
+    try:
+        yield held is not None
+    finally:
+        if held is not None:
+            fcntl.flock(held, fcntl.LOCK_UN)
+            held.close()
+
+def backoff(attempts: int) -> float:
+    """Exponential delay after the attempts made, half of it jittered"""
+
+    base: float = float(current_app.config.get('CALLBACK_BACKOFF') or 1)
+    cap: float = float(current_app.config.get('CALLBACK_BACKOFF_MAX') or base)
+    delay: float = min(cap, base * 2 ** max(0, attempts - 1))
+
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _absolute(location: str) -> str:
+    return '/'.join([ current_app.config['APP_URL'].rstrip('/'), location.lstrip('/') ])
+
+def _payloads(callbacks: List[Callback]) -> List[dict]:
+    """Stored payloads, archive urls signed again as they expire across retries"""
+
+    uuids: Dict[int, str] = dict(database.session.execute( # type: ignore
+        select(Task.id, Task.uuid).where(Task.id.in_([ c.task_id for c in callbacks ]))
+    ).all())
+
+    payloads: List[dict] = []
+    for callback in callbacks:
+        data: dict = json.loads(callback.payload)
+        if 'location' in (data.get('tarball') or {}) and callback.task_id in uuids:
+            data['tarball']['location'] = _absolute(archive_url(uuids[callback.task_id]))
+        payloads.append(data)
+
+    return payloads
+
+def enqueue_callback(task: Task) -> Optional[Callback]:
+    """Add the callback of a finished task to outbox, committed by the caller"""
+
+    if task.callback_url is None or task.callback_url.isspace():
+        return None
+
+    uri: ParseResult = urlparse(task.callback_url)
+
+    if not uri.scheme or not uri.netloc:
+        logger.warning(f'scheme not found in task {task.uuid} callback: {task.callback_url}')
+        return None
+
+    data: dict = TaskSchema().dump(task) # type: ignore
+
+    if 'tarball' in data:
+        if 'location' in data['tarball']:
+            data['tarball']['location'] = _absolute(str(data['tarball']['location']))
+
+    now: datetime = _now()
+    callback: Callback = Callback(
+        task_id=task.id, # type: ignore
+        url=task.callback_url, # type: ignore
+        host=uri.netloc.lower(), # type: ignore
+        payload=json.dumps(data), # type: ignore
+        status=CallbackStatus.PENDING, # type: ignore
+        next_attempt_at=now, # type: ignore
+        created_at=now, # type: ignore
+        updated_at=now, # type: ignore
+    )
+    database.session.add(callback)
+
+    return callback
+
+def _claim_due(host: str, limit: int) -> List[Callback]:
+    """Take due callbacks of host, a crashed deliverer's lease expires into due"""
+
+    now: datetime = _now()
+    lease: datetime = now + timedelta(
+        seconds=float(current_app.config.get('CALLBACK_TIMEOUT') or 10) * 2 + SWEEP_INTERVAL
+    )
+
+    claimed: List[int] = []
+
+    # rows won by another deliverer are leased off the due ones, so looking
+    # again moves on to the next, an empty claim means nothing is left
+    while not claimed:
+
+        candidates: List[Callback] = list(database.session.scalars(
+            select(Callback).
+            where(
+                Callback.host == host,
+                Callback.status.in_([ CallbackStatus.PENDING, CallbackStatus.DELIVERING ]),
+                Callback.next_attempt_at <= now,
+            ).
+            order_by(Callback.id).
+            limit(limit)
+        ))
+
+        if not candidates:
+            return []
+
+        for callback in candidates:
+            # attempts doubles as version, another deliverer may have won the row
+            result = database.session.execute(
+                update(Callback).
+                where(Callback.id == callback.id, Callback.attempts == callback.attempts).
+                values(
+                    status=CallbackStatus.DELIVERING, attempts=Callback.attempts + 1,
+                    next_attempt_at=lease, updated_at=now,
+                )
+            )
+            if 1 == result.rowcount: # type: ignore
+                claimed.append(callback.id)
+
+        database.session.commit()
+
+    return list(database.session.scalars(
+        select(Callback).where(Callback.id.in_(claimed)).order_by(Callback.id)
+    ))
+
+def _post(url: str, payload: object) -> Outcome:
+
+    try:
+        with callback_session().post(
+            url, json=payload, allow_redirects=False,
+            timeout=float(current_app.config.get('CALLBACK_TIMEOUT') or 10)
+        ) as r:
+            if r.ok:
+                return Outcome(True, r.status_code, '', None)
+            retry_after: Optional[float] = None
+            try:
+                retry_after = float(r.headers.get('Retry-After') or '')
+            except ValueError:
+                pass
+            return Outcome(False, r.status_code, f'{r.status_code} {r.reason}', retry_after)
+    except requests.exceptions.RequestException as e:
+        return Outcome(False, 0, f'{type(e).__name__}: {e}', None)
+
+def _record(callback: Callback, outcome: Outcome) -> None:
+
+    now: datetime = _now()
+    max_attempts: int = int(current_app.config.get('CALLBACK_MAX_ATTEMPTS') or 1)
+
+    callback.last_code = outcome.code
+    callback.last_error = outcome.error[:255]
+    callback.updated_at = now # type: ignore
+
+    if outcome.ok:
+        callback.status = CallbackStatus.DELIVERED
+        callback.delivered_at = now # type: ignore
+        callback.next_attempt_at = None
+        logger.info(f'delivered callback {callback.id} of task {callback.task_id} in {callback.attempts} attempts')
+    elif callback.attempts >= max_attempts:
+        callback.status = CallbackStatus.FAILED
+        callback.next_attempt_at = None
+        logger.warning(f'gave up callback {callback.id} of task {callback.task_id}: {outcome.error}')
+    else:
+        delay: float = max(backoff(callback.attempts), outcome.retry_after or 0)
+        callback.status = CallbackStatus.PENDING
+        callback.next_attempt_at = now + timedelta(seconds=delay) # type: ignore
+        logger.info(f'callback {callback.id} failed with <{outcome.error}>, retry in {delay:.1f}s')
+
+def deliver_due(host: str) -> int:
+    """
+    Deliver due callbacks of host until none is left, receivers listed in
+    CALLBACK_BATCH_HOSTS get callbacks to the same url as one array
+    """
+
+    batched: bool = host in (current_app.config.get('CALLBACK_BATCH_HOSTS') or [])
+    limit: int = max(1, int(current_app.config.get('CALLBACK_BATCH_SIZE') or 1)) if batched else 1
+    delivered: int = 0
+
+    while callbacks := _claim_due(host, limit):
+
+        by_url: Dict[str, List[Callback]] = defaultdict(list)
+        for callback in callbacks:
+            by_url[callback.url].append(callback)
+
+        for url, group in by_url.items():
+            if batched:
+                outcome: Outcome = _post(url, { 'data': _payloads(group) })
+            else:
+                outcome: Outcome = _post(url, { 'data': _payloads(group)[0] })
+            for callback in group:
+                _record(callback, outcome)
+            delivered += len(group) if outcome.ok else 0
+            database.session.commit()
+
+    return delivered
+
+def next_due(host: str) -> Optional[float]:
+    """Seconds until the next pending callback of host is due"""
+
+    upcoming = database.session.scalar(
+        select(func.min(Callback.next_attempt_at)).
+        where(Callback.host == host, Callback.status == CallbackStatus.PENDING)
+    )
+
+    if upcoming is None:
+        return None
+
+    now: datetime = _now()
+
+    return max(0.0, (as_aware(upcoming, now.tzinfo) - now).total_seconds()) # type: ignore
+
+def due_hosts() -> List[str]:
+    """Hosts with callbacks due, including the ones of expired leases"""
+
+    return list(database.session.scalars(
+        select(Callback.host).
+        where(
+            Callback.status.in_([ CallbackStatus.PENDING, CallbackStatus.DELIVERING ]),
+            Callback.next_attempt_at <= _now(),
+        ).
+        distinct()
+    ))
@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1048576
+
+# compressed formats already, deflating them burns cpu for nothing
+STORED_SUFFIXES = ( '.jpg', '.jpeg', '.png', '.pdf', '.zip' )
+
+# values from here on move into zip64 extra fields, marked in the record
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# general purpose flags, utf-8 names, crc and sizes are known before data
+# so no data descriptor, streaming readers refuse one on stored entries
+FLAGS = 0x800
+
+
+class PackResult(NamedTuple):
+    path: Path
+    checksum: str
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+class _Entry(NamedTuple):
+    arcname: bytes
+    method: int
+    crc: int
+    compressed: int
+    size: int
+    offset: int
+    dostime: Tuple[int, int]
+    external_attr: int
+
+class _HashingWriter(object):
+    """Forward writes into file while hashing and counting them"""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.hash = hashlib.new('sha256')
+        self.offset = 0
+
+    def write(self, data: bytes) -> None:
+        self.f.write(data)
+        self.hash.update(data)
+        self.offset += len(data)
+
+def _dostime(mtime: float) -> Tuple[int, int]:
+
+    t = time.localtime(mtime)
+
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+def _is_stored(file: Path) -> bool:
+    return file.is_dir() or file.suffix.lower() in STORED_SUFFIXES
+
+def _field(value: int) -> int:
+    return ZIP64_MARKER if value >= ZIP64_LIMIT else value
+
+def _crc32(file: Path) -> Tuple[None, int, int]:
+    """Crc32 and size of file ahead of storing it, runs in threads"""
+
+    crc: int = 0
+    size: int = 0
+
+    with file.open('rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+
+    return None, crc, size
+
+def _deflate(file: Path) -> Tuple[List[bytes], int, int]:
+    """Raw deflate stream of file with its crc32 and size, runs in threads"""
+
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    chunks: List[bytes] = []
+    crc: int = 0
+    size: int = 0
+
+    with file.open('rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+
+    chunks.append(compressor.flush())
+
+    return chunks, crc, size
+
+def _read_chunks(file: Path) -> Iterator[bytes]:
+    with file.open('rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+def _write_entry(
+    sink: _HashingWriter, arcname: str, method: int, mtime: float,
+    external_attr: int, chunks: Iterable[bytes], crc: int, compressed: int, size: int
+) -> _Entry:
+    """Write one member with crc and sizes known, in its local header already"""
+
+    name: bytes = arcname.encode('utf-8')
+    offset: int = sink.offset
+    dostime: Tuple[int, int] = _dostime(mtime)
+
+    # local zip64 extra carries both sizes whenever either overflows
+    zip64: bool = max(size, compressed) >= ZIP64_LIMIT
+    extra: bytes = struct.pack('<HHQQ', 0x0001, 16, size, compressed) if zip64 else b''
+    sink.write(struct.pack(
+        '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, FLAGS, method,
+        *dostime, crc, ZIP64_MARKER if zip64 else compressed,
+        ZIP64_MARKER if zip64 else size, len(name), len(extra)
+    ) + name + extra)
+
+    written: int = 0
+    for chunk in chunks:
+        written += len(chunk)
+        sink.write(chunk)
+
+    # header is written already, a file changed meanwhile can not be fixed up
+    if written != compressed:
+        raise ValueError(f'{arcname} changed while packing, {compressed} bytes expected, {written} written')
+
+    return _Entry(name, method, crc, compressed, size, offset, dostime, external_attr)
+
+def _write_central(sink: _HashingWriter, entries: List[_Entry]) -> None:
+
+    cd_offset: int = sink.offset
+
+    for entry in entries:
+
+        fields: List[int] = []
+        if entry.size >= ZIP64_LIMIT:
+            fields.append(entry.size)
+        if entry.compressed >= ZIP64_LIMIT:
+            fields.append(entry.compressed)
+        if entry.offset >= ZIP64_LIMIT:
+            fields.append(entry.offset)
+
+        extra: bytes = struct.pack(
+            f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields
+        ) if fields else b''
+        version: int = 45 if fields else 20
+
+        sink.write(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, FLAGS,
+            entry.method, *entry.dostime, entry.crc,
+            _field(entry.compressed), _field(entry.size),
+            len(entry.arcname), len(extra), 0, 0, 0,
+            entry.external_attr, _field(entry.offset)
+        ) + entry.arcname + extra)
+
+    cd_size: int = sink.offset - cd_offset
+    count: int = len(entries)
+
+    if count >= 0xFFFF or cd_size >= ZIP64_LIMIT or cd_offset >= ZIP64_LIMIT:
+        zip64_offset: int = sink.offset
+        sink.write(struct.pack(
+            '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset
+        ))
+        sink.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+
+    sink.write(struct.pack(
+        '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        _field(cd_size), _field(cd_offset), 0
+    ))
+
+def pack_zipfile(zip_file: Path, target_dir: Path, workers: Optional[int] = None) -> PackResult:
+    """
+    Archive target_dir into zip_file in one sequential write, compressed
+    formats are stored, the rest deflated ahead in threads, crc of stored
+    ones taken ahead as well, the sha256 of the archive is computed while
+    writing
+    """
+
+    if not zip_file.parent.is_dir() or zip_file.exists():
+        raise ValueError(f"The provided zip_file {zip_file} is not a valid file path or exists")
+
+    if not target_dir.is_dir():
+        raise ValueError(f"The provided path {target_dir} is not a valid directory.")
+
+    started: float = time.monotonic()
+    workers = workers or min(4, os.cpu_count() or 1)
+
+    members: List[Path] = list(target_dir.rglob('*'))
+    reading: Iterator[Path] = iter([ file for file in members if not file.is_dir() ])
+    pending: Deque[Future] = deque()
+    entries: List[_Entry] = []
+    bytes_in: int = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, zip_file.open('xb') as f:
+
+        sink = _HashingWriter(f)
+
+        def top_up() -> None:
+            # bounded read ahead, keep only a few compressed files in memory
+            while len(pending) < workers * 2 and (file := next(reading, None)) is not None:
+                pending.append(executor.submit(_crc32 if _is_stored(file) else _deflate, file))
+
+        for member in members:
+
+            top_up()
+
+            stat = member.stat()
+            arcname: str = member.relative_to(target_dir).as_posix()
+
+            if member.is_dir():
+                entries.append(_write_entry(
+                    sink, arcname + '/', ZIP_STORED, stat.st_mtime,
+                    (0o40755 << 16) | 0x10, [], 0, 0, 0
+                ))
+            elif _is_stored(member):
+                _, crc, size = pending.popleft().result()
+                entries.append(_write_entry(
+                    sink, arcname, ZIP_STORED, stat.st_mtime, (0o100644 << 16),
+                    _read_chunks(member), crc, size, size
+                ))
+                bytes_in += size
+            else:
+                deflated, crc, size = pending.popleft().result()
+                entries.append(_write_entry(
+                    sink, arcname, ZIP_DEFLATED, stat.st_mtime, (0o100644 << 16),
+                    deflated, crc, sum(len(chunk) for chunk in deflated), size
+                ))
+                bytes_in += size
+                del deflated
+
+        _write_central(sink, entries)
+
+    result = PackResult(
+        zip_file, 'sha256:' + sink.hash.hexdigest(),
+        bytes_in, sink.offset, time.monotonic() - started
+    )
+
+    logger.info(
+        f'packed {len(entries)} members of {target_dir} into {zip_file}, '
+        f'{result.bytes_in} bytes in, {result.bytes_out} bytes out, {result.seconds:.3f}s'
+    )
+
+    return result
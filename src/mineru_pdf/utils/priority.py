@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+import arrow
+from flask import current_app
+
+from ..constants import TaskPriorities, TaskStatus
+from ..models import Task
+from .clock import as_aware
+
+logger = logging.getLogger(__name__)
+
+# broker priorities of the redis transport, 0 is consumed first
+PRIORITY_STEPS = list(range(10))
+
+# room is left around each level for cost and aging to move within
+BASE_PRIORITIES = {
+    TaskPriorities.HIGH: 2,
+    TaskPriorities.NORMAL: 5,
+    TaskPriorities.LOW: 8,
+}
+
+
+def waiting_since(task: Task) -> Optional[datetime]:
+    """Moment the task began waiting in its current queue"""
+
+    # created ones wait for mining, staged ones for inferring
+    since = task.created_at if TaskStatus.CREATED == task.status else task.updated_at
+
+    return since # type: ignore
+
+def task_priority(task: Task, pages: Optional[int] = None) -> int:
+    """
+    Broker priority of task, from the requested level, shifted by cost
+    once the page count is known, and promoted by one for every
+    PRIORITY_AGING seconds waited so long documents never starve
+    """
+
+    priority: int = BASE_PRIORITIES.get(task.priority, BASE_PRIORITIES[TaskPriorities.NORMAL]) # type: ignore
+
+    # shortest job first, within reach of the neighbouring levels only
+    if pages is not None and pages > 0:
+        if pages <= int(current_app.config.get('PRIORITY_SHORT_PAGES') or 0):
+            priority -= 2
+        elif pages >= int(current_app.config.get('PRIORITY_LONG_PAGES') or 0) > 0:
+            priority += 2
+
+    aging: float = float(current_app.config.get('PRIORITY_AGING') or 0)
+    since: Optional[datetime] = waiting_since(task)
+
+    if aging > 0 and since is not None:
+        now: datetime = arrow.now(current_app.config.get('TIMEZONE')).datetime
+        since = as_aware(since, now.tzinfo) # type: ignore
+        priority -= int(max(0.0, (now - since).total_seconds()) // aging)
+
+    return min(PRIORITY_STEPS[-1], max(PRIORITY_STEPS[0], priority))
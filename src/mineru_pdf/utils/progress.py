@@ -0,0 +1,95 @@
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import arrow
+from flask import current_app
+from sqlalchemy import select, update
+
+from ..constants import ParserEngines, TaskResult
+from ..extensions import database
+from ..models import Task, TaskEvent
+from .clock import as_aware
+
+logger = logging.getLogger(__name__)
+
+# recent inferring stages averaged into pages per second of an engine
+RATE_WINDOW = 20
+RATE_TTL = 30.0
+
+_rates: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+def report_pages(task_id: int, pages: int) -> None:
+    """Add pages done to task in one statement, safe across shard workers"""
+
+    database.session.execute(
+        update(Task).
+        where(Task.id == task_id).
+        values(
+            pages_done=Task.pages_done + pages,
+            updated_at=arrow.now(current_app.config.get('TIMEZONE')).datetime,
+        )
+    )
+    database.session.commit()
+
+def page_rate(engine: str) -> Optional[float]:
+    """
+    Pages per second of engine over recent stages, None when unknown, tasks
+    inferred in one batch each record their share of its time
+    """
+
+    cached_at, rate = _rates.get(engine, (0.0, None))
+    if time.monotonic() - cached_at < RATE_TTL:
+        return rate
+
+    rows = database.session.execute(
+        select(TaskEvent.pages, TaskEvent.elapsed_ms).
+        where(
+            TaskEvent.stage == TaskResult.INFERRING,
+            TaskEvent.engine == engine,
+            TaskEvent.pages > 0,
+        ).
+        order_by(TaskEvent.id.desc()).
+        limit(RATE_WINDOW)
+    ).all()
+
+    pages: int = sum(row[0] for row in rows)
+    elapsed: int = sum(row[1] for row in rows)
+
+    rate = pages * 1000 / elapsed if elapsed > 0 else None
+    _rates[engine] = (time.monotonic(), rate)
+
+    return rate
+
+def estimate_eta(task: Task, engine: str) -> Optional[int]:
+    """
+    Seconds left for inferring pages of task, None when not inferring. Only
+    pipeline reports pages along the way, once per inference batch, vlm and
+    hybrid infer a document in one call and report nothing until it is done,
+    so no estimate is given for them. Batches are coarse, 384 pages with the
+    default MINERU_MIN_BATCH_INFERENCE_SIZE across all documents inferred
+    together, so most documents jump from no pages to all of them, the
+    estimate then counts down from the rate alone
+    """
+
+    if ParserEngines.PIPELINE != engine:
+        return None
+
+    if TaskResult.INFERRING != task.result or task.pages_total < 1:
+        return None
+
+    rate: Optional[float] = page_rate(engine)
+    if rate is None or task.updated_at is None:
+        return None
+
+    now: datetime = arrow.now(current_app.config.get('TIMEZONE')).datetime
+
+    # counted from the last progress, which is when inferring began at first
+    since: datetime = as_aware(task.updated_at, now.tzinfo) # type: ignore
+
+    left: float = max(0, task.pages_total - task.pages_done) / rate
+    passed: float = (now - since).total_seconds()
+
+    return max(0, round(left - passed))
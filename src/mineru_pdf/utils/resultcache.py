@@ -0,0 +1,213 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import IO, Dict, Iterable, Mapping, NamedTuple, Optional, Union
+
+from flask import current_app
+
+from .cachedir import CacheDir
+from .fileguard import calc_sha256sum
+
+logger = logging.getLogger(__name__)
+
+_cache = CacheDir('results')
+
+# options which affect the parsed artifacts, anything else (e.g. server_url)
+# is about where inference runs rather than what it produces
+KEYED_OPTIONS = (
+    'backend', 'parse_method', 'lang_list',
+    'formula_enabled', 'table_enabled', 'apply_scaled_output',
+)
+
+
+class PinnedResult(NamedTuple):
+    """Cached artifacts directory, kept from eviction until released"""
+
+    path: Path
+    pin: IO
+
+    def release(self) -> None:
+        fcntl.flock(self.pin, fcntl.LOCK_UN)
+        self.pin.close()
+
+
+def _is_enabled() -> bool:
+    return int(current_app.config.get('RESULT_CACHE_SIZE') or 0) > 0
+
+def _read_stats(cache_root: Path) -> Dict[str, int]:
+    try:
+        with cache_root.joinpath('stats.json').open('r') as f:
+            return { 'hits': 0, 'misses': 0, 'evictions': 0, **json.load(f) }
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return { 'hits': 0, 'misses': 0, 'evictions': 0 }
+
+def _count(cache_root: Path, counter: str, amount: int = 1) -> None:
+    stats = _read_stats(cache_root)
+    stats[counter] = stats.get(counter, 0) + amount
+    with cache_root.joinpath('stats.json').open('w') as f:
+        json.dump(stats, f)
+
+def _entry_size(entry: Path) -> int:
+    try:
+        with entry.joinpath('entry.json').open('r') as f:
+            return int(json.load(f).get('size', 0))
+    except (FileNotFoundError, json.decoder.JSONDecodeError, ValueError):
+        return sum(file.stat().st_size for file in entry.rglob('*') if file.is_file())
+
+def _pin(entry: Path, mode: int) -> Optional[IO]:
+    """Lock on the pin file of entry, readers share it, eviction takes it alone"""
+
+    f = entry.joinpath('.pin').open('a')
+    try:
+        fcntl.flock(f, mode)
+    except BlockingIOError:
+        f.close()
+        return None
+
+    return f
+
+def _remove_unpinned(entry: Path) -> bool:
+
+    # still being read by a response or restore, left to a later round
+    pin: Optional[IO] = _pin(entry, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    if pin is None:
+        return False
+
+    shutil.rmtree(entry, ignore_errors=True)
+    pin.close()
+
+    return True
+
+def result_key(input_file: Path, magic_kwargs: dict, checksum: Optional[str] = None) -> str:
+    """
+    Digest of the input bytes plus the options which shape the output,
+    checksum (sha256:...) of the input is reused when known already
+    """
+
+    options: dict = { k: magic_kwargs.get(k) for k in KEYED_OPTIONS }
+
+    hash_func = hashlib.new('sha256')
+    hash_func.update((
+        checksum.removeprefix('sha256:') if checksum else calc_sha256sum(input_file, prefix_algo=False)
+    ).encode())
+    hash_func.update(json.dumps(options, sort_keys=True, default=str).encode())
+
+    return hash_func.hexdigest()
+
+def lookup_result(key: str) -> Optional[PinnedResult]:
+    """
+    Returns the cached artifacts directory pinned against eviction, or None
+    when missing, the caller releases it once done reading
+    """
+
+    if not _is_enabled():
+        return None
+
+    with _cache.locked() as cache_root:
+        entry: Path = cache_root.joinpath(key)
+        if entry.is_dir():
+            # pinned under the cache lock, eviction can not slip in between
+            pin: IO = _pin(entry, fcntl.LOCK_SH) # type: ignore
+            # bump recency for LRU eviction
+            os.utime(entry)
+            _count(cache_root, 'hits')
+            logger.info(f'result cache hit {key}')
+            return PinnedResult(entry, pin)
+        _count(cache_root, 'misses')
+
+    logger.info(f'result cache miss {key}')
+
+    return None
+
+def restore_result(key: str, dest_dir: Path) -> Optional[Path]:
+    """Copy cached artifacts into dest_dir, returns None when missing"""
+
+    pinned: Optional[PinnedResult] = lookup_result(key)
+
+    if pinned is None:
+        return None
+
+    try:
+        shutil.copytree(
+            pinned.path, dest_dir, dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns('entry.json', '.pin')
+        )
+    finally:
+        pinned.release()
+
+    return dest_dir
+
+def store_result(
+    key: str, source: Union[Path, Mapping[str, bytes]], exclude: Iterable[str] = ()
+) -> Optional[Path]:
+    """
+    Save artifacts into cache, then evict over budget, source is either
+    a directory or relative paths mapped to contents of in-memory output
+    """
+
+    if not _is_enabled():
+        return None
+
+    entry: Path = _cache.root.joinpath(key)
+
+    if entry.exists():
+        return entry
+
+    def fill(staging: Path) -> None:
+        if isinstance(source, Mapping):
+            for name, data in source.items():
+                file: Path = staging.joinpath(name)
+                file.parent.mkdir(parents=True, exist_ok=True)
+                file.write_bytes(data)
+        else:
+            shutil.copytree(
+                source, staging, dirs_exist_ok=True,
+                ignore=shutil.ignore_patterns(*exclude)
+            )
+        size: int = sum(file.stat().st_size for file in staging.rglob('*') if file.is_file())
+        with staging.joinpath('entry.json').open('w') as f:
+            json.dump({ 'key': key, 'size': size }, f)
+
+    try:
+        _cache.store(key, fill)
+    except Exception as e:
+        logger.warning(f'result cache store failed for {key}: {e}')
+        return None
+
+    evict_results()
+
+    return entry
+
+def evict_results(budget: Optional[int] = None) -> int:
+    """Remove least recently used entries until under budget, pinned ones are skipped"""
+
+    if budget is None:
+        budget = int(current_app.config.get('RESULT_CACHE_SIZE') or 0)
+
+    evicted: int = _cache.evict(budget, _entry_size, remove=_remove_unpinned)
+
+    if evicted > 0:
+        with _cache.locked() as cache_root:
+            _count(cache_root, 'evictions', evicted)
+
+    return evicted
+
+def result_stats() -> Dict[str, int]:
+
+    with _cache.locked() as cache_root:
+        entries = _cache.entries()
+        return {
+            **_read_stats(cache_root),
+            'entries': len(entries),
+            'size': sum(_entry_size(entry) for entry in entries),
+            'budget': int(current_app.config.get('RESULT_CACHE_SIZE') or 0),
+        }
+
+def reset_stats() -> None:
+
+    with _cache.locked() as cache_root:
+        cache_root.joinpath('stats.json').unlink(missing_ok=True)
@@ -0,0 +1,103 @@
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+type Shard = Tuple[int, Path]
+
+# artifacts listing page items, which carry a page_idx to be shifted
+CONTENT_LISTS = (
+    'content_list.json', 'content_list.scaled.json',
+    'content_list_v2.json', 'content_list_v2.scaled.json',
+)
+MODEL_JSONS = ( 'model.json', 'model.scaled.json' )
+
+
+def page_ranges(pages: int, shard_pages: int) -> List[Tuple[int, int]]:
+    """Split pages into inclusive (start, end) ranges of shard_pages each"""
+
+    shard_pages = max(1, shard_pages)
+
+    return [
+        (start, min(start + shard_pages, pages) - 1)
+        for start in range(0, pages, shard_pages)
+    ]
+
+def _shift_page_idx(items: List[Any], offset: int) -> List[Any]:
+
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('page_idx'), int):
+            item['page_idx'] += offset
+        elif isinstance(item, list):
+            _shift_page_idx(item, offset)
+
+    return items
+
+def _shift_page_no(items: List[Any], offset: int) -> List[Any]:
+
+    # pipeline output is one dict per page, vlm output is one list per page
+    # which is positional and needs nothing but concatenation
+    for item in items:
+        if isinstance(item, dict) and 'page_info' in item:
+            item['page_info']['page_no'] += offset
+
+    return items
+
+def _load(file: Path) -> Any:
+    with file.open('r') as f:
+        return json.load(f)
+
+def _dump(file: Path, data: Any) -> None:
+    with file.open('w') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def merge_outputs(shards: List[Shard], output_dir: Path) -> Path:
+    """
+    Stitch per-range outputs back into one document under output_dir,
+    each shard is (first page index, shard output dir), page indices
+    in json artifacts are shifted by the first page index of the shard
+    """
+
+    shards = sorted(shards, key=lambda shard: shard[0])
+
+    # markdown
+    with output_dir.joinpath('content.md').open('w') as f:
+        for i, (_, shard_dir) in enumerate(shards):
+            if i > 0:
+                f.write('\n\n')
+            with shard_dir.joinpath('content.md').open('r') as g:
+                shutil.copyfileobj(g, f)
+
+    # middle
+    middle_json: dict = {}
+    for offset, shard_dir in shards:
+        part: dict = _load(shard_dir.joinpath('middle.json'))
+        pdf_info: list = _shift_page_idx(part.pop('pdf_info', []), offset)
+        if not middle_json:
+            middle_json = { **part, 'pdf_info': [] }
+        middle_json['pdf_info'].extend(pdf_info)
+    _dump(output_dir.joinpath('middle.json'), middle_json)
+
+    # content list and model, scaled copies included when exists
+    for name in CONTENT_LISTS + MODEL_JSONS:
+        if not shards[0][1].joinpath(name).exists():
+            continue
+        shift = _shift_page_no if name in MODEL_JSONS else _shift_page_idx
+        merged: list = []
+        for offset, shard_dir in shards:
+            merged.extend(shift(_load(shard_dir.joinpath(name)) or [], offset))
+        _dump(output_dir.joinpath(name), merged)
+
+    # images are named by content digest, so no collision across shards
+    image_dir: Path = output_dir.joinpath('images')
+    image_dir.mkdir(parents=True, exist_ok=True)
+    for _, shard_dir in shards:
+        for image in shard_dir.joinpath('images').glob('*'):
+            shutil.move(image, image_dir.joinpath(image.name))
+
+    logger.info(f'merged {len(shards)} shards into {output_dir}')
+
+    return output_dir
@@ -0,0 +1,195 @@
+import json
+import logging
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from .fileguard import iter_images, load_json_file, read_text_file
+
+type Artifact = Tuple[str, Path]
+type Member = Tuple[str, str, Path]
+
+CHUNK_SIZE = 65536
+
+MEMBER_MIMETYPES = {
+    '.md': 'text/markdown; charset=utf-8',
+    '.json': 'application/json',
+    '.jpg': 'image/jpeg',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class _Spool(object):
+    """Write only sink for archive writers, drained between chunks"""
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def _members(artifacts: List[Artifact]) -> Iterator[Member]:
+    """Expand artifacts to (field, arcname, path), images one by one"""
+
+    for field, path in artifacts:
+        if path.is_dir():
+            # in-memory paths do not order, their names do
+            for image in sorted(path.glob('*.jpg'), key=lambda image: image.name):
+                yield field, f'{path.name}/{image.name}', image
+        else:
+            yield field, path.name, path
+
+def _read_chunks(path: Path) -> Iterator[bytes]:
+    with path.open('rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+def json_chunks(heads: dict, artifacts: List[Artifact]) -> Iterator[bytes]:
+    """
+    Yield the plain json response with json artifacts spliced in as raw
+    bytes, they are valid json already so decoding and encoding is wasted
+    """
+
+    yield b'{'
+
+    for i, (field, value) in enumerate(heads.items()):
+        if i > 0:
+            yield b','
+        yield json.dumps(field).encode() + b':' + json.dumps(value).encode()
+
+    for i, (field, path) in enumerate(artifacts):
+
+        if i > 0 or heads:
+            yield b','
+
+        yield json.dumps(field).encode() + b':'
+
+        if path.is_dir():
+            yield json.dumps(dict(iter_images(path))).encode()
+            continue
+
+        if '.json' != path.suffix:
+            yield json.dumps(read_text_file(path), ensure_ascii=False).encode()
+            continue
+
+        # empty file loads as an empty object, same as load_json_file
+        empty: bool = True
+        for chunk in _read_chunks(path):
+            if empty and chunk.strip():
+                empty = False
+            yield chunk
+        if empty:
+            yield b'{}'
+
+    yield b'}'
+
+def ndjson_lines(heads: dict, artifacts: List[Artifact]) -> Iterator[str]:
+    """
+    Yield one json line per artifact and per image, each line is a partial
+    of the plain json response. Images come one per line as {images: {name:
+    data}}, so images objects are merged into one another, the rest of the
+    fields are merged as they are, which gives the plain json object back
+    """
+
+    if heads:
+        yield json.dumps(heads, ensure_ascii=False) + '\n'
+
+    for field, path in artifacts:
+
+        if path.is_dir():
+            for name, image in iter_images(path):
+                yield json.dumps({ field: { name: image } }) + '\n'
+            continue
+
+        if '.json' == path.suffix:
+            data = load_json_file(path)
+        else:
+            data = read_text_file(path)
+
+        yield json.dumps({ field: data }, ensure_ascii=False) + '\n'
+
+        # release before loading next one, keep peak memory at single artifact
+        del data
+
+def multipart_chunks(boundary: str, heads: dict, artifacts: List[Artifact]) -> Iterator[bytes]:
+    """Yield multipart/mixed body, one part per file with raw bytes"""
+
+    delimiter: bytes = f'--{boundary}\r\n'.encode()
+
+    for field, value in heads.items():
+        yield delimiter
+        yield (
+            f'Content-Type: application/json\r\n'
+            f'Content-Disposition: inline; name="{field}"\r\n\r\n'
+        ).encode()
+        yield json.dumps(value).encode() + b'\r\n'
+
+    for field, arcname, path in _members(artifacts):
+        yield delimiter
+        yield (
+            f'Content-Type: {MEMBER_MIMETYPES.get(path.suffix, "application/octet-stream")}\r\n'
+            f'Content-Disposition: attachment; name="{field}"; filename="{arcname}"\r\n'
+            f'Content-Length: {path.stat().st_size}\r\n\r\n'
+        ).encode()
+        yield from _read_chunks(path)
+        yield b'\r\n'
+
+    yield f'--{boundary}--\r\n'.encode()
+
+def zip_chunks(artifacts: List[Artifact]) -> Iterator[bytes]:
+    """
+    Yield zip archive written on the fly, images are stored as is since
+    jpeg is compressed already, texts are deflated
+    """
+
+    spool = _Spool()
+
+    # unseekable sink makes zipfile use data descriptors
+    with zipfile.ZipFile(spool, 'w') as archive: # type: ignore
+        for _, arcname, path in _members(artifacts):
+            # built by hand rather than from_file, members may live in memory
+            stat = path.stat()
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+            info.file_size = stat.st_size
+            info.external_attr = 0o644 << 16
+            if '.jpg' == path.suffix:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dest:
+                for chunk in _read_chunks(path):
+                    dest.write(chunk)
+                    yield spool.drain()
+            yield spool.drain()
+
+    yield spool.drain()
+
+def tar_chunks(artifacts: List[Artifact]) -> Iterator[bytes]:
+    """Yield uncompressed tar archive, headers built by hand for chunking"""
+
+    for _, arcname, path in _members(artifacts):
+        info = tarfile.TarInfo(arcname)
+        stat = path.stat()
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        yield from _read_chunks(path)
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder > 0:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # end of archive marker
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..models import Task
+
+logger = logging.getLogger(__name__)
+
+# seconds between comments keeping idle event streams open through proxies
+KEEPALIVE_INTERVAL = 15
+
+
+class _Hub(object):
+    """Fan out messages of a task to waiters of this process"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.waiters: Dict[str, Set[queue.Queue]] = {}
+
+    def subscribe(self, task_id: str) -> queue.Queue:
+        changes: queue.Queue = queue.Queue(maxsize=64)
+        with self.lock:
+            self.waiters.setdefault(task_id, set()).add(changes)
+        return changes
+
+    def unsubscribe(self, task_id: str, changes: queue.Queue) -> None:
+        with self.lock:
+            waiters = self.waiters.get(task_id, set())
+            waiters.discard(changes)
+            if not waiters:
+                self.waiters.pop(task_id, None)
+
+    def dispatch(self, task_id: str, message: dict) -> None:
+        with self.lock:
+            waiters = list(self.waiters.get(task_id, ()))
+        for changes in waiters:
+            try:
+                changes.put_nowait(message)
+            except queue.Full:
+                # a slow reader only needs to know something changed
+                pass
+
+class MemoryChannel(object):
+    """In-process channel, for a single process or tests"""
+
+    def __init__(self, hub: _Hub) -> None:
+        self.hub = hub
+
+    def publish_many(self, messages: List[dict]) -> None:
+        for message in messages:
+            self.hub.dispatch(message['task_id'], message)
+
+    def listen(self) -> None:
+        pass
+
+class RedisChannel(object):
+    """
+    Redis pub/sub channel, one pattern subscription per process feeds
+    every local waiter instead of a connection each
+    """
+
+    def __init__(self, hub: _Hub, url: str, prefix: str) -> None:
+        import redis
+        self.hub = hub
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.listener: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def publish_many(self, messages: List[dict]) -> None:
+        with self.client.pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.publish(f'{self.prefix}{message["task_id"]}', json.dumps(message))
+            pipe.execute()
+
+    def listen(self) -> None:
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self._run, name='task-events', daemon=True)
+                self.listener.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{self.prefix}*')
+                for message in pubsub.listen():
+                    channel: str = message['channel'].decode()
+                    self.hub.dispatch(channel.removeprefix(self.prefix), json.loads(message['data']))
+            except Exception as e:
+                logger.warning(f'task events listener stopped, reconnecting: {e}')
+                time.sleep(1)
+
+_hub = _Hub()
+_channel: Optional[object] = None
+_channel_pid: int = 0
+
+def task_channel():
+    """Channel of this process, created again after a fork"""
+
+    global _channel, _channel_pid
+
+    if _channel is None or _channel_pid != os.getpid():
+        url: str = current_app.config.get('TASK_EVENTS_URL') or 'memory://'
+        if url.startswith('memory://'):
+            _channel = MemoryChannel(_hub)
+        else:
+            _channel = RedisChannel(_hub, url, f'{current_app.config["APP_NAME"]}:task:')
+        _channel_pid = os.getpid()
+
+    return _channel
+
+_slots: Optional[threading.BoundedSemaphore] = None
+
+def _waiter_slots() -> threading.BoundedSemaphore:
+
+    global _slots
+
+    if _slots is None:
+        _slots = threading.BoundedSemaphore(max(1, int(current_app.config.get('TASK_EVENTS_MAX_WAITERS') or 1)))
+
+    return _slots
+
+@contextmanager
+def watch_task(task_id: str) -> Iterator[Optional[queue.Queue]]:
+    """
+    Queue receiving transitions of task while inside, None when this
+    process holds TASK_EVENTS_MAX_WAITERS waiters already, so waiting
+    clients never take every thread of a worker
+    """
+
+    slots = _waiter_slots()
+    if not slots.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        channel = task_channel()
+        channel.listen()
+        changes: queue.Queue = _hub.subscribe(task_id)
+        try:
+            yield changes
+        finally:
+            _hub.unsubscribe(task_id, changes)
+    finally:
+        slots.release()
+
+def _collect_transitions(session: Session, flush_context, instances) -> None:
+
+    changed: List[dict] = session.info.setdefault('task_transitions', [])
+
+    # created ones are left out, nobody can be waiting for them yet
+    for obj in session.dirty:
+        if not isinstance(obj, Task):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in ('status', 'result')):
+            changed.append({ 'task_id': obj.uuid, 'status': obj.status, 'result': obj.result })
+
+def _publish_transitions(session: Session) -> None:
+
+    transitions: List[dict] = session.info.pop('task_transitions', [])
+
+    if not transitions or not has_app_context():
+        return
+
+    try:
+        task_channel().publish_many(transitions)
+    except Exception as e:
+        # polling still works, waiters only fall back to their timeout
+        logger.warning(f'task events publish failed: {e}')
+
+def _drop_transitions(session: Session, previous_transaction) -> None:
+    session.info.pop('task_transitions', None)
+
+def publish_commits() -> None:
+    """Publish status and result changes of tasks once they are committed"""
+
+    if not event.contains(Session, 'before_flush', _collect_transitions):
+        event.listen(Session, 'before_flush', _collect_transitions)
+        event.listen(Session, 'after_commit', _publish_transitions)
+        event.listen(Session, 'after_soft_rollback', _drop_transitions)
@@ -0,0 +1,69 @@
+import logging
+import shutil
+import time
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import Optional
+
+from flask import current_app
+from pypdfium2 import PdfDocument
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_pdf(output_file: Path) -> Path:
+    """Write a blank single A4 page document"""
+
+    document: PdfDocument = PdfDocument.new()
+    try:
+        document.new_page(595, 842)
+        document.save(output_file)
+    finally:
+        document.close()
+
+    return output_file
+
+def warmup_models() -> Optional[float]:
+    """
+    Load models of WARMUP_ENGINE into this process, optionally run a
+    synthetic document through them, returns the elapsed seconds
+    """
+
+    engine: Optional[str] = current_app.config.get('WARMUP_ENGINE')
+
+    if engine is None:
+        logger.debug('WARMUP_ENGINE is empty, skipped')
+        return None
+
+    if 'magic_file' not in globals():
+        from .magicfile import magic_args, magic_file, preload_models
+
+    started: float = time.perf_counter()
+
+    try:
+        magic_kwargs = magic_args({
+            'parser_engine': engine,
+            'vllm_endpoint': current_app.config.get('VLLM_ENDPOINT'),
+        })
+
+        preload_models(**magic_kwargs) # type: ignore
+        loaded: float = time.perf_counter() - started
+        logger.info(f'warm-up loaded {engine} models in {loaded:.3f}s')
+
+        if current_app.config.get('WARMUP_SYNTHETIC'):
+            workdir: Path = Path(mkdtemp(prefix='warmup.', dir=str(
+                Path(current_app.instance_path).joinpath('cache').resolve()
+            )))
+            try:
+                magic_file(synthetic_pdf(workdir.joinpath('warmup.pdf')), workdir, **magic_kwargs) # type: ignore
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    except Exception as e:
+        # never block worker boot, first request will load lazily instead
+        logger.warning(f'warm-up {engine} failed: {e}', exc_info=True)
+        return None
+
+    elapsed: float = time.perf_counter() - started
+    logger.info(f'warm-up {engine} finished in {elapsed:.3f}s')
+
+    return elapsed
@@ -0,0 +1,118 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+from urllib.parse import urlsplit
+
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def make_app(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Flask]:
+    """Application on a fresh instance folder and sqlite database, env overrides the .env"""
+
+    def make(**env: str) -> Flask:
+
+        instance: Path = tmp_path.joinpath('instance')
+        for folder in ( 'archives', 'cache', 'logs', 'public' ):
+            instance.joinpath(folder).mkdir(parents=True, exist_ok=True)
+
+        pairs: dict = { 'CELERY_BROKER_URL': 'memory://', 'RESULT_CACHE_SIZE': '0', **env }
+        tmp_path.joinpath('.env').write_text(''.join(f'{k}={v}\n' for k, v in pairs.items()))
+
+        monkeypatch.setenv('FLASK_INSTANCE_DIR', str(instance))
+        monkeypatch.chdir(tmp_path)
+
+        from src.mineru_pdf import create_app
+        app: Flask = create_app()
+        app.extensions['celery'].conf.task_always_eager = True
+
+        with app.app_context():
+            from src.mineru_pdf.extensions import database
+            database.create_all()
+
+        return app
+
+    return make
+
+@pytest.fixture
+def app(make_app: Callable[..., Flask]) -> Flask:
+    return make_app()
+
+@pytest.fixture
+def session_app(
+    make_app: Callable[..., Flask], monkeypatch: pytest.MonkeyPatch, request: pytest.FixtureRequest
+) -> Callable[..., Flask]:
+    """
+    make_app for a module pooling http sessions, parametrised indirectly by
+    (module, default env), the pool is sized from config on first use so
+    it is dropped for each app
+    """
+
+    module, defaults = request.param
+
+    def make(**env: str) -> Flask:
+        monkeypatch.setattr(module, '_session', None)
+        return make_app(**{ **defaults, **env })
+
+    return make
+
+class StandIn(object):
+    """Local http server, routes map a path to handler(request) and record requests"""
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, Callable[[BaseHTTPRequestHandler], None]] = {}
+        self.requests: List[Tuple[str, str, Dict[str, str], bytes]] = []
+        self.lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def handle_any(self) -> None:
+                body: bytes = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path: str = urlsplit(self.path).path
+                with stand_in.lock:
+                    stand_in.requests.append((self.command, path, dict(self.headers), body))
+                route = stand_in.routes.get(path)
+                if route is None:
+                    self.send_error(404)
+                    return
+                route(self)
+
+            do_GET = do_POST = handle_any
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        class Server(ThreadingHTTPServer):
+
+            daemon_threads = True
+
+            def handle_error(self, request, client_address) -> None:
+                # clients aborting on purpose, e.g. over size or timed out
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    def requested(self, path: str) -> List[Tuple[str, str, Dict[str, str], bytes]]:
+        with self.lock:
+            return [ request for request in self.requests if request[1] == path ]
+
+@pytest.fixture
+def stand_in() -> Iterator[StandIn]:
+
+    server = StandIn()
+    server.thread.start()
+
+    yield server
+
+    server.server.shutdown()
+    server.server.server_close()
@@ -0,0 +1,135 @@
+import threading
+import time
+from typing import List
+
+import pytest
+from flask import Flask
+
+from src.mineru_pdf.exceptions import GPUAdmissionRejectedError
+from src.mineru_pdf.utils import admission
+from src.mineru_pdf.utils.admission import gpu_admission, inference_admission, inference_lock
+
+
+@pytest.fixture
+def host(make_app, monkeypatch: pytest.MonkeyPatch) -> Flask:
+    monkeypatch.setattr(admission, 'POLL_INTERVAL', 0.02)
+    # two slots, 100 pages each, two seconds a page
+    return make_app(GPU_ADMISSION_SLOTS='2', GPU_PAGES_PER_SLOT='100', GPU_SECONDS_PER_PAGE='2')
+
+def hold(app: Flask, entered: threading.Event, leave: threading.Event, pages: int, turn: bool = False):
+
+    def run():
+        with app.app_context():
+            if turn:
+                with inference_lock(pages):
+                    entered.set()
+                    leave.wait(5)
+            else:
+                with gpu_admission(pages, 'pipeline'):
+                    entered.set()
+                    leave.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert entered.wait(5)
+
+    return thread
+
+def test_one_deadline_for_turn_and_slots(host: Flask):
+
+    turn_held, turn_left = threading.Event(), threading.Event()
+    slots_held, slots_left = threading.Event(), threading.Event()
+
+    turn = hold(host, turn_held, turn_left, 1, turn=True)
+    slots = hold(host, slots_held, slots_left, 200)
+
+    # turn comes free halfway, slots never do
+    threading.Timer(0.3, turn_left.set).start()
+
+    with host.app_context():
+        started: float = time.monotonic()
+        with pytest.raises(GPUAdmissionRejectedError):
+            with inference_admission(1, 'pipeline', wait=0.6):
+                pass
+        elapsed: float = time.monotonic() - started
+
+    slots_left.set()
+    turn.join()
+    slots.join()
+
+    assert 0.55 < elapsed < 0.9
+
+def test_busy_turn_retry_after_follows_holder(host: Flask):
+
+    held, leave = threading.Event(), threading.Event()
+    holder = hold(host, held, leave, 10, turn=True)
+
+    with host.app_context():
+        with pytest.raises(GPUAdmissionRejectedError) as e:
+            with inference_lock(1, deadline=time.monotonic() + 0.05):
+                pass
+
+    leave.set()
+    holder.join()
+
+    # ten pages at two seconds each are left on the holder
+    assert 18 <= e.value.retry_after <= 20
+
+def test_slots_served_in_arrival_order(host: Flask):
+
+    held, leave = threading.Event(), threading.Event()
+    holder = hold(host, held, leave, 1)
+    admitted: List[str] = []
+
+    def wait_for(name: str, pages: int):
+        with host.app_context():
+            with gpu_admission(pages, 'pipeline', wait=5):
+                admitted.append(name)
+                time.sleep(0.1)
+
+    large = threading.Thread(target=wait_for, args=('large', 200))
+    large.start()
+    time.sleep(0.1)
+
+    # one slot is free, enough for small, but large came first
+    small = threading.Thread(target=wait_for, args=('small', 1))
+    small.start()
+    time.sleep(0.2)
+    assert [] == admitted
+
+    leave.set()
+    for thread in ( holder, large, small ):
+        thread.join()
+
+    assert [ 'large', 'small' ] == admitted
+
+def test_killed_waiter_is_passed_over(host: Flask):
+
+    with host.app_context():
+        tickets = admission._slots_dir().joinpath('tickets')
+        tickets.mkdir(parents=True, exist_ok=True)
+        # left behind unlocked, as by a killed process
+        stale = tickets.joinpath(f'{1:020d}.1.1')
+        stale.write_text('{"pages": 500}')
+
+        with gpu_admission(1, 'pipeline', wait=1) as needed:
+            assert 1 == needed
+
+        assert not stale.exists()
+
+def test_rejected_waiter_leaves_queue(host: Flask):
+
+    held, leave = threading.Event(), threading.Event()
+    holder = hold(host, held, leave, 200)
+
+    with host.app_context():
+        with pytest.raises(GPUAdmissionRejectedError):
+            with gpu_admission(1, 'pipeline', wait=0.1):
+                pass
+
+        leave.set()
+        holder.join()
+
+        with gpu_admission(1, 'pipeline', wait=0.5) as needed:
+            assert 1 == needed
+        assert [] == list(admission._slots_dir().joinpath('tickets').iterdir())
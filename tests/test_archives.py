@@ -0,0 +1,141 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import arrow
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from src.mineru_pdf.constants import TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer, Task
+from src.mineru_pdf.utils import archives
+from src.mineru_pdf.utils.archives import archive_url
+from src.mineru_pdf.utils.packing import pack_zipfile
+
+HEADERS = { 'Authorization': 'Bearer tasks' }
+MEMBERS: Dict[str, bytes] = {
+    'content.md': b'# doc\n' + b'lorem ipsum dolor sit amet\n' * 200,
+    'images/a.jpg': b'\xff\xd8' + bytes(range(256)) * 16,
+}
+
+
+@pytest.fixture
+def archived(make_app) -> Tuple[FlaskClient, bytes]:
+    """Completed task with a packed archive, and a client without credentials"""
+
+    app: Flask = make_app(APP_KEY='secret', ARCHIVE_URL_TTL='600')
+
+    with app.app_context():
+        instance = Path(app.instance_path)
+        result = instance.joinpath('result')
+        for name, data in MEMBERS.items():
+            result.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+            result.joinpath(name).write_bytes(data)
+        packed = pack_zipfile(instance.joinpath('archives', 'done.zip'), result)
+
+        now = arrow.now(app.config.get('TIMEZONE')).datetime
+        database.session.add(Bearer(owner='test', token='tasks', labels='tasks')) # type: ignore
+        database.session.add(Task(
+            uuid='done', file_id='done', file_url='', finetune_args='{}', priority='normal',
+            status=TaskStatus.COMPLETED, result=TaskResult.FINISHED, errors='',
+            tarball_location='archives/done.zip', tarball_checksum=packed.checksum,
+            created_at=now, updated_at=now, started_at=now, finished_at=now,
+        )) # type: ignore
+        database.session.commit()
+
+    return app.test_client(), packed.path.read_bytes()
+
+def signed(client: FlaskClient, path: str = '/archive') -> str:
+
+    with client.application.app_context():
+        url: str = archive_url('done')
+
+    return '/' + url.replace('/archive?', path + '?', 1)
+
+def test_archive_by_token_or_signed_url(archived):
+
+    client, data = archived
+
+    assert 401 == client.get('/api/v4/tasks/done/archive').status_code
+
+    r = client.get('/api/v4/tasks/done/archive', headers=HEADERS, buffered=True)
+    assert 200 == r.status_code
+    assert data == r.get_data()
+
+    r = client.get(signed(client), buffered=True)
+    assert 200 == r.status_code
+    assert data == r.get_data()
+
+def test_bad_or_expired_signature(archived):
+
+    client, _ = archived
+
+    url: str = signed(client)
+    assert 403 == client.get(url[:-4] + 'AAAA').status_code
+    assert 403 == client.get(url.replace('/tasks/done/', '/tasks/other/')).status_code
+
+    with client.application.app_context():
+        past: int = int(time.time()) - 1
+        expired: str = archives._signature(archives._signing_key(), 'done', past) # type: ignore
+
+    r = client.get(f'/api/v4/tasks/done/archive?expires={past}&signature={expired}')
+    assert 403 == r.status_code
+
+def test_archive_resumed_by_range(archived):
+
+    client, data = archived
+
+    r = client.get(signed(client), headers={ 'Range': 'bytes=4-99' }, buffered=True)
+
+    assert 206 == r.status_code
+    assert data[4:100] == r.get_data()
+    assert f'bytes 4-99/{len(data)}' == r.headers['Content-Range']
+
+def test_artifacts_listed(archived):
+
+    client, _ = archived
+
+    r = client.get(signed(client, '/artifacts'))
+
+    assert 200 == r.status_code
+    members = { member['name']: member for member in r.get_json()['data'] }
+    assert set(MEMBERS) == set(members)
+    assert len(MEMBERS['content.md']) == members['content.md']['size']
+    assert members['content.md']['checksum'].startswith('crc32:')
+
+@pytest.mark.parametrize('name', list(MEMBERS))
+def test_artifact_member(archived, name: str):
+
+    client, _ = archived
+    url: str = signed(client, f'/artifacts/{name}')
+
+    r = client.get(url, buffered=True)
+    assert 200 == r.status_code
+    assert MEMBERS[name] == r.get_data()
+
+    # deflated members are inflated up to the range, stored ones seek
+    r = client.get(url, headers={ 'Range': 'bytes=100-199' }, buffered=True)
+    assert 206 == r.status_code
+    assert MEMBERS[name][100:200] == r.get_data()
+    assert f'bytes 100-199/{len(MEMBERS[name])}' == r.headers['Content-Range']
+
+    assert 404 == client.get(signed(client, '/artifacts/missing.md')).status_code
+
+def test_artifact_not_modified(archived):
+
+    client, _ = archived
+    url: str = signed(client, '/artifacts/content.md')
+
+    etag: str = client.get(url, buffered=True).headers['ETag']
+    fds: int = len(os.listdir('/proc/self/fd'))
+
+    for _ in range(5):
+        r = client.get(url, headers={ 'If-None-Match': etag }, buffered=True)
+        assert 304 == r.status_code
+        assert b'' == r.get_data()
+
+    # the archive opened for the member is closed with the response
+    assert fds == len(os.listdir('/proc/self/fd'))
@@ -0,0 +1,142 @@
+import json
+import time
+from pathlib import Path
+from typing import List
+
+import arrow
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from src.mineru_pdf.constants import ParserEngines, TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Task, TaskEvent
+from src.mineru_pdf import tasks as mining
+from src.mineru_pdf.tasks import infer_batch, restage
+from src.mineru_pdf.utils import magicfile, progress
+from src.mineru_pdf.utils.fileguard import as_semantic, create_workdir
+
+
+def staged_task(uuid: str, pages: int = 2) -> Task:
+
+    moment = arrow.now().datetime
+    task = Task(
+        uuid=uuid, file_id=uuid, file_url=f'http://localhost/{uuid}.pdf', callback_url='',
+        finetune_args=json.dumps({ 'parser_engine': 'pipeline' }),
+        status=TaskStatus.RUNNING, result=TaskResult.STAGED, pages_total=pages,
+        started_at=moment, created_at=moment, updated_at=moment,
+    )
+    database.session.add(task)
+    database.session.commit()
+    create_workdir(as_semantic(task)).joinpath(f'{uuid}.pdf').write_bytes(b'%PDF-1.7')
+
+    return task
+
+@pytest.fixture
+def calls(monkeypatch: pytest.MonkeyPatch) -> List[List[str]]:
+    """Inference calls made, each with the names of its documents, 'bad' ones raise"""
+
+    made: List[List[str]] = []
+
+    def fake_magic_files(files, on_progress=None, **kwargs):
+        made.append([ input_file.stem for input_file, _ in files ])
+        for idx, (input_file, output_dir) in enumerate(files):
+            if input_file.stem.startswith('bad'):
+                raise RuntimeError(f'malformed {input_file.name}')
+            output_dir.joinpath('content.md').write_text(f'# {input_file.stem}\n')
+            if on_progress is not None:
+                on_progress(idx, 2)
+
+    monkeypatch.setattr(magicfile, 'magic_files', fake_magic_files)
+
+    return made
+
+def test_bad_document_fails_alone(app: Flask, calls: List[List[str]]):
+
+    with app.app_context():
+        tasks: List[Task] = [ staged_task(uuid) for uuid in ( 'ok1', 'bad', 'ok2' ) ]
+
+        assert 255 == infer_batch([ restage(task, TaskResult.STAGED) for task in tasks ])
+
+        for task in tasks:
+            database.session.refresh(task)
+
+        assert [ TaskStatus.COMPLETED, TaskStatus.TERMINATED, TaskStatus.COMPLETED ] == [ task.status for task in tasks ]
+
+    assert [ [ 'ok1', 'bad', 'ok2' ], [ 'ok1' ], [ 'bad' ], [ 'ok2' ] ] == calls
+
+def test_healthy_batch_infers_once(app: Flask, calls: List[List[str]]):
+
+    with app.app_context():
+        tasks: List[Task] = [ staged_task(uuid) for uuid in ( 'ok1', 'ok2' ) ]
+
+        assert 0 == infer_batch([ restage(task, TaskResult.STAGED) for task in tasks ])
+
+        for task in tasks:
+            database.session.refresh(task)
+            assert TaskStatus.COMPLETED == task.status
+
+    assert [ [ 'ok1', 'ok2' ] ] == calls
+
+def test_single_failure_terminates(app: Flask, calls: List[List[str]]):
+
+    with app.app_context():
+        task: Task = staged_task('bad')
+
+        assert 255 == infer_batch([ restage(task, TaskResult.STAGED) ])
+
+        database.session.refresh(task)
+        assert TaskStatus.TERMINATED == task.status
+
+    assert [ [ 'bad' ] ] == calls
+
+def test_packing_reuses_staged_key(app: Flask, calls: List[List[str]], monkeypatch: pytest.MonkeyPatch):
+
+    monkeypatch.setattr(mining, 'result_key', lambda *args, **kwargs: pytest.fail('hashed again'))
+
+    with app.app_context():
+        tasks: List[Task] = [ staged_task(uuid) for uuid in ( 'ok1', 'ok2' ) ]
+        for task in tasks:
+            task.result_key = f'{task.uuid}-key'
+        database.session.commit()
+
+        staged = [ restage(task, TaskResult.STAGED) for task in tasks ]
+        assert [ 'ok1-key', 'ok2-key' ] == [ member.cache_key for member in staged ]
+
+        # packing runs eagerly on its own restaged task
+        assert 0 == infer_batch(staged)
+
+        for task in tasks:
+            database.session.refresh(task)
+            assert TaskStatus.COMPLETED == task.status
+
+def test_batch_time_shared_by_pages(app: Flask, monkeypatch: pytest.MonkeyPatch):
+
+    def slow_magic_files(files, on_progress=None, **kwargs):
+        time.sleep(0.3)
+        for input_file, output_dir in files:
+            output_dir.joinpath('content.md').write_text(f'# {input_file.stem}\n')
+
+    monkeypatch.setattr(magicfile, 'magic_files', slow_magic_files)
+
+    with app.app_context():
+        tasks: List[Task] = [ staged_task('small', pages=2), staged_task('large', pages=6) ]
+
+        started: float = time.monotonic()
+        assert 0 == infer_batch([ restage(task, TaskResult.STAGED) for task in tasks ])
+        passed: float = time.monotonic() - started
+
+        events = database.session.execute(
+            select(TaskEvent.task_id, TaskEvent.pages, TaskEvent.elapsed_ms).
+            where(TaskEvent.stage == TaskResult.INFERRING).
+            order_by(TaskEvent.task_id)
+        ).all()
+        assert [ 2, 6 ] == [ event.pages for event in events ]
+
+        # one wall time for the whole batch, not one per task
+        elapsed: int = sum(event.elapsed_ms for event in events)
+        assert 300 <= elapsed <= passed * 1000
+        assert events[1].elapsed_ms == pytest.approx(events[0].elapsed_ms * 3, rel=0.1)
+
+        progress._rates.clear()
+        assert progress.page_rate(ParserEngines.PIPELINE) == pytest.approx(8 * 1000 / elapsed)
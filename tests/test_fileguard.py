@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from benchmarks.fileguard import legacy_fix_content_list, legacy_fix_model_json, synthetic
+from src.mineru_pdf.utils.fileguard import fix_content_list, fix_model_json
+
+# decimal ties at the 5th place, most of them are off by one ulp in binary
+TIES = [ 0.000005, 0.0000150, 0.000025, 1.234565, 2.675, 0.5, 0.125, 1e-06, 0.999995, 12.3456750 ]
+
+
+def same(a, b) -> bool:
+    return json.dumps(a) == json.dumps(b)
+
+def test_synthetic_document():
+
+    page_sizes, content_list, pipeline, vlm = synthetic(50, seed=7)
+
+    assert same(legacy_fix_content_list(content_list, page_sizes), fix_content_list(content_list, page_sizes))
+    assert same(legacy_fix_model_json(pipeline, page_sizes), fix_model_json(pipeline, page_sizes))
+    assert same(legacy_fix_model_json(vlm, page_sizes), fix_model_json(vlm, page_sizes))
+
+def test_half_way_rounding():
+
+    page_sizes = { 0: (1, 1), 1: (595, 842), 2: (1000, 1000) }
+
+    vlm = [
+        [ { 'bbox': TIES[i:i + 4] } for i in range(0, len(TIES) - 3) ],
+        [ { 'bbox': [ 0.0000005, 0.0000105, 0.5, 0.25 ] } ],
+        [ { 'bbox': [ 0.0012345, 0.0026750, 0.0000015, 0.0098765 ] } ],
+    ]
+    pipeline = [
+        {
+            'page_info': { 'page_no': 1, 'width': 1190, 'height': 1684 },
+            'layout_dets': [ { 'poly': TIES[:8] }, { 'poly': [ v * 2 for v in TIES[2:10] ] } ],
+        },
+        {
+            'page_info': { 'page_no': 2, 'width': 3000, 'height': 7000 },
+            'layout_dets': [ { 'poly': [ 0.00003, 0.000035, 0.000105, 0.00021, 1.5, 2.5, 3.5, 4.5 ] } ],
+        },
+    ]
+    content_list = [
+        { 'type': 'text', 'page_idx': 2, 'bbox': [ 1, 999, 500, 1000 ] },
+        { 'type': 'text', 'page_idx': 1, 'bbox': [ 840, 500, 1000, 250 ] },
+        { 'type': 'text', 'page_idx': 0, 'bbox': [ 500, 500, 0, 0 ] },
+    ]
+
+    assert same(legacy_fix_model_json(vlm, page_sizes), fix_model_json(vlm, page_sizes))
+    assert same(legacy_fix_model_json(pipeline, page_sizes), fix_model_json(pipeline, page_sizes))
+    assert same(legacy_fix_content_list(content_list, page_sizes), fix_content_list(content_list, page_sizes))
+
+def test_empty_bboxes():
+
+    page_sizes = { 0: (595, 842), 1: (612, 792) }
+
+    vlm = [ [], [ { 'type': 'text', 'bbox': [ 0.1, 0.2, 0.3, 0.4 ] } ] ]
+    pipeline = [ { 'page_info': { 'page_no': 0, 'width': 1190, 'height': 1684 }, 'layout_dets': [] } ]
+    content_list = [ { 'type': 'discarded', 'page_idx': 0 }, { 'type': 'text', 'page_idx': 1, 'bbox': [ 0, 0, 0, 0 ] } ]
+
+    assert same(legacy_fix_model_json(vlm, page_sizes), fix_model_json(vlm, page_sizes))
+    assert same(legacy_fix_model_json(pipeline, page_sizes), fix_model_json(pipeline, page_sizes))
+    assert same(legacy_fix_content_list(content_list, page_sizes), fix_content_list(content_list, page_sizes))
+    assert same([], fix_content_list([], page_sizes))
+    assert fix_model_json(None, page_sizes) is None
+
+    with pytest.raises(ValueError):
+        fix_content_list([ { 'type': 'text', 'page_idx': 0, 'bbox': [] } ], page_sizes)
+
+def test_input_untouched():
+
+    page_sizes, content_list, pipeline, vlm = synthetic(3)
+    before = json.dumps([ content_list, pipeline, vlm ])
+
+    fix_content_list(content_list, page_sizes)
+    fix_model_json(pipeline, page_sizes)
+    fix_model_json(vlm, page_sizes)
+
+    assert before == json.dumps([ content_list, pipeline, vlm ])
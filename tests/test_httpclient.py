@@ -0,0 +1,166 @@
+import hashlib
+import re
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from src.mineru_pdf.exceptions import FileDownloadFailureError, FileMIMEUnsupportedError, FileSizeTooLargeError
+from src.mineru_pdf.utils import httpclient
+from src.mineru_pdf.utils.httpclient import download_file
+
+PDF = b'%PDF-1.7\n' + bytes(range(256)) * 400 + b'\n%%EOF\n'
+
+
+def serve(body: bytes, ranges: bool = False, length: bool = True, etag: str = '') -> Callable[[BaseHTTPRequestHandler], None]:
+
+    def route(handler: BaseHTTPRequestHandler) -> None:
+
+        if etag and etag == handler.headers.get('If-None-Match'):
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        matched = re.fullmatch(r'bytes=(\d+)-(\d+)', handler.headers.get('Range') or '')
+        if ranges and matched:
+            start, end = int(matched[1]), int(matched[2])
+            handler.send_response(206)
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+            handler.send_header('Content-Length', str(end - start + 1))
+            handler.end_headers()
+            handler.wfile.write(body[start:end + 1])
+            return
+
+        handler.send_response(200)
+        if ranges:
+            handler.send_header('Accept-Ranges', 'bytes')
+        if etag:
+            handler.send_header('ETag', etag)
+        if length:
+            handler.send_header('Content-Length', str(len(body)))
+        else:
+            handler.send_header('Connection', 'close')
+            handler.close_connection = True
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    return route
+
+pytestmark = pytest.mark.parametrize('session_app', [
+    (httpclient, { 'DOWNLOAD_CACHE_SIZE': '0' }),
+], indirect=True, ids=[ 'httpclient' ])
+
+def test_stream_hashed_on_the_fly(session_app, stand_in, tmp_path: Path):
+
+    stand_in.routes['/doc.pdf'] = serve(PDF)
+
+    with session_app().app_context():
+        downloaded = download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('doc.pdf'))
+
+    assert PDF == tmp_path.joinpath('doc.pdf').read_bytes()
+    assert 'sha256:' + hashlib.sha256(PDF).hexdigest() == downloaded.checksum
+    assert len(PDF) == downloaded.size
+
+@pytest.mark.parametrize('length', [ True, False ])
+def test_size_cap_aborts(session_app, stand_in, tmp_path: Path, length: bool):
+
+    stand_in.routes['/big.pdf'] = serve(PDF, length=length)
+
+    with session_app(PDF_MAX_SIZE='64KiB').app_context():
+        with pytest.raises(FileSizeTooLargeError):
+            download_file(stand_in.url('/big.pdf'), tmp_path.joinpath('big.pdf'))
+
+    assert not tmp_path.joinpath('big.pdf').exists()
+
+def test_magic_bytes_sniffed(session_app, stand_in, tmp_path: Path):
+
+    stand_in.routes['/doc.pdf'] = serve(b'PK\x03\x04' + PDF)
+
+    with session_app().app_context():
+        with pytest.raises(FileMIMEUnsupportedError):
+            download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('doc.pdf'))
+
+    assert not tmp_path.joinpath('doc.pdf').exists()
+
+def test_parallel_ranges(session_app, stand_in, tmp_path: Path):
+
+    stand_in.routes['/doc.pdf'] = serve(PDF, ranges=True)
+
+    with session_app(DOWNLOAD_RANGE_SIZE='16KiB', DOWNLOAD_RANGE_PARTS='3').app_context():
+        downloaded = download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('doc.pdf'))
+
+    assert PDF == tmp_path.joinpath('doc.pdf').read_bytes()
+    assert 'sha256:' + hashlib.sha256(PDF).hexdigest() == downloaded.checksum
+
+    parts = [ headers['Range'] for _, _, headers, _ in stand_in.requested('/doc.pdf') if 'Range' in headers ]
+    assert len(parts) == -(-len(PDF) // 16384)
+
+def test_ranges_refused_fall_back_to_stream(session_app, stand_in, tmp_path: Path):
+
+    plain = serve(PDF)
+
+    def route(handler: BaseHTTPRequestHandler) -> None:
+        # advertises ranges, answers them with the whole body
+        if 'Range' not in handler.headers:
+            return serve(PDF, ranges=True)(handler)
+        plain(handler)
+
+    stand_in.routes['/doc.pdf'] = route
+
+    with session_app(DOWNLOAD_RANGE_SIZE='16KiB').app_context():
+        downloaded = download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('doc.pdf'))
+
+    assert PDF == tmp_path.joinpath('doc.pdf').read_bytes()
+    assert len(PDF) == downloaded.size
+
+def test_read_timeout(session_app, stand_in, tmp_path: Path):
+
+    def slow(handler: BaseHTTPRequestHandler) -> None:
+        time.sleep(1.5)
+        serve(PDF)(handler)
+
+    stand_in.routes['/slow.pdf'] = slow
+
+    with session_app(DOWNLOAD_READ_TIMEOUT='0.3').app_context():
+        began = time.monotonic()
+        with pytest.raises(FileDownloadFailureError):
+            download_file(stand_in.url('/slow.pdf'), tmp_path.joinpath('slow.pdf'))
+
+    # read errors are not retried, a stalled source fails fast
+    assert time.monotonic() - began < 1.2
+    assert 1 == len(stand_in.requested('/slow.pdf'))
+
+def test_server_error(session_app, stand_in, tmp_path: Path):
+
+    stand_in.routes['/gone.pdf'] = lambda handler: handler.send_error(500)
+
+    with session_app().app_context():
+        with pytest.raises(FileDownloadFailureError):
+            download_file(stand_in.url('/gone.pdf'), tmp_path.joinpath('gone.pdf'))
+
+def test_connect_retries(session_app, tmp_path: Path):
+
+    with session_app(DOWNLOAD_CONNECT_TIMEOUT='0.5').app_context():
+        began = time.monotonic()
+        # nothing listens on the discard port
+        with pytest.raises(FileDownloadFailureError, match='Max retries'):
+            download_file('http://127.0.0.1:9/doc.pdf', tmp_path.joinpath('doc.pdf'))
+
+    # refused connections are retried twice with backoff in between
+    assert time.monotonic() - began >= 0.5
+
+def test_revalidated_copy_reused(session_app, stand_in, tmp_path: Path):
+
+    stand_in.routes['/doc.pdf'] = serve(PDF, etag='"v1"')
+
+    with session_app(DOWNLOAD_CACHE_SIZE='1MiB').app_context():
+        first = download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('first.pdf'))
+        second = download_file(stand_in.url('/doc.pdf'), tmp_path.joinpath('second.pdf'))
+
+    assert first.checksum == second.checksum
+    assert PDF == tmp_path.joinpath('second.pdf').read_bytes()
+    assert '"v1"' == stand_in.requested('/doc.pdf')[1][2].get('If-None-Match')
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from src.mineru_pdf.utils.magicfile import magic_args
+
+
+def test_options_leave_env_alone(monkeypatch: pytest.MonkeyPatch):
+
+    monkeypatch.setenv('MINERU_VLM_FORMULA_ENABLE', 'sentinel')
+    monkeypatch.setenv('MINERU_VLM_TABLE_ENABLE', 'sentinel')
+
+    kwargs = magic_args({
+        'parser_engine': 'vlm-auto-engine', 'enable_formula': True, 'enable_table': False,
+    })
+
+    # applied by do_parse while holding the inference lock instead
+    assert True is kwargs['formula_enabled'] and False is kwargs['table_enabled']
+    assert 'sentinel' == os.environ['MINERU_VLM_FORMULA_ENABLE']
+    assert 'sentinel' == os.environ['MINERU_VLM_TABLE_ENABLE']
@@ -0,0 +1,257 @@
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, List
+from urllib.parse import parse_qs, urlsplit
+
+import arrow
+import pytest
+from flask import Flask, current_app
+from sqlalchemy import select, update
+
+from src.mineru_pdf.constants import CallbackStatus, TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Callback, Task
+from src.mineru_pdf.tasks import deliver_callbacks
+from src.mineru_pdf.utils import archives, outbox
+from src.mineru_pdf.utils.archives import verify_archive_url
+from src.mineru_pdf.utils.clock import as_aware
+from src.mineru_pdf.utils.outbox import _claim_due, backoff, deliver_due, due_hosts, enqueue_callback, host_slot
+
+
+def answer(code: int, **headers: str) -> Callable[[BaseHTTPRequestHandler], None]:
+
+    def route(handler: BaseHTTPRequestHandler) -> None:
+        handler.send_response(code)
+        for name, value in headers.items():
+            handler.send_header(name.replace('_', '-'), value)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    return route
+
+pytestmark = pytest.mark.parametrize('session_app', [
+    (outbox, { 'CALLBACK_BACKOFF': '10', 'CALLBACK_TIMEOUT': '2' }),
+], indirect=True, ids=[ 'outbox' ])
+
+def now() -> arrow.Arrow:
+    return arrow.now(current_app.config.get('TIMEZONE'))
+
+def enqueue(callback_url: str, count: int = 1) -> List[int]:
+
+    moment = now().datetime
+    ids: List[int] = []
+
+    for i in range(count):
+        uuid = f'task-{moment.timestamp()}-{i}'
+        task = Task(
+            uuid=uuid, file_id=uuid, file_url='', finetune_args='{}', priority='normal',
+            callback_url=callback_url, status=TaskStatus.COMPLETED, result=TaskResult.FINISHED,
+            errors='', created_at=moment, updated_at=moment, started_at=moment, finished_at=moment,
+        ) # type: ignore
+        database.session.add(task)
+        database.session.flush()
+        callback = enqueue_callback(task)
+        database.session.commit()
+        ids.append(callback.id) # type: ignore
+
+    return ids
+
+def fetch(callback_id: int) -> Callback:
+    database.session.expire_all()
+    return database.session.scalars(select(Callback).where(Callback.id == callback_id)).one()
+
+def make_due(callback_id: int) -> None:
+    database.session.execute(
+        update(Callback).where(Callback.id == callback_id).values(next_attempt_at=now().shift(seconds=-1).datetime)
+    )
+    database.session.commit()
+
+def aware(moment: datetime) -> datetime:
+    return as_aware(moment, now().tzinfo) # type: ignore
+
+def host_of(stand_in) -> str:
+    return stand_in.url('').split('://', 1)[1]
+
+def test_delivered(session_app, stand_in):
+
+    stand_in.routes['/hook'] = answer(204)
+
+    with session_app(APP_URL='https://mineru.example').app_context():
+        [ callback_id ] = enqueue(stand_in.url('/hook'))
+
+        assert 1 == deliver_due(host_of(stand_in))
+
+        callback = fetch(callback_id)
+        assert CallbackStatus.DELIVERED == callback.status
+        assert 1 == callback.attempts and 204 == callback.last_code
+
+    [ (_, _, _, body) ] = stand_in.requested('/hook')
+    data = json.loads(body)['data']
+    assert TaskStatus.COMPLETED == data['status']
+    assert data['tarball']['location'].startswith('https://mineru.example/api/v4/tasks/')
+
+def test_backoff_respects_retry_after(session_app, stand_in):
+
+    stand_in.routes['/busy'] = answer(503, Retry_After='120')
+    stand_in.routes['/broken'] = answer(500)
+
+    with session_app().app_context():
+        [ busy ] = enqueue(stand_in.url('/busy'))
+        [ broken ] = enqueue(stand_in.url('/broken'))
+
+        began = now().datetime
+        deliver_due(host_of(stand_in))
+
+        # receiver asked for longer than the backoff
+        callback = fetch(busy)
+        assert CallbackStatus.PENDING == callback.status and 503 == callback.last_code
+        assert 119 <= (aware(callback.next_attempt_at) - began).total_seconds() <= 122 # type: ignore
+
+        # first backoff is CALLBACK_BACKOFF, half of it jittered
+        callback = fetch(broken)
+        assert CallbackStatus.PENDING == callback.status and 500 == callback.last_code
+        assert 4.9 <= (aware(callback.next_attempt_at) - began).total_seconds() <= 11 # type: ignore
+
+def test_backoff_grows_with_jitter(session_app):
+
+    with session_app(CALLBACK_BACKOFF_MAX='60').app_context():
+        for attempts, delay in [ (1, 10), (2, 20), (3, 40), (4, 60), (9, 60) ]:
+            delays = [ backoff(attempts) for _ in range(200) ]
+            assert delay / 2 <= min(delays) and max(delays) <= delay
+            assert len(set(delays)) > 1
+
+def test_unreachable_retried_then_failed(session_app):
+
+    with session_app(CALLBACK_MAX_ATTEMPTS='2', CALLBACK_TIMEOUT='0.5').app_context():
+        # nothing listens on the discard port
+        [ callback_id ] = enqueue('http://127.0.0.1:9/hook')
+
+        deliver_due('127.0.0.1:9')
+        callback = fetch(callback_id)
+        assert CallbackStatus.PENDING == callback.status
+        assert 0 == callback.last_code and 'ConnectionError' in callback.last_error
+
+        # not due yet, nothing is tried
+        assert 0 == deliver_due('127.0.0.1:9')
+        assert 1 == fetch(callback_id).attempts
+
+        make_due(callback_id)
+        deliver_due('127.0.0.1:9')
+        callback = fetch(callback_id)
+        assert CallbackStatus.FAILED == callback.status and 2 == callback.attempts
+        assert callback.next_attempt_at is None
+
+def test_redelivered_after_crash(session_app, stand_in):
+
+    stand_in.routes['/hook'] = answer(200)
+    host: str = host_of(stand_in)
+
+    with session_app().app_context():
+        [ callback_id ] = enqueue(stand_in.url('/hook'))
+
+        # a deliverer claims the callback, then dies before posting
+        assert [ callback_id ] == [ c.id for c in _claim_due(host, 1) ]
+        assert CallbackStatus.DELIVERING == fetch(callback_id).status
+
+        # leased, neither swept nor claimed again meanwhile
+        assert host not in due_hosts()
+        assert 0 == deliver_due(host)
+        assert [] == stand_in.requested('/hook')
+
+        # lease runs out, the sweep finds it and another deliverer sends it
+        make_due(callback_id)
+        assert [ host ] == due_hosts()
+        assert 1 == deliver_due(host)
+
+        callback = fetch(callback_id)
+        assert CallbackStatus.DELIVERED == callback.status and 2 == callback.attempts
+
+    assert 1 == len(stand_in.requested('/hook'))
+
+def test_batched_host(session_app, stand_in):
+
+    stand_in.routes['/bulk'] = answer(200)
+    host: str = host_of(stand_in)
+
+    with session_app(CALLBACK_BATCH_HOSTS=host, CALLBACK_BATCH_SIZE='2').app_context():
+        ids = enqueue(stand_in.url('/bulk'), 3)
+
+        assert 3 == deliver_due(host)
+        assert all(CallbackStatus.DELIVERED == fetch(i).status for i in ids)
+
+    sizes = [ len(json.loads(body)['data']) for _, _, _, body in stand_in.requested('/bulk') ]
+    assert [ 2, 1 ] == sizes
+
+def test_host_concurrency(session_app, stand_in, monkeypatch: pytest.MonkeyPatch):
+
+    host: str = host_of(stand_in)
+    release = threading.Event()
+    inflight: List[int] = []
+    peak: List[int] = [ 0 ]
+    lock = threading.Lock()
+
+    def slow(handler: BaseHTTPRequestHandler) -> None:
+        with lock:
+            inflight.append(1)
+            peak[0] = max(peak[0], len(inflight))
+        release.wait(5)
+        with lock:
+            inflight.pop()
+        answer(200)(handler)
+
+    stand_in.routes['/slow'] = slow
+
+    app: Flask = session_app(CALLBACK_HOST_CONCURRENCY='2')
+
+    # eager kicks would run at once, recorded instead
+    kicks: List[float] = []
+    monkeypatch.setattr(deliver_callbacks, 'apply_async', lambda args, countdown=0: kicks.append(countdown))
+
+    with app.app_context():
+        ids = enqueue(stand_in.url('/slow'), 4)
+
+        # both slots taken by other deliverers, this one steps back and
+        # looks again shortly instead of waiting for the sweep
+        with host_slot(host) as first, host_slot(host) as second, host_slot(host) as third:
+            assert first and second and not third
+            assert 0 == deliver_callbacks.run(host)
+        assert [] == stand_in.requested('/slow')
+        assert [ outbox.SLOT_RETRY ] == kicks
+
+    def deliverer() -> None:
+        with app.app_context():
+            deliver_callbacks.run(host)
+
+    threads = [ threading.Thread(target=deliverer) for _ in range(4) ]
+    for thread in threads:
+        thread.start()
+    threading.Timer(0.5, release.set).start()
+    for thread in threads:
+        thread.join(10)
+
+    # two deliverers at most posted to the host at once, all got through
+    assert 2 == peak[0]
+    with app.app_context():
+        assert all(CallbackStatus.DELIVERED == fetch(i).status for i in ids)
+
+def test_archive_url_signed_per_attempt(session_app, stand_in, monkeypatch: pytest.MonkeyPatch):
+
+    stand_in.routes['/hook'] = answer(204)
+
+    with session_app(APP_KEY='secret', ARCHIVE_URL_TTL='600').app_context():
+        [ callback_id ] = enqueue(stand_in.url('/hook'))
+        task_id: str = database.session.scalar(
+            select(Task.uuid).join(Callback, Callback.task_id == Task.id).where(Callback.id == callback_id)
+        ) # type: ignore
+
+        # delivered long after the url signed at enqueue expired
+        later: float = time.time() + 3600
+        monkeypatch.setattr(archives.time, 'time', lambda: later)
+        assert 1 == deliver_due(host_of(stand_in))
+
+        [ (_, _, _, body) ] = stand_in.requested('/hook')
+        query = parse_qs(urlsplit(json.loads(body)['data']['tarball']['location']).query)
+        assert verify_archive_url(task_id, int(query['expires'][0]), query['signature'][0])
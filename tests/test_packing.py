@@ -0,0 +1,95 @@
+import struct
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from src.mineru_pdf.utils import packing
+from src.mineru_pdf.utils.fileguard import calc_sha256sum
+from src.mineru_pdf.utils.packing import pack_zipfile
+
+
+def _target(tmp_path: Path) -> Path:
+
+    target = tmp_path.joinpath('result')
+    target.joinpath('images').mkdir(parents=True)
+    target.joinpath('empty').mkdir()
+    target.joinpath('content.md').write_bytes(b'# doc\n' * 4096)
+    target.joinpath('content_list.json').write_text('[]')
+    target.joinpath('images', 'a.jpg').write_bytes(bytes(range(256)) * 64)
+    target.joinpath('origin.pdf').write_bytes(b'%PDF-1.7\n' + b'\x00' * 1000)
+
+    return target
+
+def _local_header(path: Path, info: zipfile.ZipInfo) -> tuple:
+
+    with path.open('rb') as f:
+        f.seek(info.header_offset)
+        return struct.unpack('<IHHHHHIIIHH', f.read(30))
+
+def test_round_trip(tmp_path: Path):
+
+    target = _target(tmp_path)
+    packed = pack_zipfile(tmp_path.joinpath('result.zip'), target)
+
+    assert packed.checksum == calc_sha256sum(packed.path)
+    assert packed.bytes_out == packed.path.stat().st_size
+
+    with zipfile.ZipFile(packed.path) as zf:
+        assert zf.testzip() is None
+        for name in ( 'content.md', 'content_list.json', 'images/a.jpg', 'origin.pdf' ):
+            assert zf.read(name) == target.joinpath(name).read_bytes()
+
+def test_methods_and_directories(tmp_path: Path):
+
+    packed = pack_zipfile(tmp_path.joinpath('result.zip'), _target(tmp_path))
+
+    with zipfile.ZipFile(packed.path) as zf:
+        infos = { info.filename: info for info in zf.infolist() }
+
+        assert infos['content.md'].compress_type == zipfile.ZIP_DEFLATED
+        assert infos['content.md'].compress_size < infos['content.md'].file_size
+        assert infos['images/a.jpg'].compress_type == zipfile.ZIP_STORED
+        assert infos['origin.pdf'].compress_type == zipfile.ZIP_STORED
+
+        for name in ( 'images/', 'empty/' ):
+            assert infos[name].is_dir()
+            assert infos[name].file_size == 0
+
+def test_local_headers_carry_sizes(tmp_path: Path):
+
+    packed = pack_zipfile(tmp_path.joinpath('result.zip'), _target(tmp_path))
+
+    with zipfile.ZipFile(packed.path) as zf:
+        for info in zf.infolist():
+            signature, _, flags, method, _, _, crc, compressed, size, _, _ = _local_header(packed.path, info)
+
+            # streaming readers need these up front, no data descriptor
+            assert signature == 0x04034b50
+            assert not flags & 0x08
+            assert method == info.compress_type
+            assert (crc, compressed, size) == (info.CRC, info.compress_size, info.file_size)
+
+def test_zip64_records(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+
+    monkeypatch.setattr(packing, 'ZIP64_LIMIT', 512)
+
+    target = _target(tmp_path)
+    packed = pack_zipfile(tmp_path.joinpath('result.zip'), target)
+    data = packed.path.read_bytes()
+
+    # zip64 end of central directory and its locator
+    assert struct.pack('<I', 0x06064b50) in data
+    assert struct.pack('<I', 0x07064b50) in data
+    assert packed.checksum == calc_sha256sum(packed.path)
+
+    with zipfile.ZipFile(packed.path) as zf:
+        assert zf.testzip() is None
+        assert zf.read('content.md') == target.joinpath('content.md').read_bytes()
+        assert zf.read('images/a.jpg') == target.joinpath('images', 'a.jpg').read_bytes()
+
+        info = zf.getinfo('images/a.jpg')
+        _, version, flags, _, _, _, _, compressed, size, _, _ = _local_header(packed.path, info)
+        assert version == 45
+        assert not flags & 0x08
+        assert (compressed, size) == (packing.ZIP64_MARKER, packing.ZIP64_MARKER)
@@ -0,0 +1,115 @@
+import io
+from datetime import timedelta
+from typing import List, Tuple
+
+import arrow
+import pytest
+from flask import Flask
+from pypdfium2 import PdfDocument
+
+from src.mineru_pdf.constants import ParserEngines, TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Task, TaskEvent
+from src.mineru_pdf.utils import mineru, progress
+
+
+@pytest.fixture
+def analyze(monkeypatch: pytest.MonkeyPatch):
+    """Pipeline doc_analyze inferring pages in batches of 4, as mineru does"""
+
+    from mineru.backend.pipeline import pipeline_analyze
+
+    def batch_image_analyze(images_with_extra_info, formula_enable, table_enable):
+        return [ [] for _ in images_with_extra_info ]
+
+    def doc_analyze(page_counts: List[int]):
+        pages = [ (None, False, 'ch') for count in page_counts for _ in range(count) ]
+        for i in range(0, len(pages), 4):
+            # module global, the same lookup mineru makes
+            pipeline_analyze.batch_image_analyze(pages[i:i + 4], False, True)
+
+    monkeypatch.setattr(pipeline_analyze, 'batch_image_analyze', batch_image_analyze, raising=False)
+
+    return pipeline_analyze, batch_image_analyze, doc_analyze
+
+def test_pipeline_reports_per_batch(analyze):
+
+    pipeline_analyze, batch_image_analyze, doc_analyze = analyze
+    reports: List[Tuple[int, int]] = []
+
+    page_progress = mineru._PageProgress(lambda idx, pages: reports.append((idx, pages)), [ 3, 6, 2 ])
+    with mineru._pipeline_batches(page_progress):
+        doc_analyze([ 3, 6, 2 ])
+
+    # batches of 4 pages spread over documents in order
+    assert [ (0, 3), (1, 1), (1, 4), (1, 1), (2, 2) ] == reports
+    assert batch_image_analyze is pipeline_analyze.batch_image_analyze
+
+    # written documents have nothing left to report
+    for idx, count in enumerate([ 3, 6, 2 ]):
+        page_progress.done(idx, count)
+    assert 5 == len(reports)
+
+def test_pipeline_reports_through_doc_analyze(monkeypatch: pytest.MonkeyPatch):
+
+    pipeline_analyze = pytest.importorskip('mineru.backend.pipeline.pipeline_analyze')
+    if not hasattr(pipeline_analyze, 'doc_analyze'):
+        pytest.skip('mineru pipeline is not installed')
+
+    def pdf(pages: int) -> bytes:
+        document = PdfDocument.new()
+        for _ in range(pages):
+            document.new_page(595, 842)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        document.close()
+        return buffer.getvalue()
+
+    # real batching of mineru, models stubbed out
+    monkeypatch.setenv('MINERU_MIN_BATCH_INFERENCE_SIZE', '4')
+    monkeypatch.setattr(pipeline_analyze, 'batch_image_analyze', lambda images, *args: [ [] for _ in images ])
+
+    reports: List[Tuple[int, int]] = []
+    page_progress = mineru._PageProgress(lambda idx, pages: reports.append((idx, pages)), [ 3, 6, 2 ])
+    with mineru._pipeline_batches(page_progress):
+        infer_results, *_ = pipeline_analyze.doc_analyze(
+            [ pdf(3), pdf(6), pdf(2) ], [ 'ch' ] * 3, parse_method='txt'
+        )
+
+    assert [ 3, 6, 2 ] == [ len(pages) for pages in infer_results ]
+    assert [ (0, 3), (1, 1), (1, 4), (1, 1), (2, 2) ] == reports
+
+def test_pipeline_tops_up_at_document_done():
+
+    reports: List[Tuple[int, int]] = []
+
+    page_progress = mineru._PageProgress(lambda idx, pages: reports.append((idx, pages)), [ 5 ])
+    page_progress.batch(2)
+    page_progress.done(0, 5)
+
+    assert [ (0, 2), (0, 3) ] == reports
+
+def test_eta_of_pipeline_only(app: Flask):
+
+    with app.app_context():
+        now = arrow.now(app.config.get('TIMEZONE')).datetime
+        task = Task(
+            uuid='eta', file_id='eta', file_url='', finetune_args='{}', priority='normal',
+            status=TaskStatus.RUNNING, result=TaskResult.INFERRING, errors='',
+            pages_done=40, pages_total=100, created_at=now, updated_at=now,
+        ) # type: ignore
+        database.session.add(task)
+        database.session.flush()
+        for engine in [ ParserEngines.PIPELINE, ParserEngines.VLM_HTTP_CLIENT ]:
+            # 10 pages per second
+            database.session.add(TaskEvent(
+                task_id=task.id, stage=TaskResult.INFERRING, engine=engine, pages=50,
+                elapsed_ms=5000, started_at=now - timedelta(seconds=5), finished_at=now,
+            )) # type: ignore
+        database.session.commit()
+
+        progress._rates.clear()
+
+        assert 6 == progress.estimate_eta(task, ParserEngines.PIPELINE)
+        assert progress.estimate_eta(task, ParserEngines.VLM_HTTP_CLIENT) is None
+        assert progress.estimate_eta(task, ParserEngines.HYBRID_AUTO_ENGINE) is None
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from flask import Flask
+
+from src.mineru_pdf.utils.resultcache import evict_results, lookup_result, restore_result, store_result
+
+
+def _store(key: str) -> None:
+    store_result(key, { 'content.md': b'# doc\n', 'images/a.jpg': b'\xff\xd8' * 64 })
+
+def test_pinned_entry_survives_eviction(make_app):
+
+    app: Flask = make_app(RESULT_CACHE_SIZE='1MiB')
+
+    with app.app_context():
+        _store('a')
+        pinned = lookup_result('a')
+        assert pinned is not None
+
+        # over budget, but a response is still reading it
+        assert 0 == evict_results(budget=0)
+        assert pinned.path.joinpath('content.md').read_bytes() == b'# doc\n'
+
+        pinned.release()
+        assert 1 == evict_results(budget=0)
+        assert lookup_result('a') is None
+
+def test_eviction_skips_pinned_only(make_app):
+
+    app: Flask = make_app(RESULT_CACHE_SIZE='1MiB')
+
+    with app.app_context():
+        _store('a')
+        _store('b')
+        pinned = lookup_result('b')
+
+        assert 1 == evict_results(budget=0)
+        assert pinned.path.is_dir()
+        pinned.release()
+
+def test_restore_releases_pin(make_app, tmp_path: Path):
+
+    app: Flask = make_app(RESULT_CACHE_SIZE='1MiB')
+
+    with app.app_context():
+        _store('a')
+        dest: Path = restore_result('a', tmp_path.joinpath('work'))
+
+        assert sorted(p.name for p in dest.rglob('*')) == [ 'a.jpg', 'content.md', 'images' ]
+        assert 1 == evict_results(budget=0)
@@ -0,0 +1,125 @@
+import json
+import zipfile
+from pathlib import Path
+from typing import List
+
+import arrow
+import pytest
+from flask import Flask
+
+from src.mineru_pdf.constants import TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Task
+from src.mineru_pdf.tasks import merge_shards, mining_shard
+from src.mineru_pdf.utils import magicfile
+from src.mineru_pdf.utils.fileguard import as_semantic, create_workdir
+from src.mineru_pdf.utils.shards import merge_outputs, page_ranges
+
+
+def fake_output(output_dir: Path, first: int, pages: int, vlm: bool = False) -> None:
+    """Output of a parsed range, page indices local to the range as mineru writes them"""
+
+    output_dir.joinpath('images').mkdir(parents=True, exist_ok=True)
+    output_dir.joinpath('content.md').write_text(
+        '\n\n'.join(f'page {first + i}' for i in range(pages))
+    )
+    output_dir.joinpath('middle.json').write_text(json.dumps({
+        '_backend': 'pipeline', 'pdf_info': [ { 'page_idx': i } for i in range(pages) ],
+    }))
+    output_dir.joinpath('content_list.json').write_text(json.dumps([
+        { 'type': 'text', 'text': f'page {first + i}', 'page_idx': i } for i in range(pages)
+    ]))
+    output_dir.joinpath('model.json').write_text(json.dumps([
+        [ { 'type': 'text' } ] if vlm else { 'page_info': { 'page_no': i } } for i in range(pages)
+    ]))
+    output_dir.joinpath('images', f'{first:04d}.jpg').write_bytes(b'\xff\xd8')
+
+def test_page_ranges():
+
+    assert [ (0, 49), (50, 99), (100, 119) ] == page_ranges(120, 50)
+    assert [ (0, 2) ] == page_ranges(3, 50)
+    assert [ (0, 0), (1, 1) ] == page_ranges(2, 0)
+
+@pytest.mark.parametrize('vlm', [ False, True ])
+def test_merge_follows_page_order(tmp_path: Path, vlm: bool):
+
+    ranges = page_ranges(7, 3)
+    shards = []
+    for start, end in ranges:
+        fake_output(tmp_path.joinpath(f'{start:06d}'), start, end - start + 1, vlm)
+        shards.append((start, tmp_path.joinpath(f'{start:06d}')))
+
+    output_dir: Path = tmp_path.joinpath('merged')
+    output_dir.mkdir()
+
+    # shards finish in any order
+    merge_outputs(list(reversed(shards)), output_dir)
+
+    assert [ f'page {i}' for i in range(7) ] == output_dir.joinpath('content.md').read_text().split('\n\n')
+
+    middle: dict = json.loads(output_dir.joinpath('middle.json').read_text())
+    assert 'pipeline' == middle['_backend']
+    assert list(range(7)) == [ page['page_idx'] for page in middle['pdf_info'] ]
+
+    content_list: list = json.loads(output_dir.joinpath('content_list.json').read_text())
+    assert [ (f'page {i}', i) for i in range(7) ] == [ (item['text'], item['page_idx']) for item in content_list ]
+
+    model: list = json.loads(output_dir.joinpath('model.json').read_text())
+    assert 7 == len(model)
+    if not vlm:
+        assert list(range(7)) == [ page['page_info']['page_no'] for page in model ]
+
+    assert [ '0000.jpg', '0003.jpg', '0006.jpg' ] == sorted(p.name for p in output_dir.joinpath('images').iterdir())
+
+def test_shards_infer_and_merge(app: Flask, monkeypatch: pytest.MonkeyPatch):
+
+    inferred: List[tuple] = []
+
+    def fake_magic_file(input_file: Path, output_dir: Path, start_page_id: int = 0, end_page_id: int = 0, **kwargs):
+        inferred.append((start_page_id, end_page_id))
+        fake_output(output_dir, start_page_id, end_page_id - start_page_id + 1)
+
+    monkeypatch.setattr(magicfile, 'magic_file', fake_magic_file)
+
+    with app.app_context():
+        moment = arrow.now(app.config.get('TIMEZONE')).datetime
+        task = Task(
+            uuid='t1', file_id='doc', file_url='http://localhost/doc.pdf', callback_url='',
+            finetune_args=json.dumps({ 'parser_engine': 'pipeline' }),
+            status=TaskStatus.RUNNING, result=TaskResult.INFERRING, pages_total=7,
+            started_at=moment, created_at=moment, updated_at=moment,
+        )
+        database.session.add(task)
+        database.session.commit()
+        create_workdir(as_semantic(task)).joinpath('doc.pdf').write_bytes(b'%PDF-1.7')
+
+        # the last shard finishes first
+        starts: List[int] = [ mining_shard(task.id, start, end) for start, end in reversed(page_ranges(7, 3)) ]
+        assert [ 6, 3, 0 ] == starts
+
+        assert 0 == merge_shards(starts, task.id, 'key', 7)
+
+        # tasks ran in app contexts of their own, with sessions of their own
+        database.session.refresh(task)
+        assert TaskStatus.COMPLETED == task.status
+        assert 7 == task.pages_done
+
+        with zipfile.ZipFile(Path(app.instance_path).joinpath(task.tarball_location)) as zf:
+            assert [ f'page {i}' for i in range(7) ] == zf.read('content.md').decode().split('\n\n')
+            assert list(range(7)) == [ item['page_idx'] for item in json.loads(zf.read('content_list.json')) ]
+
+    assert [ (6, 6), (3, 5), (0, 2) ] == inferred
+
+def test_failed_shard_skips_merge(app: Flask):
+
+    with app.app_context():
+        moment = arrow.now(app.config.get('TIMEZONE')).datetime
+        task = Task(
+            uuid='t2', file_id='doc', file_url='http://localhost/doc.pdf', callback_url='',
+            finetune_args='{}', status=TaskStatus.RUNNING, result=TaskResult.INFERRING,
+            started_at=moment, created_at=moment, updated_at=moment,
+        )
+        database.session.add(task)
+        database.session.commit()
+
+        assert 255 == merge_shards([ 0, -1 ], task.id, 'key', 7)
@@ -0,0 +1,116 @@
+import base64
+import io
+import json
+import tarfile
+import zipfile
+from email import message_from_bytes
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from pypdfium2 import PdfDocument
+
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer
+from src.mineru_pdf.utils import magicfile
+
+IMAGES = { 'b.jpg': b'\xff\xd8second', 'a.jpg': b'\xff\xd8first', 'c.jpg': b'\xff\xd8third' }
+
+
+def fake_magic_file(input_file: Path, output_dir: Path, data_writer=None, **kwargs):
+    """Writes what the in-memory writer gets from a parse, images out of order"""
+
+    data_writer.write('content.md', b'# doc\n')
+    data_writer.write('middle.json', b'{"pdf_info":[]}')
+    data_writer.write('content_list.json', b'[{"type":"text","page_idx":0}]')
+    data_writer.write('model.json', b'[]')
+    images = data_writer.subdir('images')
+    for name, data in IMAGES.items():
+        images.write(name, data)
+
+@pytest.fixture
+def client(app: Flask, monkeypatch: pytest.MonkeyPatch):
+
+    monkeypatch.setattr(magicfile, 'magic_file', fake_magic_file)
+
+    with app.app_context():
+        database.session.add(Bearer(owner='test', token='files', labels='files'))
+        database.session.commit()
+
+    return app.test_client()
+
+def parse(client, tmp_path: Path, response_format: str):
+
+    document = PdfDocument.new()
+    document.new_page(595, 842)
+    document.save(tmp_path.joinpath('doc.pdf'))
+    document.close()
+
+    with tmp_path.joinpath('doc.pdf').open('rb') as f:
+        r = client.post('/api/v4/file_parse', headers={ 'Authorization': 'Bearer files' }, data={
+            'file': (f, 'doc.pdf', 'application/pdf'),
+            'parser_engine': 'pipeline',
+            'response_format': response_format,
+        })
+
+    assert 200 == r.status_code
+
+    return r.get_data()
+
+def test_multipart(client, tmp_path: Path):
+
+    body: bytes = parse(client, tmp_path, 'multipart')
+    boundary: bytes = body.split(b'\r\n', 1)[0][2:]
+    message = message_from_bytes(
+        b'Content-Type: multipart/mixed; boundary=' + boundary + b'\r\n\r\n' + body
+    )
+
+    images = [ (part.get_filename(), part.get_payload(decode=True)) for part in message.get_payload() if part.get_filename().startswith('images/') ]
+    assert [ (f'images/{name}', IMAGES[name]) for name in sorted(IMAGES) ] == images
+
+@pytest.mark.parametrize('response_format', [ 'zip', 'tar' ])
+def test_archives(client, tmp_path: Path, response_format: str):
+
+    body: bytes = parse(client, tmp_path, response_format)
+
+    if 'zip' == response_format:
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            members = { name: archive.read(name) for name in archive.namelist() }
+    else:
+        with tarfile.open(fileobj=io.BytesIO(body)) as archive:
+            members = { m.name: archive.extractfile(m).read() for m in archive.getmembers() }
+
+    assert [ 'content.md', 'content_list.json', 'images/a.jpg', 'images/b.jpg', 'images/c.jpg', 'middle.json', 'model.json' ] == sorted(members)
+    for name, data in IMAGES.items():
+        assert data == members[f'images/{name}']
+
+@pytest.mark.parametrize('response_format', [ 'json', 'ndjson' ])
+def test_json_formats(client, tmp_path: Path, response_format: str):
+
+    body: bytes = parse(client, tmp_path, response_format)
+
+    merged: dict = {}
+    for line in body.decode().splitlines() if 'ndjson' == response_format else [ body.decode() ]:
+        for field, value in json.loads(line).items():
+            merged[field] = { **merged[field], **value } if 'images' == field and field in merged else value
+
+    assert { name: base64.b64encode(data).decode() for name, data in IMAGES.items() } == {
+        name: image.split(',')[-1] for name, image in merged['images'].items()
+    }
+    assert '# doc\n' == merged['md_content']
+
+def test_ndjson_merges_into_json(client, tmp_path: Path):
+
+    plain: dict = json.loads(parse(client, tmp_path, 'json'))
+    lines = [ json.loads(line) for line in parse(client, tmp_path, 'ndjson').decode().splitlines() ]
+
+    # one image a line, their images objects merge into the one of plain json
+    merged: dict = {}
+    for line in lines:
+        if 'images' in line:
+            assert 1 == len(line['images'])
+            merged.setdefault('images', {}).update(line['images'])
+        else:
+            merged.update(line)
+
+    assert plain == merged
@@ -0,0 +1,57 @@
+from typing import List
+
+import arrow
+import pytest
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+
+from src.mineru_pdf.constants import TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer, Task
+from src.mineru_pdf.utils import taskevents
+
+HEADERS = { 'Authorization': 'Bearer tasks' }
+
+
+@pytest.fixture
+def client(make_app, monkeypatch: pytest.MonkeyPatch):
+
+    # waiter slots are sized from config on first use, one per test
+    monkeypatch.setattr(taskevents, '_slots', None)
+    app: Flask = make_app(TASK_EVENTS_MAX_WAITERS='1')
+
+    with app.app_context():
+        now = arrow.now(app.config.get('TIMEZONE')).datetime
+        database.session.add(Bearer(owner='test', token='tasks', labels='tasks')) # type: ignore
+        for uuid, status in [ ('running', TaskStatus.RUNNING), ('done', TaskStatus.COMPLETED) ]:
+            database.session.add(Task(
+                uuid=uuid, file_id=uuid, file_url='', finetune_args='{}', priority='normal',
+                status=status, result=TaskResult.INFERRING, errors='', created_at=now, updated_at=now,
+            )) # type: ignore
+        database.session.commit()
+
+    return app.test_client()
+
+def test_unstarted_stream_frees_its_slot(client):
+
+    app: Flask = client.application
+    environ = EnvironBuilder('/api/v4/tasks/running/events', headers=HEADERS).get_environ()
+
+    # closed by the server before a single byte is read, the generator never runs
+    statuses: List[str] = []
+    body = app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    assert [ '200 OK' ] == statuses
+    assert 503 == client.get('/api/v4/tasks/running/events', headers=HEADERS, buffered=True).status_code
+    body.close() # type: ignore
+
+    r = client.get('/api/v4/tasks/running/events', headers=HEADERS)
+    assert 200 == r.status_code
+    r.close()
+
+def test_settled_task_stream_ends(client):
+
+    r = client.get('/api/v4/tasks/done/events', headers=HEADERS, buffered=True)
+
+    assert 200 == r.status_code
+    assert 'event: status' in r.get_data(as_text=True)
+    assert 200 == client.get('/api/v4/tasks/done/events', headers=HEADERS, buffered=True).status_code
@@ -0,0 +1,139 @@
+from typing import List
+
+import arrow
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import select
+
+from src.mineru_pdf.constants import TaskResult, TaskStatus
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer, Task
+from src.mineru_pdf.tasks import mining_pdf
+
+HEADERS = { 'Authorization': 'Bearer tasks' }
+
+
+@pytest.fixture
+def client(make_app) -> FlaskClient:
+
+    app: Flask = make_app(TASKS_BATCH_MAX='3', TASKS_PAGE_MAX='10')
+
+    with app.app_context():
+        database.session.add(Bearer(owner='test', token='tasks', labels='tasks')) # type: ignore
+        database.session.commit()
+
+    return app.test_client()
+
+@pytest.fixture
+def mined(client: FlaskClient, monkeypatch: pytest.MonkeyPatch) -> List[int]:
+    """Task ids queued for mining, run eagerly otherwise"""
+
+    queued: List[int] = []
+    monkeypatch.setattr(mining_pdf, 'run', lambda task_id: queued.append(task_id))
+
+    return queued
+
+def add_tasks(client: FlaskClient, statuses: List[str]) -> List[str]:
+
+    with client.application.app_context():
+        now = arrow.now(client.application.config.get('TIMEZONE'))
+        tasks: List[Task] = [
+            Task(
+                uuid=f'task-{i}', file_id=f'task-{i}', file_url='', finetune_args='{}', priority='normal',
+                status=status, result=TaskResult.NONE_, errors='',
+                created_at=now.shift(seconds=i).datetime, updated_at=now.datetime,
+            ) # type: ignore
+            for i, status in enumerate(statuses)
+        ]
+        database.session.add_all(tasks)
+        database.session.commit()
+
+        return [ task.uuid for task in tasks ]
+
+def item(file_id: str) -> dict:
+    return { 'file_url': f'https://example.com/{file_id}.pdf', 'file_id': file_id }
+
+def test_batch_created(client: FlaskClient, mined: List[int]):
+
+    r = client.post('/api/v4/tasks/batch', headers=HEADERS, json={
+        'tasks': [ item('a'), item('b'), { **item('c'), 'priority': 'high' } ],
+    })
+
+    assert 200 == r.status_code
+    task_ids: List[str] = r.get_json()['task_ids']
+    assert 3 == len(set(task_ids))
+
+    with client.application.app_context():
+        created = { task.uuid: task for task in database.session.scalars(select(Task)) }
+        assert [ 'a', 'b', 'c' ] == [ created[task_id].file_id for task_id in task_ids ]
+        assert all(TaskStatus.CREATED == task.status for task in created.values())
+
+        # one message per task
+        assert sorted(task.id for task in created.values()) == sorted(mined)
+
+def test_batch_limits(client: FlaskClient, mined: List[int]):
+
+    r = client.post('/api/v4/tasks/batch', headers=HEADERS, json={
+        'tasks': [ item(str(i)) for i in range(4) ],
+    })
+    assert 422 == r.status_code
+    assert 'at most 3 tasks' in r.get_json()['error']['message']
+
+    assert 422 == client.post('/api/v4/tasks/batch', headers=HEADERS, json={ 'tasks': [] }).status_code
+    assert 401 == client.post('/api/v4/tasks/batch', json={ 'tasks': [ item('a') ] }).status_code
+
+    with client.application.app_context():
+        assert [] == list(database.session.scalars(select(Task)))
+    assert [] == mined
+
+def test_list_pages_by_cursor(client: FlaskClient):
+
+    add_tasks(client, [ TaskStatus.COMPLETED, TaskStatus.RUNNING, TaskStatus.COMPLETED, TaskStatus.COMPLETED ])
+
+    r = client.get('/api/v4/tasks?limit=2', headers=HEADERS)
+    assert 200 == r.status_code
+    first = r.get_json()
+    assert [ 'task-3', 'task-2' ] == [ task['task_id'] for task in first['data'] ]
+
+    second = client.get(f'/api/v4/tasks?limit=2&cursor={first["cursor"]}', headers=HEADERS).get_json()
+    assert [ 'task-1', 'task-0' ] == [ task['task_id'] for task in second['data'] ]
+    assert second['cursor'] is None
+
+    completed = client.get(f'/api/v4/tasks?status={TaskStatus.COMPLETED}', headers=HEADERS).get_json()
+    assert [ 'task-3', 'task-2', 'task-0' ] == [ task['task_id'] for task in completed['data'] ]
+
+def test_list_by_ids(client: FlaskClient):
+
+    add_tasks(client, [ TaskStatus.COMPLETED, TaskStatus.RUNNING ])
+
+    r = client.get('/api/v4/tasks?ids=task-1,nope,task-0,task-1', headers=HEADERS)
+
+    assert 200 == r.status_code
+    assert [ 'task-1', 'task-0' ] == [ task['task_id'] for task in r.get_json()['data'] ]
+    assert [ 'nope' ] == r.get_json()['missing']
+
+    ids: str = ','.join(f'id-{i}' for i in range(11))
+    assert 422 == client.get(f'/api/v4/tasks?ids={ids}', headers=HEADERS).status_code
+
+def test_fetch_not_modified(client: FlaskClient):
+
+    [ task_id ] = add_tasks(client, [ TaskStatus.RUNNING ])
+
+    r = client.get(f'/api/v4/tasks/{task_id}', headers=HEADERS)
+    assert 200 == r.status_code
+    etag: str = r.headers['ETag']
+    assert etag.startswith('W/')
+
+    r = client.get(f'/api/v4/tasks/{task_id}', headers={ **HEADERS, 'If-None-Match': etag })
+    assert 304 == r.status_code
+    assert b'' == r.get_data()
+
+    with client.application.app_context():
+        task = database.session.scalars(select(Task).where(Task.uuid == task_id)).one()
+        task.pages_done = 3
+        database.session.commit()
+
+    r = client.get(f'/api/v4/tasks/{task_id}', headers={ **HEADERS, 'If-None-Match': etag })
+    assert 200 == r.status_code
+    assert etag != r.headers['ETag']
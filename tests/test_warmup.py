@@ -0,0 +1,117 @@
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from flask import Flask
+from pypdfium2 import PdfDocument
+
+from src.mineru_pdf.extensions import database
+from src.mineru_pdf.models import Bearer
+from src.mineru_pdf.utils import magicfile
+from src.mineru_pdf.utils.warmup import warmup_models
+
+LOAD_SECONDS = 0.2
+
+
+class FakeModelSingleton(object):
+    """Stands in for the pipeline model singleton, loading costs LOAD_SECONDS once per key"""
+
+    _models: Dict[tuple, object] = {}
+    loads: List[tuple] = []
+
+    def get_model(self, lang=None, formula_enable=None, table_enable=None):
+        key = (lang, formula_enable, table_enable)
+        if key not in self._models:
+            time.sleep(LOAD_SECONDS)
+            self.loads.append(key)
+            self._models[key] = object()
+        return self._models[key]
+
+@pytest.fixture
+def singleton(monkeypatch: pytest.MonkeyPatch):
+    analyze = pytest.importorskip('mineru.backend.pipeline.pipeline_analyze')
+    monkeypatch.setattr(FakeModelSingleton, '_models', {})
+    monkeypatch.setattr(FakeModelSingleton, 'loads', [])
+    monkeypatch.setattr(analyze, 'ModelSingleton', FakeModelSingleton, raising=False)
+    return FakeModelSingleton
+
+def test_skipped_without_engine(app: Flask, monkeypatch: pytest.MonkeyPatch):
+
+    monkeypatch.setattr(magicfile, 'preload_models', lambda **kwargs: pytest.fail('loaded models'))
+
+    with app.app_context():
+        assert warmup_models() is None
+
+def test_first_request_pays_no_load_cost(make_app, singleton, monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+
+    app: Flask = make_app(WARMUP_ENGINE='pipeline')
+    lookups: List[float] = []
+
+    def fake_magic_file(input_file: Path, output_dir: Path, data_writer=None, **kwargs):
+        # inference stubbed, model lookup the same as pipeline inference does
+        started: float = time.perf_counter()
+        singleton().get_model(
+            lang=(kwargs.get('lang_list') or [ 'ch' ])[0],
+            formula_enable=kwargs.get('formula_enabled'),
+            table_enable=kwargs.get('table_enabled'),
+        )
+        lookups.append(time.perf_counter() - started)
+        data_writer.write('content.md', b'# doc\n')
+
+    monkeypatch.setattr(magicfile, 'magic_file', fake_magic_file)
+
+    with app.app_context():
+        elapsed = warmup_models()
+        assert elapsed is not None and elapsed >= LOAD_SECONDS
+        assert 1 == len(singleton.loads)
+
+        database.session.add(Bearer(owner='test', token='files', labels='files'))
+        database.session.commit()
+
+    document = PdfDocument.new()
+    document.new_page(595, 842)
+    document.save(tmp_path.joinpath('doc.pdf'))
+    document.close()
+
+    with tmp_path.joinpath('doc.pdf').open('rb') as f:
+        r = app.test_client().post('/api/v4/file_parse', headers={ 'Authorization': 'Bearer files' }, data={
+            'file': (f, 'doc.pdf', 'application/pdf'),
+            'parser_engine': 'pipeline',
+        })
+
+    assert 200 == r.status_code
+    assert 1 == len(lookups) and lookups[0] < LOAD_SECONDS / 2
+    assert 1 == len(singleton.loads)
+
+def test_synthetic_document(make_app, singleton, monkeypatch: pytest.MonkeyPatch):
+
+    app: Flask = make_app(WARMUP_ENGINE='pipeline', WARMUP_SYNTHETIC='true')
+    parsed: List[int] = []
+    workdirs: List[Path] = []
+
+    def fake_magic_file(input_file: Path, output_dir: Path, **kwargs):
+        document = PdfDocument(input_file)
+        parsed.append(len(document))
+        document.close()
+        workdirs.append(output_dir)
+
+    monkeypatch.setattr(magicfile, 'magic_file', fake_magic_file)
+
+    with app.app_context():
+        assert warmup_models() is not None
+
+    assert [ 1 ] == parsed
+    assert not workdirs[0].exists()
+
+def test_failure_never_blocks_boot(make_app, monkeypatch: pytest.MonkeyPatch):
+
+    app: Flask = make_app(WARMUP_ENGINE='pipeline')
+
+    def broken(**kwargs):
+        raise RuntimeError('weights missing')
+
+    monkeypatch.setattr(magicfile, 'preload_models', broken)
+
+    with app.app_context():
+        assert warmup_models() is None